@@ -1,49 +1,566 @@
 """Given an image and a message or file steganographer will hide the message or file in the bits of the image."""
 import argparse
-import pkg_resources
-from steganographer.steganographer import Steganographer
+import contextlib
+import io
+import os
+import os.path
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from PIL import Image
+from steganographer.steganographer import FSYNC_POLICIES, Steganographer, _atomic_output, _streamed_raw_image
+from steganographer.analysis import analyze_image
+from steganographer.diff import pair_images, steganographer_diff
+from steganographer.capacity import CoverIndex
+from steganographer.carrier import carrier_extensions, open_carrier
+from steganographer.shard import steganographer_hide_shards, steganographer_reveal_shards
+from steganographer.jobqueue import JobQueue, run_workers
+from steganographer.errors import SteganographerError
+from steganographer.limits import ResourceLimits
+from steganographer.metrics import Metrics
+from steganographer.progress import CancelToken, Cancelled
+
+
+def _covers(argv):
+    """Indexes a library of cover images and picks the smallest one that can hold a message or file."""
+    parser = argparse.ArgumentParser(prog="steganographer covers",
+                                     description="indexes cover images and picks the smallest one that fits")
+    parser.add_argument("-i", "--index", help="index file of the cover images", default="covers.json")
+    actions = parser.add_subparsers(dest="action")
+    index_parser = actions.add_parser("index", help="add the images in the directories to the index")
+    index_parser.add_argument("directories", nargs='+', help="directories of cover images")
+
+    for action, action_help in (("pick", "show the smallest cover that can hold the message or file"),
+                                ("hide", "hide the message or file in the smallest cover that can hold it")):
+        action_parser = actions.add_parser(action, help=action_help)
+        payload = action_parser.add_mutually_exclusive_group(required=True)
+        payload.add_argument("-m", "--message", help="message to be hidden")
+        payload.add_argument("-f", "--file", help="file to be hidden")
+        action_parser.add_argument("-o", "--output", help="name of output file to hide message in", default='')
+
+    args = parser.parse_args(argv)
+    cover_index = CoverIndex(args.index)
+
+    if args.action == "index":
+        for directory in args.directories:
+            print("Indexed %d images in %s" % (cover_index.add_directory(directory), directory))
+
+        cover_index.save()
+        return
+
+    if args.action not in ("pick", "hide"):
+        parser.print_usage()
+        return
+
+    if args.message:
+        data_len, file_name_len = len(args.message.encode('utf-8')), 0
+    else:
+        data_len, file_name_len = os.path.getsize(args.file), len(args.file.encode('utf-8'))
+
+    cover = cover_index.smallest_cover(data_len, file_name_len=file_name_len)
+
+    if cover is None:
+        print("None of the covers in %s can hold %d bytes." % (args.index, data_len))
+        sys.exit()
+
+    if args.action == "pick":
+        print(cover)
+    elif args.message:
+        hidden_fname = Steganographer().steganographer_hide(cover, args.message, args.output)
+        print("The message has been hidden in " + hidden_fname)
+    else:
+        hidden_fname = Steganographer().steganographer_hide_file(cover, args.file, args.output)
+        print("The file " + args.file + " has been hidden in " + hidden_fname)
+
+
+def _expand_images(inputs):
+    """Yields the files in inputs and the images in the directories in inputs."""
+    image_extensions = tuple(Image.registered_extensions()) + carrier_extensions()
+
+    for fname in inputs:
+        if not os.path.isdir(fname):
+            yield fname
+            continue
+
+        for root, _, fnames in os.walk(fname):
+            for image_name in sorted(fnames):
+                if os.path.splitext(image_name)[1].lower() in image_extensions:
+                    yield os.path.join(root, image_name)
+
+
+def _verify_image(fimage, key=None):
+    """Verifies one image, scattered over with key. Images that can not be read fail."""
+    try:
+        return Steganographer(key=key).steganographer_verify(fimage)
+    except (OSError, SystemExit):
+        return False
+
+
+def _verify(argv):
+    """
+    Checks the data hidden in images against the checksums in their headers.
+
+    Exits with 0 when every image checks out, 1 when any fails and 2 when some have no checksum to check.
+    """
+    parser = argparse.ArgumentParser(prog="steganographer verify",
+                                     description="checks the data hidden in images against their checksums")
+    parser.add_argument("inputs", nargs='+', help="images, or directories of images, to check")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of images to check at the same time")
+    parser.add_argument("-q", "--quiet", action='store_true', help="only show the images that do not check out")
+    parser.add_argument("-k", "--key", help="key the data was scattered with")
+    args = parser.parse_args(argv)
+    fimages = list(_expand_images(args.inputs))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            results = list(executor.map(_verify_image, fimages, [args.key] * len(fimages), chunksize=16))
+    else:
+        results = [_verify_image(fimage, args.key) for fimage in fimages]
+
+    for fimage, verified in zip(fimages, results):
+        if not (args.quiet and verified):
+            print(fimage + ": " + {True: "ok", False: "FAILED", None: "no checksum"}[verified])
+
+    if False in results:
+        sys.exit(1)
+    elif None in results:
+        sys.exit(2)
+
+
+def _analyze_image(fimage):
+    """Analyzes one image. Returns None for images that can not be read."""
+    try:
+        return analyze_image(fimage)
+    except (OSError, ValueError):
+        return None
+
+
+def _analyze(argv):
+    """
+    Screens images for data hidden in their least significant bits, by steganographer or anything else.
+
+    Exits with 0 when no image looks like it has data hidden in it, 1 when any does and 2 when some can not be read.
+    """
+    parser = argparse.ArgumentParser(prog="steganographer analyze",
+                                     description="screens images for data hidden in their least significant bits")
+    parser.add_argument("inputs", nargs='+', help="images, or directories of images, to screen")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of images to screen at the same time")
+    parser.add_argument("-q", "--quiet", action='store_true', help="only show the images that look suspicious")
+    parser.add_argument("--max-rate", type=float, default=0.1,
+                        help="largest part of the samples estimated to be replaced by sample pair analysis that is "
+                             "not suspicious")
+    parser.add_argument("--max-probability", type=float, default=0.95,
+                        help="largest probability from the chi-square attack that is not suspicious")
+    args = parser.parse_args(argv)
+    fimages = list(_expand_images(args.inputs))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            results = list(executor.map(_analyze_image, fimages, chunksize=16))
+    else:
+        results = [_analyze_image(fimage) for fimage in fimages]
+
+    suspicious = [analysis is not None and (analysis.sample_pairs > args.max_rate or
+                                            analysis.chi_square > args.max_probability) for analysis in results]
+
+    for fimage, analysis, is_suspicious in zip(fimages, results, suspicious):
+        if analysis is None:
+            print(fimage + ": could not be read")
+        elif is_suspicious or not args.quiet:
+            print("%s: chi-square %.2f, sample pairs %.2f, LSB entropy %.2f%s" %
+                  (fimage, analysis.chi_square, analysis.sample_pairs, analysis.lsb_entropy,
+                   ", SUSPICIOUS" if is_suspicious else ""))
+
+    if any(suspicious):
+        sys.exit(1)
+    elif None in results:
+        sys.exit(2)
+
+
+def _diff_images(clean_image, dirty_image, key=None):
+    """Compares one pair of images. Returns the footprint, or why they could not be compared."""
+    try:
+        return steganographer_diff(clean_image, dirty_image, key)
+    except SteganographerError as error:
+        return str(error)
+    except (OSError, SystemExit):
+        return "The images %s and %s could not be read." % (clean_image, dirty_image)
+
+
+def _footprint_line(footprint):
+    """Returns footprint as it is shown."""
+    if footprint.changed_bytes == 0:
+        return "unchanged"
+
+    planes = ", ".join(str(plane) for plane in footprint.changed_planes)
+
+    return "%d bytes changed in bit plane%s %s, from byte %d to %d, %s the %d carrier bytes hidden in" % (
+        footprint.changed_bytes, "s" if len(footprint.changed_planes) > 1 else "", planes, footprint.first_changed,
+        footprint.last_changed, "within" if footprint.confined else "OUTSIDE", footprint.hidden_end)
+
+
+def _diff(argv):
+    """
+    Shows which carrier bytes and bits hiding changed in each dirty image, and if they are only where data is hidden.
+
+    Exits with 0 when every image was only changed where data is hidden, 1 when any was changed anywhere else and 2
+    when some could not be compared.
+    """
+    parser = argparse.ArgumentParser(prog="steganographer diff",
+                                     description="shows where hiding changed images, and if only where data is hidden")
+    parser.add_argument("clean", help="clean image, or directory of clean images")
+    parser.add_argument("dirty", help="dirty image, or directory of the dirty images made from them")
+    parser.add_argument("-k", "--key", help="key the data was scattered with")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of pairs of images to compare at a time")
+    parser.add_argument("-q", "--quiet", action='store_true',
+                        help="only show the images changed outside where data is hidden")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.clean) and os.path.isdir(args.dirty):
+        pairs = pair_images(list(_expand_images([args.clean])), list(_expand_images([args.dirty])))
+    else:
+        pairs = [(args.clean, args.dirty)]
+
+    clean_images = [clean_image for clean_image, _ in pairs]
+    dirty_images = [dirty_image for _, dirty_image in pairs]
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            results = list(executor.map(_diff_images, clean_images, dirty_images, [args.key] * len(pairs),
+                                        chunksize=16))
+    else:
+        results = [_diff_images(clean_image, dirty_image, args.key) for clean_image, dirty_image in pairs]
+
+    for (clean_image, dirty_image), footprint in zip(pairs, results):
+        if isinstance(footprint, str):
+            print(footprint)
+        elif not (args.quiet and footprint.confined):
+            print("%s -> %s: %s" % (clean_image, dirty_image, _footprint_line(footprint)))
+
+    if any(not isinstance(footprint, str) and not footprint.confined for footprint in results):
+        sys.exit(1)
+    elif any(isinstance(footprint, str) for footprint in results):
+        sys.exit(2)
+
+
+def _add_limit_arguments(parser):
+    """Adds the options for the limits on each hide to parser."""
+    parser.add_argument("--max-pixels", type=int, help="refuse to hide in images with more pixels than this")
+    parser.add_argument("--max-payload", type=int, help="refuse to hide more bytes than this")
+    parser.add_argument("--max-memory", type=int, help="refuse hides estimated to need more bytes of memory than this")
+
+
+def _limits(args):
+    """Returns the limits given by the options _add_limit_arguments added."""
+    return ResourceLimits(args.max_pixels, args.max_payload, args.max_memory)
+
+
+def _enqueue(argv):
+    """Adds a job for each image to the job queue, to hide the message or file in it or to reveal from it."""
+    parser = argparse.ArgumentParser(prog="steganographer enqueue",
+                                     description="adds hide or reveal jobs to a job queue, for resume to run")
+    parser.add_argument("inputs", nargs='+', help="images, or directories of images, to hide in or reveal from")
+    parser.add_argument("-q", "--queue", default="jobs.db", help="job queue file")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("-m", "--message", help="message to be hidden")
+    action.add_argument("-f", "--file", help="file to be hidden")
+    action.add_argument("-r", "--reveal", action='store_true', help="reveal what is hidden")
+    parser.add_argument("-o", "--output", default='',
+                        help="name of output file, or the directory to write them to when there is more than one")
+    args = parser.parse_args(argv)
+    fimages = list(_expand_images(args.inputs))
+    outputs = [args.output] * len(fimages)
+
+    if args.output and len(fimages) > 1:
+        os.makedirs(args.output, exist_ok=True)
+        outputs = [os.path.join(args.output, '' if args.reveal else os.path.basename(fimage)) for fimage in fimages]
+
+    job_queue = JobQueue(args.queue)
+    job_queue.enqueue_many(('reveal' if args.reveal else 'hide', fimage, args.message, args.file, output)
+                           for fimage, output in zip(fimages, outputs))
+    job_queue.close()
+    print("Added %d jobs to %s" % (len(fimages), args.queue))
+
+
+def _resume(argv):
+    """
+    Runs the unfinished jobs in the job queue, from any number of processes or machines at once.
+
+    Exits with 1 when any job has failed.
+    """
+    parser = argparse.ArgumentParser(prog="steganographer resume",
+                                     description="runs the jobs in a job queue that are not finished yet")
+    parser.add_argument("-q", "--queue", default="jobs.db", help="job queue file")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--lease", type=float, default=60.0,
+                        help="seconds before the job of a worker that stopped responding is run again")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="times a job is run before it fails, when the workers running it stop responding")
+    parser.add_argument("--retry-failed", action='store_true', help="run the jobs that failed again as well")
+    _add_limit_arguments(parser)
+    parser.add_argument("--metrics-file", help="write metrics of the jobs run to this file in the Prometheus format")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve metrics of the jobs run on this local port in the Prometheus format")
+    args = parser.parse_args(argv)
+    job_queue = JobQueue(args.queue)
+    metrics = Metrics() if args.metrics_file or args.metrics_port is not None else None
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port is not None else None
+
+    if args.retry_failed:
+        job_queue.retry_failed()
+
+    try:
+        run_workers(args.queue, args.jobs, args.lease, _limits(args), metrics, args.max_attempts)
+    finally:
+        if args.metrics_file:
+            metrics.write(args.metrics_file)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    for job_id, action, fimage, _, error in job_queue.results(JobQueue.FAILED):
+        print("Job %d to %s %s failed: %s" % (job_id, action, fimage, error))
+
+    counts = job_queue.counts()
+    job_queue.close()
+    print("%d jobs done, %d failed" % (counts[JobQueue.DONE], counts[JobQueue.FAILED]))
+
+    if counts[JobQueue.FAILED]:
+        sys.exit(1)
+
+
+_COMMANDS = {"covers": _covers, "verify": _verify, "analyze": _analyze, "diff": _diff, "enqueue": _enqueue,
+             "resume": _resume}
+
+
+def _output_name(output_file):
+    """Returns the name to show for output_file, - when it is stdout."""
+    return output_file if isinstance(output_file, str) else '-'
+
+
+def _write_revealed(file_name, revealed_data):
+    """
+    Writes revealed_data to the file file_name, or to it when it is a file object, like stdout.
+
+    Files are replaced in one step, so a file being revealed over is never seen empty.
+    """
+    if not isinstance(file_name, str):
+        file_name.write(revealed_data)
+        file_name.flush()
+        return
+
+    with _atomic_output(file_name) as temp_file, open(temp_file, 'wb') as rev_file:
+        rev_file.write(revealed_data)
+
+
+def _size(byte_count):
+    """Returns byte_count in the largest unit it has at least one of."""
+    for unit in ("B", "KB", "MB"):
+        if byte_count < 1024:
+            return "%.1f %s" % (byte_count, unit) if unit != "B" else "%d B" % byte_count
+
+        byte_count /= 1024
+
+    return "%.1f GB" % byte_count
+
+
+class _ProgressBar:
+
+    """
+    Draws the progress of each stage on its own line of stderr, redrawn in place only when it moves.
+
+    A stage ends its line when it reaches 100%, stages that are not done in chunks as soon as they start.
+    """
+
+    _WIDTH = 30
+
+    def __init__(self):
+        self._drawn = None
+        self._line_open = False
+
+    def __call__(self, progress):
+        percent = int(progress.fraction * 100)
+
+        if (progress.stage, percent) == self._drawn:
+            return
+
+        if self._line_open and progress.stage != self._drawn[0]:
+            sys.stderr.write("\n")
+
+        self._drawn = progress.stage, percent
+
+        if not progress.bytes_total:
+            sys.stderr.write(progress.stage + "...\n")
+            self._line_open = False
+        else:
+            filled = self._WIDTH * percent // 100
+            line = "%-6s [%s%s] %3d%% %s of %s" % (progress.stage, '#' * filled, '.' * (self._WIDTH - filled), percent,
+                                                   _size(progress.bytes_done), _size(progress.bytes_total))
+
+            if progress.eta is not None and percent < 100:
+                line += ", %ds left" % round(progress.eta)
+
+            sys.stderr.write("\r" + line.ljust(79) + ("\n" if percent == 100 else ""))
+            self._line_open = percent < 100
+
+        sys.stderr.flush()
+
+    def finish(self):
+        """Ends the line of a stage that did not finish."""
+        if self._line_open:
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+            self._line_open = False
 
 
 def main():
     """Given an image and a message or file steganographer will hide the message or file in the bits of the image."""
+    if len(sys.argv) > 1 and sys.argv[1] in _COMMANDS:
+        _COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="hides a message in a file or returns a message hidden in a file")
-    parser.add_argument("input", help="file to hide a message in or file to reveal a message from")
-    parser.add_argument("-m", "--message", help="message to be hidden in the input file")
-    parser.add_argument("-o", "--output",
-                        help="name of output file to hide message in or to write revealed message", default='')
-    parser.add_argument("-f", "--file", help="file to be hidden in the input file")
+    parser.add_argument("input", help="file to hide a message in or file to reveal a message from, - for stdin")
+    parser.add_argument("-m", "--message", help="message to be hidden in the input file, - for stdin")
+    parser.add_argument("-o", "--output", default='',
+                        help="name of output file to hide message in or to write revealed message, - for stdout")
+    parser.add_argument("-f", "--file", help="file to be hidden in the input file, - for stdin")
     parser.add_argument("-r", "--reveal", action='store_true', help="a file will be revealed")
+    parser.add_argument("-a", "--append", action='store_true',
+                        help="the message or file is hidden after whatever is already hidden in the input file")
+    parser.add_argument("-c", "--chunk-size", type=int,
+                        help="hide the message or file in chunks of this many bytes, each checked on its own")
+    parser.add_argument("--in-place", action='store_true',
+                        help="hide in an uncompressed bmp, ppm or tiff input file itself instead of a copy")
+    parser.add_argument("-s", "--shards", nargs='*',
+                        help="more images to split the file across, or that hold the rest of its shards, if any")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default='never',
+                        help="flush each image written to disk as it is written, all of them at the end, or never")
+    parser.add_argument("--png-workers", type=int,
+                        help="deflate the png written in this many threads at the same time, for large images")
+    parser.add_argument("-k", "--key",
+                        help="scatter what is hidden over the whole input file in an order given by this key, which "
+                             "is needed to reveal it")
+    parser.add_argument("--progress", action='store_true', help="show a progress bar on stderr")
+    _add_limit_arguments(parser)
+    parser.add_argument("--metrics-file", help="write metrics of the hide or reveal to this file, in Prometheus format")
     parser.add_argument("-v", "--version", action='version',
-                        version="steganographer {}".format(pkg_resources.get_distribution('pip').version),
+                        version="steganographer {}".format(metadata.version('pip')),
                         help="show version and exit")
     args = parser.parse_args()
 
-    stegs = Steganographer()
+    if [args.input, args.message, args.file].count('-') > 1:
+        parser.error("only one of the input, the message and the file can be read from stdin")
+
+    if args.in_place and args.output:
+        parser.error("--in-place hides in the input file itself, it can not be given an output file")
+
+    if args.in_place and open_carrier(args.input) is None and _streamed_raw_image(args.input, args.input) is None:
+        parser.error("--in-place only hides in uncompressed bmp, ppm and tiff images and carriers")
+
+    # An image piped in is written back out to stdout, unless an output file is given.
+    if args.input == '-' and not args.output:
+        args.output = '-'
 
+    input_image = io.BytesIO(sys.stdin.buffer.read()) if args.input == '-' else args.input
+    output_image = sys.stdout.buffer if args.output == '-' else args.output
+
+    if args.message == '-':
+        args.message = sys.stdin.read()
+
+    progress_bar = _ProgressBar() if args.progress else None
+    cancel_token = CancelToken()
+
+    # Interrupting or terminating stops at the next chunk, so nothing half written is left. A second time stops now.
+    def cancel(signum, frame):  # pylint: disable=unused-argument
+        if cancel_token.cancelled:
+            raise KeyboardInterrupt
+
+        cancel_token.cancel()
+
+    signal.signal(signal.SIGINT, cancel)
+    signal.signal(signal.SIGTERM, cancel)
+    metrics = Metrics() if args.metrics_file else None
+    stegs = Steganographer(fsync=args.fsync, progress=progress_bar, cancel_token=cancel_token, limits=_limits(args),
+                           metrics=metrics, key=args.key, png_workers=args.png_workers)
+
+    # Messages about what was done go to stderr when stdout is the output, so they do not end up in it.
+    with contextlib.redirect_stdout(sys.stderr if args.output == '-' else sys.stdout):
+        try:
+            _hide_or_reveal(args, stegs, input_image, output_image)
+        except Cancelled:
+            print("Cancelled, nothing was written.")
+            sys.exit(130)
+        except SteganographerError as error:
+            print(error)
+            sys.exit(1)
+        finally:
+            if progress_bar is not None:
+                progress_bar.finish()
+            if metrics is not None:
+                metrics.write(args.metrics_file)
+
+
+def _hide_or_reveal(args, stegs, input_image, output_image):
+    """Does what the arguments of main ask for. An input or output of - is already turned into stdin or stdout."""
+
+    # There is a file to split across several images.
+    if args.shards is not None and args.file:
+        hidden_fnames = steganographer_hide_shards([args.input] + args.shards, args.file, fsync=args.fsync,
+                                                   key=args.key)
+        print("The file " + args.file + " has been split across " + ", ".join(hidden_fnames))
+    # Revealing a file split across several images.
+    elif args.shards is not None and args.reveal:
+        revealed_data, file_name = steganographer_reveal_shards([args.input] + args.shards, key=args.key)
+        _write_revealed(output_image or file_name, revealed_data)
+        print("The hidden file was revealed in " + _output_name(output_image or file_name))
+    # There is a file piped in to append.
+    elif args.append and args.file == '-':
+        hidden_fname = stegs.steganographer_append_data(input_image, sys.stdin.buffer.read(), '', output_image)
+        print("The piped in file has been appended to " + _output_name(hidden_fname))
+    # There is a message to append.
+    elif args.append and args.message:
+        hidden_fname = stegs.steganographer_append(input_image, args.message, output_image)
+        print("The message has been appended to " + _output_name(hidden_fname))
+    # There is a file to append.
+    elif args.append and args.file:
+        hidden_fname = stegs.steganographer_append_file(input_image, args.file, output_image)
+        print("The file " + args.file + " has been appended to " + _output_name(hidden_fname))
     # There is a message to hide.
-    if args.message:
-        hidden_fname = stegs.steganographer_hide(args.input, args.message, args.output)
-        print("The message has been hidden in " + hidden_fname)
+    elif args.message:
+        hidden_fname = stegs.steganographer_hide(input_image, args.message, output_image, args.chunk_size,
+                                                 args.in_place)
+        print("The message has been hidden in " + _output_name(hidden_fname))
+    # There is a file piped in to hide, it is hidden without a name.
+    elif args.file == '-':
+        hidden_fname = stegs.steganographer_hide_data(input_image, sys.stdin.buffer.read(), '', output_image,
+                                                      args.chunk_size, args.in_place)
+        print("The piped in file has been hidden in " + _output_name(hidden_fname))
     # There is a file to hide.
     elif args.file:
-        hidden_fname = stegs.steganographer_hide_file(args.input, args.file, args.output)
-        print("The file " + args.file + " has been hidden in " + hidden_fname)
-    # Revealing a file.
+        hidden_fname = stegs.steganographer_hide_file(input_image, args.file, output_image, args.chunk_size,
+                                                      args.in_place)
+        print("The file " + args.file + " has been hidden in " + _output_name(hidden_fname))
+    # Revealing the files, the output name is used for the first one.
     elif args.reveal:
-        revealed_data, file_name = stegs.steganographer_reveal(args.input)
-
-        if args.output:
-            file_name = args.output
+        for entry_index, (revealed_data, file_name) in enumerate(stegs.steganographer_reveal_all(input_image)):
+            if output_image and entry_index == 0:
+                file_name = output_image
 
-        with open(file_name, 'wb') as rev_file:
-            rev_file.write(revealed_data)
+            if not file_name:
+                continue
 
-        print("The hidden file was revealed in " + file_name)
-    # Revealing a message.
+            _write_revealed(file_name, revealed_data)
+            print("The hidden file was revealed in " + _output_name(file_name))
+    # Revealing the messages.
     else:
-        hidden_message = stegs.steganographer_reveal(args.input)[0].decode('utf-8')
+        revealed = stegs.steganographer_reveal_all(input_image)
+        messages = [revealed_data for revealed_data, file_name in revealed if not file_name] or [revealed[0][0]]
+        hidden_message = '\n'.join(message.decode('utf-8') for message in messages)
 
-        if args.output:
+        if not isinstance(output_image, str):
+            _write_revealed(output_image, hidden_message.encode('utf-8'))
+        elif args.output:
             open(args.output, 'w', encoding='utf-8').write(hidden_message)
             print("The hidden message was written to " + args.output)
         else:
@@ -57,6 +574,8 @@ def main():
                 print(hidden_message.encode('utf-8'))
                 open(output_name, 'w', encoding='utf-8').write(hidden_message)
 
+    stegs.steganographer_sync()  # Only has images to flush with the batch fsync policy.
+
 
 if __name__ == "__main__":
     main()
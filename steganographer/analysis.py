@@ -0,0 +1,194 @@
+"""
+Screens images for data hidden in their least significant bits by anyone, not only by steganographer.
+
+Every statistic is worked out by Pillow over whole planes of carrier bytes at once, with histograms, lookup tables
+and ImageChops, so no Python code runs for each pixel.
+"""
+import math
+from collections import namedtuple
+from PIL import Image, ImageChops
+from steganographer.steganographer import Steganographer, _carrier_bytes
+
+_HALVE = [val >> 1 for val in range(256)]  # Maps a byte to itself without its least significant bit, shifted out.
+_ODD = [255 * (val & 1) for val in range(256)]  # Maps odd bytes to 255 and even ones to 0.
+_NONZERO = [0] + [255] * 255  # Maps every byte but 0 to 255.
+_MIN_PREFIX_LEN = 4096  # The chi-square attack is made on the first half, quarter... of the image, down to this.
+_MIN_EXPECTED = 5  # Pairs of values expected fewer times than this are left out of the chi-square statistic.
+_GAMMA_EPSILON = 1e-12
+_GAMMA_ITERATIONS = 1000
+
+
+class Analysis(namedtuple('Analysis', 'chi_square sample_pairs lsb_entropy')):
+
+    """
+    The scores of an image, each from 0 to 1, higher when it is more likely to have data hidden in it.
+
+    chi_square is the highest probability the chi-square attack gives over the start of the image, where sequential
+    embedding like steganographer's begins. sample_pairs is the part of the carrier bytes sample pair analysis
+    estimates to have had their least significant bits replaced, wherever they are. lsb_entropy is the entropy of
+    the least significant bits read as bytes, over the 8 bits each could have, close to 1 for random bits.
+    """
+
+    __slots__ = ()
+
+
+def _histogram(data):
+    """Returns the number of times each byte value is in data."""
+    return Image.frombytes('L', (len(data), 1), data).histogram() if data else [0] * 256
+
+
+def _count(plane):
+    """Returns the number of 255s in plane, an image of 0s and 255s."""
+    return plane.histogram()[255]
+
+
+def _chi_square_pvalue(statistic, dof):
+    """
+    Returns the probability of a chi-square statistic at least as large as statistic, with dof degrees of freedom.
+
+    This is the regularized upper incomplete gamma function, by its series for small statistics and its continued
+    fraction for the rest.
+    """
+    shape, half_statistic = dof / 2, statistic / 2
+
+    if half_statistic <= 0:
+        return 1.0
+
+    log_prefactor = shape * math.log(half_statistic) - half_statistic - math.lgamma(shape)
+
+    if half_statistic < shape + 1:
+        term = total = 1 / shape
+
+        for iteration in range(1, _GAMMA_ITERATIONS):
+            term *= half_statistic / (shape + iteration)
+            total += term
+
+            if abs(term) < abs(total) * _GAMMA_EPSILON:
+                break
+
+        return max(0.0, 1 - total * math.exp(log_prefactor))
+
+    tiny = 1e-300
+    denominator = half_statistic + 1 - shape
+    numerator_term = 1 / tiny
+    denominator_term = 1 / denominator
+    fraction = denominator_term
+
+    for iteration in range(1, _GAMMA_ITERATIONS):
+        coefficient = -iteration * (iteration - shape)
+        denominator += 2
+        denominator_term = coefficient * denominator_term + denominator
+        numerator_term = denominator + coefficient / numerator_term
+        denominator_term = 1 / (denominator_term if abs(denominator_term) > tiny else tiny)
+        numerator_term = numerator_term if abs(numerator_term) > tiny else tiny
+        delta = denominator_term * numerator_term
+        fraction *= delta
+
+        if abs(delta - 1) < _GAMMA_EPSILON:
+            break
+
+    return math.exp(log_prefactor) * fraction
+
+
+def chi_square(data):
+    """
+    Returns the probability that the least significant bits of data were replaced, by the chi-square attack.
+
+    Replacing them with random bits evens out the counts of each pair of values 2k and 2k + 1, which the attack
+    tests the histogram of data for.
+    """
+    histogram = _histogram(data)
+    statistic = 0.0
+    categories = 0
+
+    for even_count, odd_count in zip(histogram[::2], histogram[1::2]):
+        expected = (even_count + odd_count) / 2
+
+        if expected >= _MIN_EXPECTED:
+            statistic += (even_count - expected) ** 2 / expected
+            categories += 1
+
+    if categories < 2:
+        return 0.0
+
+    return _chi_square_pvalue(statistic, categories - 1)
+
+
+def sample_pairs(plane, bands=1):
+    """
+    Returns the part of the samples in plane estimated to have had their least significant bits replaced.
+
+    plane is an L image of carrier bytes, with the bands of each pixel next to each other along its rows. The pairs
+    of horizontally adjacent samples of the same band are counted by how they would change if their least
+    significant bits were flipped, and the quadratic of sample pair analysis is solved for the embedding rate.
+    It is only reliable for photographs, flat synthetic images have too few pairs that differ.
+    """
+    width, height = plane.size
+
+    if width <= bands:
+        return 0.0
+
+    first = plane.crop((0, 0, width - bands, height))
+    second = plane.crop((bands, 0, width, height))
+    pair_count = (width - bands) * height
+
+    same_high_bits = ImageChops.difference(first.point(_HALVE), second.point(_HALVE)).histogram()[0]
+    greater = ImageChops.subtract(first, second).point(_NONZERO)
+    less = ImageChops.subtract(second, first).point(_NONZERO)
+    odd = second.point(_ODD)
+    greater_count, less_count = _count(greater), _count(less)
+    greater_odd = _count(ImageChops.multiply(greater, odd))
+    less_odd = _count(ImageChops.multiply(less, odd))
+
+    # Pairs where the first is smaller than an even second, or larger than an odd one, and the other way around.
+    towards = less_count - less_odd + greater_odd
+    away = greater_count - greater_odd + less_odd
+
+    quadratic = 2 * same_high_bits
+    linear = 2 * (2 * towards - pair_count)
+    constant = away - towards
+
+    if quadratic == 0:
+        return 0.0
+
+    # The smaller root is the part of the samples whose least significant bits were flipped, half of those replaced.
+    # Sampling noise can push the discriminant under 0 once nearly all of them were, where the roots meet.
+    spread = math.sqrt(max(0, linear ** 2 - 4 * quadratic * constant))
+    flipped = min(abs(-linear + sign * spread) for sign in (1, -1)) / (2 * quadratic)
+
+    return min(1.0, 2 * flipped)
+
+
+def lsb_entropy(data):
+    """Returns the entropy of the least significant bits of data, read 8 at a time as bytes, from 0 to 1."""
+    lsb_bytes = Steganographer()._reveal_data(data, len(data) // 8)  # pylint: disable=protected-access
+    total = len(lsb_bytes)
+
+    if not total:
+        return 0.0
+
+    return -sum(count / total * math.log2(count / total) for count in _histogram(lsb_bytes) if count) / 8
+
+
+def analyze_image(fname):
+    """
+    Returns the Analysis of the image fname, or of its first frame when it has more than one.
+
+    High bit depth images are analyzed in the least significant byte of each sample, which is where they carry.
+    """
+    with Image.open(fname) as img:
+        if img.mode == '1':
+            img = img.convert('L')
+
+        data = _carrier_bytes(img)
+        bands = len(data) // (img.width * img.height)
+
+    plane = Image.frombytes('L', (img.width * bands, img.height), data)
+    prefix_lens = [len(data)]
+
+    while prefix_lens[-1] // 2 >= _MIN_PREFIX_LEN:
+        prefix_lens.append(prefix_lens[-1] // 2)
+
+    chi_square_probability = max(chi_square(data[:prefix_len]) for prefix_len in prefix_lens)
+
+    return Analysis(chi_square_probability, sample_pairs(plane, bands), lsb_entropy(data))
@@ -0,0 +1,242 @@
+# pylint: disable=protected-access
+"""Hides a batch of payloads, overlapping the reading, hiding and writing of different images."""
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from steganographer.steganographer import Steganographer, _dirty_image_name, _framed_length, _sync_outputs
+
+_DONE = object()  # Put on a queue once for each worker of the next stage, after the last job.
+
+
+def _preflight(job, chunk_size, limits):
+    """
+    Checks job against the capacity of its clean image and limits before anything is decoded. Returns the bytes of
+    memory it is estimated to need and the carrier bytes of the image.
+    """
+    clean_image_file, data, file_name, dirty_image_file = job
+    stegs = Steganographer(limits=limits)
+    stegs._generate_header(len(data), 1, file_name)
+
+    memory = stegs._preflight(clean_image_file, _framed_length(len(data), chunk_size),
+                              _dirty_image_name(clean_image_file, dirty_image_file))
+
+    return memory, stegs._carrier_len
+
+
+def _read(job, chunk_size, fsync, png_workers=None):
+    """
+    Reads the clean image of job and makes its header. Carriers and uncompressed images are hidden in and written
+    straight away. Returns the name of the image written, or what the embed stage needs.
+    """
+    clean_image_file, data, file_name, dirty_image_file = job
+    stegs = Steganographer(fsync=fsync, png_workers=png_workers)
+    stegs._generate_header(len(data), 1, file_name)
+    data, dirty_image_file = stegs._frame_payload(clean_image_file, data, dirty_image_file, chunk_size)
+    output_file = stegs._hide_streamed(clean_image_file, data, dirty_image_file)
+
+    if output_file is not None:
+        return output_file
+
+    return stegs, clean_image_file, data, dirty_image_file, stegs._open_carrier(clean_image_file)
+
+
+def _embed(stegs, clean_pixels, data):
+    """Hides the header of stegs followed by data in clean_pixels. Returns the dirty pixels."""
+    return stegs._hide_entry(clean_pixels, data)
+
+
+def _write(stegs, dirty_image_file, clean_image_file, dirty_data):
+    """Encodes and writes the dirty image. Returns its name."""
+    return stegs._write_dirty_image(dirty_image_file, clean_image_file, dirty_data)
+
+
+class _Stage:
+
+    """
+    A pool of threads taking jobs from one bounded queue, working on them and putting them on the next one.
+
+    A full queue blocks the stage before it, so no more than the queues and workers can hold is ever in memory.
+    """
+
+    def __init__(self, work, inputs, outputs, workers, failures, discard=None):
+        self.work = work
+        self.discard = discard
+        self.inputs = inputs
+        self.outputs = outputs
+        self.failures = failures
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        """
+        Works on jobs until told there are no more. Once a job has failed the rest are passed over, and given to
+        discard when there is one.
+        """
+        job = self.inputs.get()
+
+        while job is not _DONE:
+            if not self.failures:
+                try:
+                    job = self.work(job)
+
+                    if job is not None and self.outputs is not None:
+                        self.outputs.put(job)
+                except BaseException as error:  # pylint: disable=broad-except
+                    self.failures.append(error)  # SystemExit included, it is raised again once the batch stops.
+            elif self.discard is not None:
+                self.discard(job)
+
+            job = self.inputs.get()
+
+    def finish(self, next_stage=None):
+        """Waits for the workers to run out of jobs, then tells the workers of next_stage there are no more."""
+        for thread in self.threads:
+            thread.join()
+
+        if next_stage is not None:
+            for _ in next_stage.threads:
+                next_stage.inputs.put(_DONE)
+
+
+def steganographer_hide_batch(jobs, chunk_size=None, read_workers=2, embed_workers=1, write_workers=2,
+                              queue_size=4, process_stages=(), fsync='never', limits=None, memory_budget=None,
+                              metrics=None, png_workers=None):
+    """
+    Hides a batch of payloads, each one in its own image, in three stages that run at the same time.
+
+    Each job is a (clean_image_file, data, file_name, dirty_image_file) tuple, like steganographer_hide_data takes.
+    Images are read and decoded, hidden in, then encoded and written by the 'read', 'embed' and 'write' stages, each
+    with its own number of workers and a queue of up to queue_size images between them. So while one image is being
+    written the next is being hidden in and the one after read. Stages are pools of threads, stages named in
+    process_stages hand their work on to a pool of processes instead, for work that holds on to the interpreter.
+    Carriers and uncompressed images are not decoded, the read stage streams them straight to their output. With
+    the fsync policy 'batch' every image is flushed to disk once the whole batch is written.
+
+    Each job is checked against the capacity of its image and any steganographer.limits.ResourceLimits before it
+    is read. With a steganographer.limits.MemoryBudget a job is only read once the memory it is estimated to need
+    is free, and holds it until it is written, so the budget can be shared with other batches and hides. Jobs and
+    how long each stage takes are kept in any steganographer.metrics.Metrics, the embed stage as 'hide'.
+    With png_workers each png written is deflated in that many threads, see steganographer.pngwriter.
+
+    Returns the names of the images created, in the order of jobs. If a job fails no more are started and its error
+    is raised once the others have stopped.
+    """
+    results = {}
+    failures = []
+    read_queue, embed_queue, write_queue = (queue.Queue(queue_size) for _ in range(3))
+    workers = {'read': read_workers, 'embed': embed_workers, 'write': write_workers}
+    executors = {stage: ProcessPoolExecutor(workers[stage]) for stage in process_stages}
+    job_fsync = 'file' if fsync == 'file' else 'never'
+    reserved = {}  # The memory each job read and not yet written holds of the memory budget.
+    sizes = {}  # The bytes hidden and the carrier bytes of each job not yet written, for the metrics.
+
+    def run(stage, work, *args):
+        start = time.monotonic()
+
+        try:
+            if stage not in executors:
+                return work(*args)
+
+            return executors[stage].submit(work, *args).result()
+        finally:
+            if metrics is not None:
+                metrics.stage_seconds.observe(time.monotonic() - start, stage='hide' if stage == 'embed' else stage)
+
+    def written(job_index):
+        data_len, carrier_len = sizes.pop(job_index)
+
+        if metrics is not None:
+            metrics.jobs.inc(action='hide')
+            metrics.embedded_bytes.inc(data_len)
+            metrics.carrier_bytes.observe(carrier_len, action='hide')
+
+    def release(job):
+        memory = reserved.pop(job[0], None)
+
+        if memory is not None:
+            memory_budget.release(memory)
+
+    def read(job):
+        job_index, job = job
+        memory, carrier_len = _preflight(job, chunk_size, limits)
+        sizes[job_index] = _framed_length(len(job[1]), chunk_size), carrier_len
+
+        if memory_budget is not None:
+            memory_budget.acquire(memory)
+            reserved[job_index] = memory
+
+        try:
+            read_job = run('read', _read, job, chunk_size, job_fsync, png_workers)
+        except BaseException:
+            release((job_index,))
+            raise
+
+        if isinstance(read_job, tuple):
+            return (job_index,) + read_job
+
+        results[job_index] = read_job
+        release((job_index,))
+        written(job_index)
+
+        return None
+
+    def embed(job):
+        job_index, stegs, clean_image_file, data, dirty_image_file, clean_data = job
+
+        try:
+            dirty_pixels = run('embed', _embed, stegs, clean_data[1], data)
+        except BaseException:
+            release(job)
+            raise
+
+        return job_index, stegs, clean_image_file, dirty_image_file, (clean_data[0], dirty_pixels)
+
+    def write(job):
+        job_index, stegs, clean_image_file, dirty_image_file, dirty_data = job
+
+        try:
+            results[job_index] = run('write', _write, stegs, dirty_image_file, clean_image_file, dirty_data)
+        finally:
+            release(job)
+
+        written(job_index)
+
+    # Jobs passed over after a failure give back their memory, so reads waiting on it are not stuck.
+    discard = release if memory_budget is not None else None
+    write_stage = _Stage(write, write_queue, None, write_workers, failures, discard)
+    embed_stage = _Stage(embed, embed_queue, write_queue, embed_workers, failures, discard)
+    read_stage = _Stage(read, read_queue, embed_queue, read_workers, failures, discard)
+
+    try:
+        for job in enumerate(jobs):
+            if failures:
+                break
+
+            read_queue.put(job)
+
+        for _ in read_stage.threads:
+            read_queue.put(_DONE)
+
+        read_stage.finish(embed_stage)
+        embed_stage.finish(write_stage)
+        write_stage.finish()
+    finally:
+        for executor in executors.values():
+            executor.shutdown()
+
+    if failures:
+        if metrics is not None:
+            metrics.jobs.inc(len(failures), action='hide')
+            metrics.failures.inc(len(failures), action='hide')
+
+        raise failures[0]
+
+    hidden_fnames = [results[job_index] for job_index in sorted(results)]
+
+    if fsync == 'batch':
+        _sync_outputs(hidden_fnames)
+
+    return hidden_fnames
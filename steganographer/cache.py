@@ -0,0 +1,216 @@
+"""Caches that save steganographer from doing the same work twice."""
+import hashlib
+import os
+import os.path
+import shutil
+import threading
+from collections import OrderedDict
+from PIL import Image
+from steganographer.steganographer import _atomic_output, _frame_count, _open_image_file
+from steganographer.pngwriter import PngTemplate, supports
+
+
+class CarrierCache:
+
+    """
+    An in-process LRU cache of decoded and flattened carrier images, bounded by the bytes of pixel data it holds.
+
+    Images are keyed by path, modification time and size, or by a hash of their content when use_hash is set.
+    The cached pixels are an immutable bytes object, hiding always builds new data from them and never changes them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, use_hash=False):
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._carriers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, fname):
+        """Returns the key fname is cached under."""
+        if self.use_hash:
+            with open(fname, 'rb') as fimage:
+                return hashlib.blake2b(fimage.read()).digest()
+
+        stat = os.stat(fname)
+
+        return os.path.abspath(fname), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _load(fname):
+        """Returns what is cached for fname."""
+        return _open_image_file(fname)
+
+    @staticmethod
+    def _size(carrier):
+        """Returns the bytes carrier takes in the cache."""
+        return len(carrier[1])
+
+    def open_image(self, fname):
+        """Returns the same tuple as _open_image_file does for fname, decoding the image only if it is not cached."""
+        return self._get(fname)
+
+    def _get(self, fname):
+        """Returns what _load returns for fname, only loading it if it is not cached."""
+        try:
+            key = self._key(fname)
+        except OSError:
+            return self._load(fname)
+
+        with self._lock:
+            if key in self._carriers:
+                self._carriers.move_to_end(key)
+                self.hits += 1
+                return self._carriers[key]
+
+            self.misses += 1
+
+        carrier = self._load(fname)
+        carrier_bytes = self._size(carrier)
+
+        if carrier_bytes > self.max_bytes:
+            return carrier
+
+        with self._lock:
+            if key not in self._carriers:
+                self._carriers[key] = carrier
+                self.current_bytes += carrier_bytes
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._carriers.popitem(last=False)
+                self.current_bytes -= self._size(evicted)
+
+        return carrier
+
+    def clear(self):
+        """Drops every cached carrier."""
+        with self._lock:
+            self._carriers.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._carriers)
+
+
+class TemplateCache(CarrierCache):
+
+    """
+    An in-process LRU cache of cover templates, see steganographer.pngwriter.PngTemplate, bounded by the bytes of
+    deflated image data they hold.
+
+    Covers are keyed like CarrierCache keys images. Covers dirty images are not written as single frame pngs of, or
+    that PngTemplate can not write, are cached as None, so they are only opened once too.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, use_hash=False, workers=None):
+        super().__init__(max_bytes, use_hash)
+        self.workers = workers
+
+    def _load(self, fname):
+        """Returns the PngTemplate of the cover fname, deflated in workers threads, or None if it does not have one."""
+        with Image.open(fname) as img:
+            if _frame_count(img) > 1 or not supports(img):
+                return None
+
+            return PngTemplate(img, self.workers)
+
+    @staticmethod
+    def _size(carrier):
+        """Returns the bytes the template takes in the cache."""
+        return 0 if carrier is None else carrier.nbytes
+
+    def open_template(self, fname):
+        """Returns the PngTemplate of the cover fname, or None, making it only if it is not cached."""
+        return self._get(fname)
+
+
+def _atomic_copy(source, destination):
+    """Copies source to destination through a temporary file in the same directory, replacing it in one step."""
+    with _atomic_output(destination) as temp_file:
+        shutil.copyfile(source, temp_file)
+
+
+class ResultCache:
+
+    """
+    An on-disk cache of steganogrified images, keyed by a hash of everything that goes into making one.
+
+    Entries are written to a temporary file and renamed, so several processes can share one cache directory.
+    Once the entries take up more than max_bytes the least recently used ones are removed.
+    """
+
+    _ENGINE = b"lsb2"  # Changes whenever the same inputs would give a different image.
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, clean_image_file, header, data, output_format):
+        """Returns the key for hiding header and data in clean_image_file and writing it out as output_format."""
+        key_hash = hashlib.sha256(self._ENGINE)
+
+        with open(clean_image_file, 'rb') as fimage:
+            carrier = fimage.read()
+
+        for part in (carrier, header, data, output_format.encode('utf-8')):
+            key_hash.update(len(part).to_bytes(8, "little"))
+            key_hash.update(part)
+
+        return key_hash.hexdigest()
+
+    def _entry(self, key):
+        """Returns the file name of the entry for key."""
+        return os.path.join(self.directory, key)
+
+    def fetch(self, key, output_file):
+        """Copies the entry for key to output_file. Returns if there was an entry."""
+        entry = self._entry(key)
+
+        try:
+            _atomic_copy(entry, output_file)
+            os.utime(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+
+        return True
+
+    def store(self, key, output_file):
+        """Adds output_file to the cache as the entry for key, then removes old entries if over budget."""
+        _atomic_copy(output_file, self._entry(key))
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits within max_bytes."""
+        entries = []
+
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                continue
+
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total_bytes = sum(entry[1] for entry in entries)
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total_bytes -= size
@@ -0,0 +1,147 @@
+# pylint: disable=protected-access
+"""Works out how much can be hidden in images and keeps an index of cover images to pick from."""
+import bisect
+import json
+import os
+import os.path
+import sys
+from PIL import Image
+from steganographer.carrier import open_carrier
+from steganographer.steganographer import Header, Steganographer, _atomic_output, _image_length
+
+_INDEX_VERSION = 1
+
+
+def carrier_length(fname):
+    """Returns the number of carrier bytes in the image fname. Only the image metadata is read, no pixels decoded."""
+    carrier = open_carrier(fname)
+
+    if carrier is not None:
+        return carrier.carrier_length
+
+    try:
+        with Image.open(fname) as img:
+            return _image_length(img)
+
+    except FileNotFoundError:
+        print("Could not read file", fname)
+        sys.exit()
+
+
+def required_length(data_len, bits_per_channel=1, file_name_len=0):
+    """Returns the number of carrier bytes needed to hide data_len bytes and a header with a file name."""
+    header = Header()
+    header.file_name_len = file_name_len
+    data_bits = data_len * Steganographer._BYTELEN
+
+    # The header is always hidden one bit per byte, so it can be read before knowing the bits used.
+    return header.header_length * Steganographer._BYTELEN + -(-data_bits // bits_per_channel)
+
+
+def capacity_from_length(carrier_len, bits_per_channel=1, file_name_len=0):
+    """Returns how many bytes can be hidden in carrier_len carrier bytes."""
+    header_bits = required_length(0, 1, file_name_len)
+
+    return max((carrier_len - header_bits) * bits_per_channel // Steganographer._BYTELEN, 0)
+
+
+def image_capacity(fname, bits_per_channel=1, file_name_len=0):
+    """Returns how many bytes can be hidden in the image fname, without decoding its pixels."""
+    return capacity_from_length(carrier_length(fname), bits_per_channel, file_name_len)
+
+
+class CoverIndex:
+
+    """An index of cover images and how many carrier bytes each has, stored in a local json file."""
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.covers = {}
+        self._by_length = None
+
+        if os.path.isfile(index_file):
+            with open(index_file, 'r', encoding='utf-8') as findex:
+                index = json.load(findex)
+
+            if index.get('version') == _INDEX_VERSION:
+                self.covers = index['covers']
+
+    def add_file(self, fname):
+        """
+        Adds the image fname to the index. Files that are unchanged since they were indexed are not opened again.
+
+        Returns if the file is an image in the index.
+        """
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return False
+
+        cover = self.covers.get(fname)
+
+        if cover is not None and cover['mtime_ns'] == stat.st_mtime_ns and cover['size'] == stat.st_size:
+            return True
+
+        try:
+            with Image.open(fname) as img:
+                cover = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'mode': img.mode,
+                         'carrier_len': _image_length(img)}
+        except (OSError, ValueError):
+            self.covers.pop(fname, None)
+            return False
+
+        self.covers[fname] = cover
+        self._by_length = None
+
+        return True
+
+    def add_directory(self, directory):
+        """Adds every image under directory to the index and drops the ones that are gone. Returns the count added."""
+        added = 0
+
+        for root, _, fnames in os.walk(directory):
+            for fname in sorted(fnames):
+                added += self.add_file(os.path.join(root, fname))
+
+        prefix = os.path.join(directory, '')
+
+        for fname in [fname for fname in self.covers if fname.startswith(prefix) and not os.path.isfile(fname)]:
+            del self.covers[fname]
+            self._by_length = None
+
+        return added
+
+    def save(self, fsync=False):
+        """
+        Writes the index to its file, flushed to disk with fsync.
+
+        The file is written with _atomic_output, so readers never see half an index and runs saving at once do not
+        write over each other's temporary file.
+        """
+        with _atomic_output(self.index_file, fsync) as temp_file:
+            with open(temp_file, 'w', encoding='utf-8') as findex:
+                json.dump({'version': _INDEX_VERSION, 'covers': self.covers}, findex, sort_keys=True)
+
+    def smallest_cover(self, data_len, bits_per_channel=1, file_name_len=0):
+        """
+        Returns the smallest cover in the index that can hold data_len bytes, or None if none of them can.
+
+        Covers that changed since they were indexed are skipped.
+        """
+        if self._by_length is None:
+            self._by_length = sorted((cover['carrier_len'], fname) for fname, cover in self.covers.items())
+
+        needed = required_length(data_len, bits_per_channel, file_name_len)
+
+        for carrier_len, fname in self._by_length[bisect.bisect_left(self._by_length, (needed, '')):]:
+            cover = self.covers[fname]
+
+            try:
+                stat = os.stat(fname)
+            except OSError:
+                continue
+
+            if cover['mtime_ns'] == stat.st_mtime_ns and cover['size'] == stat.st_size and carrier_len >= needed:
+                return fname
+
+        return None
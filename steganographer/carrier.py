@@ -0,0 +1,172 @@
+"""Carriers that are not images, read and written a chunk at a time so they never have to be held in memory whole."""
+import contextlib
+import os.path
+import re
+import sys
+import wave
+
+
+class WaveCarrier:
+
+    """
+    A PCM wav file, carrying data in the least significant byte of each sample.
+
+    Carriers give their carrier bytes a chunk at a time with read_chunks, and write a copy of themselves with the
+    carrier bytes of each chunk passed through a function with hide.
+    """
+
+    extension = '.wav'
+
+    def __init__(self, fname, chunk_frames=64 * 1024):
+        self.fname = fname
+        self.chunk_frames = chunk_frames
+
+        with wave.open(fname, 'rb') as fwave:
+            self.params = fwave.getparams()
+
+    @property
+    def carrier_length(self):
+        """Returns the number of carrier bytes in the file, one for each sample of each channel."""
+        return self.params.nframes * self.params.nchannels
+
+    def read_chunks(self):
+        """Yields the carrier bytes of the file a chunk at a time."""
+        with wave.open(self.fname, 'rb') as fwave:
+            frames = fwave.readframes(self.chunk_frames)
+
+            while frames:
+                yield frames[::self.params.sampwidth]
+                frames = fwave.readframes(self.chunk_frames)
+
+    def hide(self, output_file, hide_chunk):
+        """
+        Writes a copy of the file to output_file, with the carrier bytes of each chunk passed through hide_chunk.
+
+        The output_file can be a file object, which wave writes to without seeking and leaves open.
+        """
+        with wave.open(self.fname, 'rb') as fwave, wave.open(output_file, 'wb') as fdirty:
+            fdirty.setparams(self.params)
+            frames = fwave.readframes(self.chunk_frames)
+
+            while frames:
+                # Samples are little endian, so the first byte of each is the least significant one.
+                samples = bytearray(frames)
+                samples[::self.params.sampwidth] = hide_chunk(frames[::self.params.sampwidth])
+                fdirty.writeframes(samples)
+                frames = fwave.readframes(self.chunk_frames)
+
+
+class Y4mCarrier:
+
+    """
+    A YUV4MPEG2 video, carrying data in every sample of every plane, frame after frame.
+
+    Samples over 8 bits take two little endian bytes and carry in the first one. The video is read and written a
+    frame at a time.
+    """
+
+    extension = '.y4m'
+
+    _MAGIC = b"YUV4MPEG2 "
+    _FRAME = b"FRAME"
+    # The colour space, then the bit depth when the samples are over 8 bits, like 420jpeg, 422p10 or mono16.
+    _COLOUR_SPACE = re.compile(r'(420|422|411|444alpha|444|mono)(?:jpeg|paldv|mpeg2)?p?(\d*)')
+
+    def __init__(self, fname):
+        self.fname = fname
+
+        with open(fname, 'rb') as fvideo:
+            self.stream_header = fvideo.readline()
+
+            if not self.stream_header.startswith(self._MAGIC) or not self.stream_header.endswith(b"\n"):
+                raise ValueError("Not a YUV4MPEG2 video.")
+
+            params = {param[:1]: param[1:] for param in self.stream_header[len(self._MAGIC):].split()}
+            colour_space = self._COLOUR_SPACE.fullmatch(params.get(b'C', b'420jpeg').decode('ascii'))
+
+            if colour_space is None:
+                raise ValueError("Unsupported colour space.")
+
+            width, height = int(params[b'W']), int(params[b'H'])
+            chroma_len = {'420': (width + 1) // 2 * ((height + 1) // 2), '422': (width + 1) // 2 * height,
+                          '411': (width + 3) // 4 * height, '444': width * height, '444alpha': width * height,
+                          'mono': 0}[colour_space.group(1)]
+            alpha_len = width * height if colour_space.group(1) == '444alpha' else 0
+            self.sample_len = 1 if int(colour_space.group(2) or 8) <= 8 else 2
+            self.frame_len = (width * height + 2 * chroma_len + alpha_len) * self.sample_len
+            self.frame_count = sum(1 for _ in self._frames(fvideo, read_data=False))
+
+    def _frames(self, fvideo, read_data=True):
+        """Yields the header and data of each frame in fvideo, from where it is. Skips the data unless read_data."""
+        frame_header = fvideo.readline()
+
+        while frame_header.startswith(self._FRAME):
+            if read_data:
+                yield frame_header, fvideo.read(self.frame_len)
+            else:
+                fvideo.seek(self.frame_len, 1)
+                yield frame_header, None
+
+            frame_header = fvideo.readline()
+
+    @property
+    def carrier_length(self):
+        """Returns the number of carrier bytes in the video, one for each sample."""
+        return self.frame_count * self.frame_len // self.sample_len
+
+    def read_chunks(self):
+        """Yields the carrier bytes of the video a frame at a time."""
+        with open(self.fname, 'rb') as fvideo:
+            fvideo.readline()
+
+            for _, frame_data in self._frames(fvideo):
+                yield frame_data[::self.sample_len]
+
+    def hide(self, output_file, hide_chunk):
+        """
+        Writes a copy of the video to output_file, with the carrier bytes of each frame passed through hide_chunk.
+
+        The output_file can be a file object, which is written to as it is and left open.
+        """
+        dirty_video = open(output_file, 'wb') if isinstance(output_file, str) else contextlib.nullcontext(output_file)
+
+        with open(self.fname, 'rb') as fvideo, dirty_video as fdirty:
+            fdirty.write(fvideo.readline())
+
+            for frame_header, frame_data in self._frames(fvideo):
+                samples = bytearray(frame_data)
+                samples[::self.sample_len] = hide_chunk(frame_data[::self.sample_len])
+                fdirty.write(frame_header)
+                fdirty.write(samples)
+
+
+_CARRIERS = {WaveCarrier.extension: WaveCarrier, Y4mCarrier.extension: Y4mCarrier}
+
+
+def carrier_extensions():
+    """Returns the extensions of the files that have a carrier."""
+    return tuple(_CARRIERS)
+
+
+def open_carrier(fname):
+    """Returns the carrier for the file fname, or None if it is an image, a file object or a file without one."""
+    if not isinstance(fname, str):
+        return None
+
+    carrier_class = _CARRIERS.get(os.path.splitext(fname)[1].lower())
+
+    if carrier_class is None:
+        return None
+
+    try:
+        return carrier_class(fname)
+
+    except FileNotFoundError:
+        print("Could not read file", fname)
+        sys.exit()
+    except (wave.Error, EOFError):
+        print("The file %s is not a PCM wav file." % fname)
+        sys.exit()
+    except (ValueError, KeyError):
+        print("The file %s is not a YUV4MPEG2 video that can be read." % fname)
+        sys.exit()
@@ -0,0 +1,95 @@
+# pylint: disable=protected-access
+"""Compares clean and dirty carriers, showing where and how deeply hiding changed them."""
+import os
+import os.path
+from collections import namedtuple
+from PIL import Image
+from steganographer.steganographer import Steganographer, _open_image_file
+from steganographer.carrier import open_carrier
+from steganographer.errors import SteganographerError
+
+_DIRTY_SUFFIX = "Steganogrified"  # Added to the name of dirty images that were not given one.
+
+
+class Footprint(namedtuple('Footprint', 'changed_bytes changed_planes first_changed last_changed hidden_end')):
+
+    """
+    How a dirty carrier differs from the clean one it was made from, by carrier byte.
+
+    changed_planes are the bits changed in any byte, 0 for the least significant one. first_changed and last_changed
+    are the first and last carrier bytes changed, None when none are. hidden_end is the number of carrier bytes the
+    headers and data hidden in the dirty carrier take, from its first one on. With a key, bytes are counted in the
+    order the data is scattered in.
+    """
+
+    __slots__ = ()
+
+    @property
+    def confined(self):
+        """Returns if only least significant bits were changed, and only where the headers and data are hidden."""
+        return set(self.changed_planes) <= {0} and (self.last_changed is None or self.last_changed < self.hidden_end)
+
+
+def _carrier_data(fname):
+    """Returns all the carrier bytes of the carrier or image fname."""
+    carrier = open_carrier(fname)
+
+    if carrier is not None:
+        return b''.join(carrier.read_chunks())
+
+    return _open_image_file(fname)[1]
+
+
+def steganographer_diff(clean_image_file, dirty_image_file, key=None):
+    """
+    Returns the Footprint of hiding in clean_image_file to make dirty_image_file, scattered with key if there is one.
+
+    The carrier bytes of both are compared as two big integers, xored in one go, so nothing is done for each byte in
+    Python. Raises SteganographerError when they do not have the same number of carrier bytes.
+    """
+    stegs = Steganographer(key=key)
+    clean_data = stegs._gather(_carrier_data(clean_image_file))
+    dirty_data = stegs._gather(_carrier_data(dirty_image_file))
+
+    if len(clean_data) != len(dirty_data):
+        raise SteganographerError("The images %s and %s have %d and %d carrier bytes, not the same." % (
+            clean_image_file, dirty_image_file, len(clean_data), len(dirty_data)))
+
+    carrier_len = len(clean_data)
+    changes = (int.from_bytes(clean_data, "big") ^ int.from_bytes(dirty_data, "big")).to_bytes(carrier_len, "big")
+    histogram = Image.frombytes('L', (carrier_len, 1), changes).histogram() if carrier_len else [0] * 256
+    changed_bits = 0
+
+    for value in range(1, 256):
+        if histogram[value]:
+            changed_bits |= value
+
+    _, hidden_end = stegs._retrieve_entries(dirty_data)
+    leading = carrier_len - len(changes.lstrip(b'\0'))
+    last_changed = len(changes.rstrip(b'\0')) - 1
+
+    return Footprint(carrier_len - histogram[0], tuple(plane for plane in range(8) if changed_bits >> plane & 1),
+                     leading if last_changed >= 0 else None, last_changed if last_changed >= 0 else None, hidden_end)
+
+
+def _stem(fname):
+    """Returns the name of fname without its directory, extension or the suffix of dirty images."""
+    stem = os.path.splitext(os.path.basename(fname))[0]
+
+    return stem[:-len(_DIRTY_SUFFIX)] if stem.endswith(_DIRTY_SUFFIX) else stem
+
+
+def pair_images(clean_fnames, dirty_fnames):
+    """
+    Returns a (clean, dirty) pair for every clean image with a dirty image of the same name in dirty_fnames.
+
+    Dirty images are matched whatever their extension and with or without the Steganogrified suffix, so both
+    images named by default and ones written to a directory under the clean name are found.
+    """
+    dirty_by_stem = {}
+
+    for dirty_fname in dirty_fnames:
+        dirty_by_stem.setdefault(_stem(dirty_fname), dirty_fname)
+
+    return [(clean_fname, dirty_by_stem[_stem(clean_fname)]) for clean_fname in clean_fnames
+            if _stem(clean_fname) in dirty_by_stem]
@@ -0,0 +1,21 @@
+"""The errors steganographer raises for work it will not do, so callers can tell them apart from bugs."""
+
+
+class SteganographerError(Exception):
+
+    """The base of the errors raised for hides and reveals that can not or should not be done."""
+
+
+class CapacityError(SteganographerError):
+
+    """Raised when the data to hide does not fit in the carrier bytes of the image."""
+
+
+class ResourceLimitError(SteganographerError):
+
+    """Raised when a hide would go over a limit on the image size, the payload size or the memory it can use."""
+
+
+class ChunkTableError(SteganographerError):
+
+    """Raised when the table in front of chunked data is damaged, so its chunks can not be told apart."""
@@ -0,0 +1,306 @@
+"""A queue of hide and reveal jobs in a SQLite file, shared by workers on any number of machines and resumable."""
+import contextlib
+import io
+import os
+import os.path
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from steganographer.steganographer import Steganographer, _atomic_output
+from steganographer.progress import CancelToken
+from steganographer.metrics import Metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    action TEXT NOT NULL,
+    input TEXT NOT NULL,
+    message TEXT,
+    file TEXT,
+    output TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+Job = namedtuple('Job', 'job_id action input message file output')
+
+
+class JobQueue:
+
+    """
+    Hide and reveal jobs kept in the SQLite file queue_file, which any number of processes can open at once.
+
+    Jobs are pending until a worker leases them, running until the worker marks them done or failed, with the file
+    it wrote or the error as the result. A lease lasts lease_seconds unless the worker's heartbeat renews it, so the
+    jobs of a worker that dies go back to being leased once their leases expire. A job whose lease has expired
+    max_attempts times is failed instead, so a job that kills every worker it runs in is not run forever. Every
+    change is its own transaction, so a queue is never left half updated. Input files and files to hide are kept as
+    absolute paths, so workers started in other directories find them. The file can be on a shared filesystem as
+    long as its locks work, and the clocks of the machines should agree to well within lease_seconds.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    ACTIONS = ('hide', 'reveal')
+
+    def __init__(self, queue_file, lease_seconds=60.0, max_attempts=3):
+        self.queue_file = queue_file
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Transactions are started by hand, so leasing a job can hold the write lock from its first read.
+        self._connection = sqlite3.connect(queue_file, timeout=60, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        """Closes the connection to the queue file."""
+        self._connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Runs the statements in it as one transaction, holding the write lock from the start."""
+        self._connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+
+        self._connection.execute("COMMIT")
+
+    def enqueue(self, action, input_file, message=None, file_to_hide=None, output=''):
+        """Adds a job to hide message or file_to_hide in input_file, or to reveal from it. Returns its id."""
+        return self.enqueue_many([(action, input_file, message, file_to_hide, output)])[0]
+
+    def enqueue_many(self, jobs):
+        """
+        Adds every (action, input_file, message, file_to_hide, output) job in jobs in one transaction.
+
+        Hide jobs need either a message or a file to hide, reveal jobs neither. Returns the ids of the jobs.
+        """
+        job_ids = []
+
+        with self._transaction() as connection:
+            for action, input_file, message, file_to_hide, output in jobs:
+                if action not in self.ACTIONS or (action == 'hide') != ((message is None) != (file_to_hide is None)):
+                    raise ValueError("A %s job can not be made of %r and %r." % (action, message, file_to_hide))
+
+                if file_to_hide is not None:
+                    file_to_hide = os.path.abspath(file_to_hide)
+
+                job_ids.append(connection.execute(
+                    "INSERT INTO jobs (action, input, message, file, output) VALUES (?, ?, ?, ?, ?)",
+                    (action, os.path.abspath(input_file), message, file_to_hide, output or '')).lastrowid)
+
+        return job_ids
+
+    def lease(self, worker_id):
+        """
+        Leases the first job that is pending, or whose lease has expired, to worker_id. Jobs whose lease has expired
+        max_attempts times are failed first.
+
+        Returns the Job, or None if there is no job to lease right now.
+        """
+        now = time.time()
+
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = ?, result = 'Stopped without finishing in ' || attempts || ' attempts.', "
+                "lease_expires = NULL WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (self.FAILED, self.RUNNING, now, self.max_attempts))
+            row = connection.execute(
+                "SELECT id, action, input, message, file, output FROM jobs "
+                "WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (self.PENDING, self.RUNNING, now)).fetchone()
+
+            if row is None:
+                return None
+
+            connection.execute(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (self.RUNNING, worker_id, now + self.lease_seconds, row[0]))
+
+        return Job(*row)
+
+    def _update_leased(self, job_id, worker_id, assignments, values):
+        """Updates the job if worker_id still holds its lease. Returns if it did."""
+        with self._transaction() as connection:
+            cursor = connection.execute("UPDATE jobs SET " + assignments + " WHERE id = ? AND worker = ? AND state = ?",
+                                        tuple(values) + (job_id, worker_id, self.RUNNING))
+
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id, worker_id):
+        """Renews the lease worker_id has on the job. Returns if it still had it."""
+        return self._update_leased(job_id, worker_id, "lease_expires = ?", (time.time() + self.lease_seconds,))
+
+    def complete(self, job_id, worker_id, result):
+        """Marks the job done with the file it wrote as result. Returns if worker_id still had it."""
+        return self._update_leased(job_id, worker_id, "state = ?, result = ?, lease_expires = NULL",
+                                   (self.DONE, result))
+
+    def fail(self, job_id, worker_id, error):
+        """Marks the job failed with error as its result. Returns if worker_id still had it."""
+        return self._update_leased(job_id, worker_id, "state = ?, result = ?, lease_expires = NULL",
+                                   (self.FAILED, error))
+
+    def retry_failed(self):
+        """Makes every failed job pending again, with all its attempts left. Returns how many there were."""
+        with self._transaction() as connection:
+            return connection.execute("UPDATE jobs SET state = ?, result = NULL, attempts = 0 WHERE state = ?",
+                                      (self.PENDING, self.FAILED)).rowcount
+
+    def counts(self):
+        """Returns the number of jobs in each state, with every state in it."""
+        counts = dict.fromkeys((self.PENDING, self.RUNNING, self.DONE, self.FAILED), 0)
+        counts.update(self._connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+        return counts
+
+    def results(self, state=None):
+        """Returns the (id, action, input, state, result) of every job, or only the ones in state."""
+        if state is None:
+            return self._connection.execute("SELECT id, action, input, state, result FROM jobs ORDER BY id").fetchall()
+
+        return self._connection.execute("SELECT id, action, input, state, result FROM jobs WHERE state = ? "
+                                        "ORDER BY id", (state,)).fetchall()
+
+
+def _run_job(job, cancel_token=None, limits=None, metrics=None):
+    """
+    Does job, stopping between chunks once cancel_token is cancelled, checking hides against limits before they
+    start and keeping metrics. Returns the name of the file it wrote.
+    """
+    stegs = Steganographer(cancel_token=cancel_token, limits=limits, metrics=metrics)
+
+    if job.action == 'hide' and job.message is not None:
+        return stegs.steganographer_hide(job.input, job.message, job.output)
+
+    if job.action == 'hide':
+        return stegs.steganographer_hide_file(job.input, job.file, job.output)
+
+    revealed_data, file_name = stegs.steganographer_reveal(job.input)
+    revealed_name = os.path.basename(file_name) or os.path.splitext(os.path.basename(job.input))[0] + '_message.txt'
+
+    # An output ending in a separator is a directory to reveal into under the hidden name.
+    if not job.output or job.output.endswith(os.sep):
+        output_file = os.path.join(job.output or os.path.dirname(job.input), revealed_name)
+    else:
+        output_file = job.output
+
+    with _atomic_output(output_file) as temp_file, open(temp_file, 'wb') as rev_file:
+        rev_file.write(revealed_data)
+
+    return output_file
+
+
+def _heartbeat(queue_file, lease_seconds, job_id, worker_id, stop, cancel_token):
+    """
+    Renews the lease on the job a third of the way through it until stop is set. When the lease has been lost to
+    another worker the job is cancelled, as it is that worker's now.
+    """
+    job_queue = JobQueue(queue_file, lease_seconds)
+
+    try:
+        while not stop.wait(lease_seconds / 3):
+            if not job_queue.heartbeat(job_id, worker_id):
+                cancel_token.cancel()
+                break
+    finally:
+        job_queue.close()
+
+
+def run_worker(queue_file, worker_id=None, lease_seconds=60.0, max_jobs=None, limits=None, metrics=None,
+               max_attempts=3):
+    """
+    Leases and does jobs from the queue in queue_file until there are none left to do, or max_jobs are done.
+
+    While a job runs a heartbeat keeps its lease, and a job whose lease is lost is cancelled. When the only jobs left
+    are leased by other workers, it waits for them to finish or for their leases to expire, so the jobs of a worker
+    that died are still done, until they have been leased max_attempts times. What a failed job printed, or the
+    error it raised, is kept as its error. Hides are checked against any steganographer.limits.ResourceLimits before
+    they start, and as a worker runs one job at a time the max_memory of the limits bounds the memory of each worker.
+    The jobs it runs are kept in any steganographer.metrics.Metrics. Returns the number of jobs run.
+    """
+    worker_id = worker_id or "%s:%d" % (socket.gethostname(), os.getpid())
+    job_queue = JobQueue(queue_file, lease_seconds, max_attempts)
+    jobs_run = 0
+
+    try:
+        while max_jobs is None or jobs_run < max_jobs:
+            job = job_queue.lease(worker_id)
+
+            if job is None:
+                if job_queue.counts()[JobQueue.RUNNING] == 0:
+                    break
+
+                time.sleep(min(lease_seconds / 4, 1))
+                continue
+
+            stop = threading.Event()
+            cancel_token = CancelToken()
+            heartbeat = threading.Thread(target=_heartbeat, daemon=True,
+                                         args=(queue_file, lease_seconds, job.job_id, worker_id, stop, cancel_token))
+            heartbeat.start()
+            job_output = io.StringIO()
+
+            try:
+                with contextlib.redirect_stdout(job_output):
+                    result = _run_job(job, cancel_token, limits, metrics)
+            # A job cancelled because its lease was lost is not failed, failing it only works while holding the lease.
+            except (Exception, SystemExit) as error:  # pylint: disable=broad-except
+                job_queue.fail(job.job_id, worker_id, job_output.getvalue().strip() or str(error) or repr(error))
+            else:
+                job_queue.complete(job.job_id, worker_id, result)
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            jobs_run += 1
+    finally:
+        job_queue.close()
+
+    return jobs_run
+
+
+def _run_worker_process(queue_file, lease_seconds, limits, keep_metrics, max_attempts):
+    """Runs a worker in a process of its own. Returns the jobs it ran and the metrics it kept, or None."""
+    metrics = Metrics() if keep_metrics else None
+
+    return run_worker(queue_file, lease_seconds=lease_seconds, limits=limits, metrics=metrics,
+                      max_attempts=max_attempts), metrics
+
+
+def run_workers(queue_file, workers=1, lease_seconds=60.0, limits=None, metrics=None, max_attempts=3):
+    """
+    Runs workers worker processes on the queue in queue_file until it is finished, each with the limits and
+    max_attempts of run_worker. A single worker keeps metrics as it goes, the metrics of worker processes are added
+    to them as each one finishes. Returns the jobs they ran.
+    """
+    if workers <= 1:
+        return run_worker(queue_file, lease_seconds=lease_seconds, limits=limits, metrics=metrics,
+                          max_attempts=max_attempts)
+
+    jobs_run = 0
+
+    with ProcessPoolExecutor(workers) as executor:
+        for worker_jobs, worker_metrics in executor.map(_run_worker_process, [queue_file] * workers,
+                                                        [lease_seconds] * workers, [limits] * workers,
+                                                        [metrics is not None] * workers,
+                                                        [max_attempts] * workers):
+            jobs_run += worker_jobs
+
+            if metrics is not None:
+                metrics.merge(worker_metrics)
+
+    return jobs_run
@@ -0,0 +1,69 @@
+"""Limits on the images, payloads and memory hides can take on, checked before any pixels are decoded."""
+import contextlib
+import threading
+from collections import namedtuple
+from steganographer.errors import ResourceLimitError
+
+
+class ResourceLimits(namedtuple('ResourceLimits', 'max_pixels max_payload max_memory')):
+
+    """
+    The largest image in pixels, over every frame, payload in bytes and estimated memory a single hide can take on.
+
+    A limit of None is no limit. They are checked against the image metadata and the payload length before anything
+    is decoded, and a hide over any of them raises ResourceLimitError.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, max_pixels=None, max_payload=None, max_memory=None):
+        return super().__new__(cls, max_pixels, max_payload, max_memory)
+
+    def check(self, pixel_count, payload_len, memory):
+        """Raises ResourceLimitError if any of pixel_count, payload_len or memory is over its limit."""
+        for name, value, limit in (("pixels", pixel_count, self.max_pixels), ("payload bytes", payload_len,
+                                   self.max_payload), ("bytes of memory", memory, self.max_memory)):
+            if limit is not None and value is not None and value > limit:
+                raise ResourceLimitError("The hide needs %d %s, over the limit of %d." % (value, name, limit))
+
+
+class MemoryBudget:
+
+    """
+    Bytes of memory shared by the hides running at the same time, in threads of one process.
+
+    Each hide reserves the memory it is estimated to need before decoding anything and waits until that much is
+    free, so however many run at once they stay within max_bytes. A hide that needs more than the whole budget
+    could never run and raises ResourceLimitError straight away.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.reserved = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes):
+        """Waits until nbytes are free and reserves them."""
+        if nbytes > self.max_bytes:
+            raise ResourceLimitError("The hide needs %d bytes of memory, over the budget of %d." %
+                                     (nbytes, self.max_bytes))
+
+        with self._condition:
+            self._condition.wait_for(lambda: self.reserved + nbytes <= self.max_bytes)
+            self.reserved += nbytes
+
+    def release(self, nbytes):
+        """Frees nbytes reserved before, for the hides waiting on them."""
+        with self._condition:
+            self.reserved -= nbytes
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes):
+        """Holds nbytes of the budget while in it."""
+        self.acquire(nbytes)
+
+        try:
+            yield
+        finally:
+            self.release(nbytes)
@@ -0,0 +1,210 @@
+"""Counts and times hides and reveals, and shows them in the Prometheus text format on a local endpoint or in files."""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from steganographer.steganographer import _atomic_output
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # Seconds.
+CARRIER_BUCKETS = tuple(4 ** power for power in range(8, 17))  # From 64 KB to 4 GB of carrier bytes.
+
+
+def _label_value(value):
+    """Returns value escaped for a label in the Prometheus text format."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=''):
+    """Returns the labels called names with values, and the already formatted extra one, as they are written."""
+    labels = ['%s="%s"' % (name, _label_value(value)) for name, value in zip(names, values)]
+
+    if extra:
+        labels.append(extra)
+
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _number(value):
+    """Returns value as it is written, +Inf for infinity."""
+    return '+Inf' if value == float('inf') else repr(value)
+
+
+class Counter:
+
+    """A total that only goes up, kept for each set of values of its labels."""
+
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Adds amount to the total for labels."""
+        key = tuple(labels[name] for name in self.labelnames)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Returns the total for labels."""
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def merge(self, other):
+        """Adds the totals of other, the same counter kept somewhere else, to these."""
+        with self._lock:
+            for key, value in other._values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def __getstate__(self):
+        return {name: value for name, value in self.__dict__.items() if name != '_lock'}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=threading.Lock())
+
+    def samples(self):
+        """Returns the lines for every total."""
+        with self._lock:
+            values = sorted(self._values.items())
+
+        return ['%s%s %s' % (self.name, _labels(self.labelnames, key), _number(value)) for key, value in values]
+
+
+class Histogram:
+
+    """Counts of observed values in buckets by their upper bound, with their sum, for each set of label values."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # The count in each bucket, not cumulative, then the sum, for each set of label values.
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Counts value in the first bucket it fits in, for labels."""
+        key = tuple(labels[name] for name in self.labelnames)
+        bucket = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * len(self.buckets) + [0])
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        """Returns the number of values observed for labels."""
+        return sum(self._values.get(tuple(labels[name] for name in self.labelnames), [0])[:-1])
+
+    def merge(self, other):
+        """Adds the counts and sums of other, the same histogram kept somewhere else, to these."""
+        with self._lock:
+            for key, other_counts in other._values.items():
+                counts = self._values.setdefault(key, [0] * len(other_counts))
+                self._values[key] = [count + other_count for count, other_count in zip(counts, other_counts)]
+
+    __getstate__ = Counter.__getstate__
+    __setstate__ = Counter.__setstate__
+
+    def samples(self):
+        """Returns the lines for the cumulative buckets, the sum and the count of each set of label values."""
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+
+        lines = []
+
+        for key, counts in values:
+            cumulative = 0
+
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %d' % (self.name, _labels(self.labelnames, key, 'le="%s"' % _number(bound)),
+                                                 cumulative))
+
+            lines.append('%s_sum%s %s' % (self.name, _labels(self.labelnames, key), _number(counts[-1])))
+            lines.append('%s_count%s %d' % (self.name, _labels(self.labelnames, key), cumulative))
+
+        return lines
+
+
+class Metrics:
+
+    """
+    The metrics of the hides and reveals done by every Steganographer it is given to, safe to share between threads.
+
+    Jobs are counted by action, 'hide', 'append' or 'reveal', failed ones as failures as well. The bytes hidden,
+    framing included, and revealed are totalled, and the seconds each stage takes and the carrier bytes of each
+    image are put in histograms. Each is updated once a stage or job finishes, never for each chunk. Metrics can
+    be pickled, to be kept in another process and merged back.
+    """
+
+    def __init__(self):
+        self.jobs = Counter('steganographer_jobs_total', "Hides and reveals finished, failed ones included.",
+                            ('action',))
+        self.failures = Counter('steganographer_failures_total', "Hides and reveals that failed.", ('action',))
+        self.embedded_bytes = Counter('steganographer_embedded_bytes_total', "Bytes hidden in carriers.")
+        self.revealed_bytes = Counter('steganographer_revealed_bytes_total', "Bytes revealed from carriers.")
+        self.stage_seconds = Histogram('steganographer_stage_seconds', "Seconds taken by each stage of a job.",
+                                       STAGE_BUCKETS, ('stage',))
+        self.carrier_bytes = Histogram('steganographer_carrier_bytes', "Carrier bytes in the images of each job.",
+                                       CARRIER_BUCKETS, ('action',))
+
+    def _metrics(self):
+        """Returns every metric, in the order they are shown."""
+        return self.jobs, self.failures, self.embedded_bytes, self.revealed_bytes, self.stage_seconds, \
+            self.carrier_bytes
+
+    def merge(self, other):
+        """Adds other, the metrics kept in another process, to these."""
+        for metric, other_metric in zip(self._metrics(), other._metrics()):
+            metric.merge(other_metric)
+
+    def exposition(self):
+        """Returns every metric in the Prometheus text format."""
+        lines = []
+
+        for metric in self._metrics():
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.metric_type))
+            lines.extend(metric.samples())
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, fname):
+        """Writes the metrics to the file fname, replacing it in one step, like a textfile collector reads."""
+        with _atomic_output(fname) as temp_file, open(temp_file, 'w', encoding='utf-8') as fmetrics:
+            fmetrics.write(self.exposition())
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Serves the metrics to any GET on host and port from a background thread, 0 picks a free port.
+
+        Returns the server, whose server_address has the port, and whose shutdown stops it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            """Answers every GET with the metrics."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Sends the metrics."""
+                body = metrics.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', _CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """Keeps scrapes out of stderr."""
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return server
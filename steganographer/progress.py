@@ -0,0 +1,61 @@
+"""Reports how far a long hide or reveal has got, and lets it be cancelled cleanly between chunks."""
+import threading
+from collections import namedtuple
+from steganographer.errors import SteganographerError
+
+
+class Cancelled(SteganographerError):
+
+    """Raised between chunks once the CancelToken of a hide or reveal has been cancelled."""
+
+
+class CancelToken:
+
+    """
+    Cancels the hides and reveals of the Steganographer it is given to, from any thread or a signal handler.
+
+    The token is checked between chunks, so a hide stops before writing anything and a reveal stops without
+    finishing, both by raising Cancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Asks for the work using this token to stop at the next chunk."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """Returns if cancel has been called."""
+        return self._event.is_set()
+
+    def check(self):
+        """Raises Cancelled if cancel has been called."""
+        if self._event.is_set():
+            raise Cancelled("Cancelled.")
+
+
+class Progress(namedtuple('Progress', 'stage bytes_done bytes_total elapsed')):
+
+    """
+    How far a stage of a hide or reveal has got, given to progress callbacks after each chunk.
+
+    The stage is 'read', 'hide', 'reveal' or 'write'. Reading and writing images is not done in chunks, so those
+    stages are only reported as they start, with no bytes. Elapsed is the seconds since the stage started.
+    """
+
+    __slots__ = ()
+
+    @property
+    def fraction(self):
+        """Returns the part of the stage done, from 0 to 1."""
+        return self.bytes_done / self.bytes_total if self.bytes_total else 0.0
+
+    @property
+    def eta(self):
+        """Returns the seconds the stage should take to finish at the rate so far, or None before there is a rate."""
+        if not self.bytes_done or not self.elapsed:
+            return None
+
+        return (self.bytes_total - self.bytes_done) * self.elapsed / self.bytes_done
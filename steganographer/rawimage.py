@@ -0,0 +1,228 @@
+"""Finds the pixels of uncompressed bmp, ppm and tiff images in their files, so they can be changed where they are."""
+import struct
+
+_TIFF_TYPES = {3: 'H', 4: 'I'}  # The tiff field types used by the tags read, short and long.
+_TIFF_PHOTOMETRICS = {1: 1, 2: 3, 3: 1, 5: 4}  # Grayscale, RGB, palette and CMYK, with their number of samples.
+# The bytes in unsigned 16 bit, signed 32 bit and floating point grayscale samples, by bits and sample format.
+_TIFF_WIDE_SAMPLES = {(16, 1): 2, (32, 2): 4, (32, 3): 4}
+
+
+class RawImage:
+
+    """
+    Where the pixels of an uncompressed image are in its file.
+
+    The pixels are in runs of bytes, listed in the order Pillow flattens pixels in. When a file stores the channels
+    of a pixel differently, channel_order lists the byte in the file for each channel Pillow gives.
+    """
+
+    def __init__(self, runs, pixel_len=1, channel_order=None):
+        self.runs = runs  # The (offset, length) of each run of pixels in the file.
+        self.pixel_len = pixel_len
+        self.channel_order = channel_order
+
+    def _carrier_len(self, run_len):
+        """Returns the number of carrier bytes in a run of run_len bytes."""
+        if self.channel_order is None:
+            return run_len
+
+        return run_len // self.pixel_len * len(self.channel_order)
+
+    def read(self, mapped, carrier_len):
+        """Returns at least the first carrier_len carrier bytes of the image mapped, flattened like Pillow does."""
+        carrier_runs = []
+        read_len = 0
+
+        for offset, run_len in self.runs:
+            if read_len >= carrier_len:
+                break
+
+            run = mapped[offset:offset + run_len]
+
+            if self.channel_order is not None:
+                channel_count = len(self.channel_order)
+                carrier_run = bytearray(self._carrier_len(run_len))
+
+                for carrier_channel, pixel_channel in enumerate(self.channel_order):
+                    carrier_run[carrier_channel::channel_count] = run[pixel_channel::self.pixel_len]
+
+                run = bytes(carrier_run)
+
+            carrier_runs.append(run)
+            read_len += len(run)
+
+        return b''.join(carrier_runs)
+
+    def write(self, mapped, carrier_data):
+        """Writes carrier_data, flattened like Pillow does, over the first pixels of the image mapped."""
+        carrier_start = 0
+
+        for offset, run_len in self.runs:
+            if carrier_start >= len(carrier_data):
+                break
+
+            carrier_run = carrier_data[carrier_start:carrier_start + self._carrier_len(run_len)]
+            carrier_start += len(carrier_run)
+
+            if self.channel_order is None:
+                mapped[offset:offset + len(carrier_run)] = carrier_run
+                continue
+
+            channel_count = len(self.channel_order)
+            run = bytearray(mapped[offset:offset + run_len])
+
+            for carrier_channel, pixel_channel in enumerate(self.channel_order):
+                pixels = carrier_run[carrier_channel::channel_count]
+                run[pixel_channel:pixel_channel + len(pixels) * self.pixel_len:self.pixel_len] = pixels
+
+            mapped[offset:offset + run_len] = run
+
+
+def _ppm_layout(head):
+    """Returns the layout of a binary ppm or pgm image, or None if head is not the start of a supported one."""
+    if head[:2] not in (b'P5', b'P6'):
+        return None
+
+    fields = []
+    position = 2
+
+    while len(fields) < 3:
+        while position < len(head) and head[position:position + 1].isspace():
+            position += 1
+
+        if head[position:position + 1] == b'#':
+            position = head.find(b'\n', position)
+            if position < 0:
+                return None
+            continue
+
+        field_start = position
+
+        while position < len(head) and head[position:position + 1].isdigit():
+            position += 1
+
+        if field_start == position:
+            return None
+
+        fields.append(int(head[field_start:position]))
+
+    width, height, max_val = fields
+    channel_count = 3 if head[:2] == b'P6' else 1
+    pixels_start = position + 1  # A single whitespace character separates the header from the pixels.
+
+    # Pillow scales samples up to the full range when the maximum is lower, so only full range images are written as is.
+    if max_val == 255:
+        return RawImage([(pixels_start, width * height * channel_count)])
+
+    # Pillow opens 16 bit pgms as I images, their carrier is the least significant byte of each big endian sample.
+    if channel_count == 1 and max_val == 65535:
+        return RawImage([(pixels_start, width * height * 2)], 2, (1,))
+
+    return None
+
+
+def _bmp_layout(head):
+    """Returns the layout of an uncompressed 8, 24 or 32 bit bmp, or None if head is not the start of one."""
+    if head[:2] != b'BM' or len(head) < 54 or struct.unpack_from('<I', head, 14)[0] < 40:
+        return None
+
+    pixel_offset = struct.unpack_from('<I', head, 10)[0]
+    width, height, _, bits_per_pixel, compression = struct.unpack_from('<iiHHI', head, 18)
+
+    if compression != 0 or bits_per_pixel not in (8, 24, 32):
+        return None
+
+    pixel_len = bits_per_pixel // 8
+    row_len = (bits_per_pixel * width + 31) // 32 * 4  # Rows are padded to 4 bytes.
+    # Rows are stored bottom up, unless the height is negative.
+    rows = range(-height) if height < 0 else range(height - 1, -1, -1)
+    # Pixels are stored as BGR or BGRX, the X is not part of the pixel Pillow gives.
+    channel_order = None if pixel_len == 1 else (2, 1, 0)
+
+    return RawImage([(pixel_offset + row * row_len, width * pixel_len) for row in rows], pixel_len, channel_order)
+
+
+def _tiff_layout(head, fimage):
+    """Returns the layout of a one page uncompressed chunky tiff, or None if head does not start a supported one."""
+    if head[:4] not in (b'II*\x00', b'MM\x00*'):
+        return None
+
+    byte_order = '<' if head[:2] == b'II' else '>'
+    fimage.seek(struct.unpack_from(byte_order + 'I', head, 4)[0])
+    entry_count = struct.unpack(byte_order + 'H', fimage.read(2))[0]
+    entries = fimage.read(entry_count * 12)
+    tags = {}
+
+    # Only the first page is found, so tiffs with more pages are left to Pillow.
+    if struct.unpack(byte_order + 'I', fimage.read(4))[0] != 0:
+        return None
+
+    for entry_start in range(0, len(entries) - 11, 12):
+        tag, field_type, count, value = struct.unpack_from(byte_order + 'HHI4s', entries, entry_start)
+
+        if field_type not in _TIFF_TYPES:
+            continue
+
+        field_format = byte_order + str(count) + _TIFF_TYPES[field_type]
+
+        if struct.calcsize(field_format) > 4:
+            fimage.seek(struct.unpack(byte_order + 'I', value)[0])
+            value = fimage.read(struct.calcsize(field_format))
+
+        tags[tag] = struct.unpack_from(field_format, value)
+
+    width, height = tags.get(256, (0,))[0], tags.get(257, (0,))[0]
+    sample_count = tags.get(277, (1,))[0]
+    photometric = tags.get(262, (None,))[0]
+    extra_samples = tags.get(338, ())
+    bits_per_sample = tags.get(258, (1,))
+    sample_formats = tags.get(339, (1,))
+
+    if tags.get(259, (1,))[0] != 1 or tags.get(284, (1,))[0] != 1 or 322 in tags or 273 not in tags or \
+            279 not in tags or photometric not in _TIFF_PHOTOMETRICS or set(extra_samples) - {2} or \
+            sample_count != _TIFF_PHOTOMETRICS[photometric] + len(extra_samples) or len(set(bits_per_sample)) != 1 or \
+            len(set(sample_formats)) != 1:
+        return None
+
+    sample_type = bits_per_sample[0], sample_formats[0]
+
+    if sample_type == (8, 1):
+        sample_len = 1
+    elif photometric == 1 and sample_count == 1 and sample_type in _TIFF_WIDE_SAMPLES:
+        sample_len = _TIFF_WIDE_SAMPLES[sample_type]
+    else:
+        return None
+
+    runs = []
+    pixels_len = width * height * sample_count * sample_len
+
+    for strip_offset, strip_len in zip(tags[273], tags[279]):
+        strip_len = min(strip_len, pixels_len)
+        runs.append((strip_offset, strip_len))
+        pixels_len -= strip_len
+
+    if sample_len == 1:
+        return RawImage(runs)
+
+    # The carrier is the least significant byte of each sample, the first one in little endian files.
+    return RawImage(runs, sample_len, (0 if byte_order == '<' else sample_len - 1,))
+
+
+def open_raw_image(fname):
+    """Returns the layout of the pixels in the image fname, or None if it is not an uncompressed image supported."""
+    if not isinstance(fname, str):
+        return None
+
+    try:
+        with open(fname, 'rb') as fimage:
+            head = fimage.read(4096)
+            layout = _ppm_layout(head) or _bmp_layout(head) or _tiff_layout(head, fimage)
+            file_len = fimage.seek(0, 2)
+
+    except (OSError, struct.error):
+        return None
+
+    if layout is None or not layout.runs or any(offset + run_len > file_len for offset, run_len in layout.runs):
+        return None
+
+    return layout
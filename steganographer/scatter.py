@@ -0,0 +1,142 @@
+"""Scatters hidden data over the whole carrier, in an order only a key gives, instead of from its first byte on."""
+import array
+import collections
+import hashlib
+import operator
+import sys
+import threading
+
+_INDEX_CACHE_BYTES = 256 * 1024 * 1024  # The bytes of scatter indexes kept, each takes 8 for every carrier byte.
+_LOW_SIX_BITS = bytes(range(64)) * 4  # Clears the top two bits of a byte, keeping the floats finite and positive.
+
+
+def key_seed(key):
+    """Returns the seed of the scatter order for key, a string or bytes."""
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+
+    return hashlib.blake2b(key, digest_size=32, person=b'stegs-scatter').digest()
+
+
+class _IndexCache:
+
+    """An LRU cache of scatter indexes, bounded by the bytes of positions they hold like CarrierCache."""
+
+    def __init__(self, max_bytes=_INDEX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._indexes = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, seed, carrier_len):
+        """Returns the scatter index of seed for carrier_len carrier bytes, only making it if it is not cached."""
+        key = seed, carrier_len
+
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                return self._indexes[key]
+
+        index = _make_scatter_index(seed, carrier_len)
+        index_bytes = 8 * carrier_len
+
+        if index_bytes > self.max_bytes:
+            return index
+
+        with self._lock:
+            if key not in self._indexes:
+                self._indexes[key] = index
+                self.current_bytes += index_bytes
+
+            while self.current_bytes > self.max_bytes:
+                (_, evicted_len), _ = self._indexes.popitem(last=False)
+                self.current_bytes -= 8 * evicted_len
+
+        return index
+
+    def clear(self):
+        """Drops every cached index."""
+        with self._lock:
+            self._indexes.clear()
+            self.current_bytes = 0
+
+
+def _make_scatter_index(seed, carrier_len):
+    """Returns the order and inverse scatter_index returns, without looking in the cache."""
+    keystream = hashlib.shake_256(seed + carrier_len.to_bytes(8, 'little')).digest(4 * carrier_len)
+    positions = array.array('I', range(carrier_len))
+
+    if sys.byteorder == 'big':
+        positions.byteswap()
+
+    # Little endian floats of the position in the low 32 bits and the keystream above it, but for the two top bits.
+    keyed = bytearray(8 * carrier_len)
+    positions = positions.tobytes()
+
+    for byte in range(4):
+        keyed[byte::8] = positions[byte::4]
+        keyed[4 + byte::8] = keystream[byte::4]
+
+    keyed[7::8] = keyed[7::8].translate(_LOW_SIX_BITS)
+    keys = array.array('d', keyed)
+
+    if sys.byteorder == 'big':
+        keys.byteswap()
+
+    keys = keys.tolist()
+    keys.sort()
+    keys = array.array('d', keys)
+
+    if sys.byteorder == 'big':
+        keys.byteswap()
+
+    keyed = keys.tobytes()
+    ordered = bytearray(4 * carrier_len)
+
+    for byte in range(4):
+        ordered[byte::4] = keyed[byte::8]
+
+    order = array.array('I', ordered)
+
+    if sys.byteorder == 'big':
+        order.byteswap()
+
+    # Sets each inverse position in C, consuming the map without keeping what it returns.
+    inverse = array.array('I', bytes(4 * carrier_len))
+    collections.deque(map(inverse.__setitem__, order, range(carrier_len)), maxlen=0)
+
+    return order, inverse
+
+
+_INDEX_CACHE = _IndexCache()
+
+
+def scatter_index(seed, carrier_len):
+    """
+    Returns the order carrier_len carrier bytes are hidden in for seed, and its inverse, as arrays of positions.
+
+    Each position is sorted by 30 bits of a SHAKE-256 keystream of the seed, packed with it into the bits of a
+    positive float. Floats order the same as their bits and are sorted by Python without calling back for keys, and
+    the inverse is set from the order without a Python loop. Indexes are cached by seed and carrier length, up to
+    _INDEX_CACHE_BYTES of positions, so hides and reveals with the same key in carriers of the same size only make it
+    once.
+    """
+    return _INDEX_CACHE.get(seed, carrier_len)
+
+
+def _permute(data, positions):
+    """Returns the bytes of data at each of positions, in their order."""
+    if len(positions) < 2:
+        return bytes(data[:len(positions)])
+
+    return bytes(operator.itemgetter(*positions)(data))
+
+
+def gather(carrier_data, seed):
+    """Returns carrier_data in the order data is hidden in it for seed."""
+    return _permute(carrier_data, scatter_index(seed, len(carrier_data))[0])
+
+
+def scatter(gathered_data, seed):
+    """Returns gathered_data, carrier data in the order for seed, put back in the order of the carrier."""
+    return _permute(gathered_data, scatter_index(seed, len(gathered_data))[1])
@@ -0,0 +1,156 @@
+# pylint: disable=protected-access
+"""Splits a payload too large for one image across several images and puts it back together."""
+import struct
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from steganographer.capacity import carrier_length
+from steganographer.errors import CapacityError, SteganographerError
+from steganographer.steganographer import Header, Steganographer, _sync_outputs
+
+
+class ShardHeader(Header):
+
+    """
+    The header stored at the beginning of images holding one shard of a payload.
+
+    The shard fields are packed right after the fixed size prefix, before the file name.
+    """
+
+    __slots__ = ('payload_id', 'shard_index', 'shard_count', 'total_len')
+
+    _MAGIC = b"SHRD"
+    # Payload id, shard number, number of shards and the length of the whole payload.
+    _SHARD = struct.Struct('<16sIIQ')
+
+    def __init__(self, data_len=0, bits_used=1, file_name="", payload_id=bytes(16), shard_index=0, shard_count=1,
+                 total_len=0):
+        super().__init__(data_len, bits_used, file_name)
+        self.payload_id = payload_id
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.total_len = total_len
+
+    @property
+    def prefix_length(self):
+        """Returns the number of bytes needed to retrieve the header, without the file name."""
+        return self._PREFIX.size + self._SHARD.size
+
+    @property
+    def header_length(self):
+        """Returns the length of the header data."""
+        return self._PREFIX.size + self._SHARD.size + self.file_name_len
+
+    def _pack_prefix(self):
+        """Returns the fixed size prefix of the header, with the shard fields, as bytes."""
+        return super()._pack_prefix() + self._SHARD.pack(self.payload_id, self.shard_index, self.shard_count,
+                                                         self.total_len)
+
+    def _unpack_prefix(self, potential_header):
+        """Sets the attributes stored in the fixed size prefix of potential_header. Returns if it is valid."""
+        if potential_header[:len(self._LEGACY_TITLE)] == self._LEGACY_TITLE:
+            return False
+
+        is_header_valid = super()._unpack_prefix(potential_header)
+        self.payload_id, self.shard_index, self.shard_count, self.total_len = \
+            self._SHARD.unpack_from(potential_header, self._PREFIX.size)
+
+        return is_header_valid
+
+
+def _carrier_capacity(fname, header):
+    """Returns how many bytes of data can be hidden in the image fname after header, without decoding it."""
+    return max(carrier_length(fname) // Steganographer._BYTELEN - header.header_length, 0)
+
+
+def _hide_shard(clean_image_file, header, shard, dirty_image_file, fsync='never', key=None):
+    """Hides one shard with its header inside clean_image_file, scattered with key. Returns the image created."""
+    stegs = Steganographer(fsync=fsync, key=key)
+    stegs._header = header
+
+    return stegs._hide_payload(clean_image_file, shard, dirty_image_file)
+
+
+def _reveal_shard(fimage, key=None):
+    """Reveals the shard hidden in fimage, scattered with key. Returns its header and data, or None without a shard."""
+    stegs = Steganographer(key=key)
+    stegs._header = ShardHeader()
+    dirty_data = stegs._open_hidden(fimage)
+
+    if stegs._retrieve_header(dirty_data[1]) is False:
+        return None
+
+    data_start = stegs._header.header_length * stegs._BYTELEN
+    revealed_data = stegs._reveal_data(dirty_data[1][data_start:])
+
+    return stegs._header, revealed_data
+
+
+def steganographer_hide_shards(clean_image_files, file_to_hide, dirty_image_files=None, workers=None,
+                               fsync='never', key=None):
+    """
+    Splits file_to_hide into shards and hides each one in the next image of clean_image_files.
+
+    Images are filled in order and ones that are not needed are left out. The shards are hidden in parallel using up
+    to workers processes. With the fsync policy 'file' each image is flushed to disk as it is written, with 'batch'
+    they are all flushed once every shard is written. With a key each shard is scattered over its image, see
+    Steganographer. Returns the names of the images created. Raises CapacityError when the images can not hold all
+    of file_to_hide.
+    """
+    with open(file_to_hide, 'rb') as input_file:
+        data = input_file.read()
+
+    if dirty_image_files is None:
+        dirty_image_files = [''] * len(clean_image_files)
+
+    payload_id = uuid.uuid4().bytes
+    shards = []
+    shard_start = 0
+
+    for clean_image_file, dirty_image_file in zip(clean_image_files, dirty_image_files):
+        if shard_start >= len(data) and shards:
+            break
+
+        shard_len = _carrier_capacity(clean_image_file, ShardHeader(file_name=file_to_hide))
+        shards.append((clean_image_file, data[shard_start:shard_start + shard_len], dirty_image_file))
+        shard_start += shard_len
+
+    if shard_start < len(data):
+        raise CapacityError("The images can hold %d of the %d bytes in %s." % (shard_start, len(data), file_to_hide))
+
+    headers = [ShardHeader(len(shard), 1, file_to_hide, payload_id, shard_index, len(shards), len(data))
+               for shard_index, (_, shard, _) in enumerate(shards)]
+
+    with ProcessPoolExecutor(workers) as executor:
+        hidden_fnames = list(executor.map(_hide_shard, [shard[0] for shard in shards], headers,
+                                          [shard[1] for shard in shards], [shard[2] for shard in shards],
+                                          [fsync if fsync == 'file' else 'never'] * len(shards), [key] * len(shards)))
+
+    if fsync == 'batch':
+        _sync_outputs(hidden_fnames)
+
+    return hidden_fnames
+
+
+def steganographer_reveal_shards(dirty_image_files, workers=None, key=None):
+    """
+    Reveals a payload that was split across dirty_image_files, which can be given in any order.
+
+    The shards are revealed in parallel using up to workers processes, with the key they were hidden with. Returns
+    the data and the file name. Raises SteganographerError when a file has no shard or a shard is missing.
+    """
+    with ProcessPoolExecutor(workers) as executor:
+        revealed_shards = list(executor.map(_reveal_shard, dirty_image_files, [key] * len(dirty_image_files)))
+
+    for fimage, revealed_shard in zip(dirty_image_files, revealed_shards):
+        if revealed_shard is None:
+            raise SteganographerError("This file %s has no hidden shard." % fimage)
+
+    headers = [header for header, _ in revealed_shards]
+    shard_indexes = sorted(header.shard_index for header in headers)
+
+    if len({header.payload_id for header in headers}) != 1 or shard_indexes != list(range(headers[0].shard_count)):
+        raise SteganographerError("The files do not hold all the shards of a single payload.")
+
+    revealed_data = b''.join(data for _, data in sorted(revealed_shards, key=lambda shard: shard[0].shard_index))
+
+    return revealed_data[:headers[0].total_len], headers[0].file_name.decode('utf-8')
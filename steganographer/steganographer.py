@@ -1,7 +1,115 @@
 """Given an image and a message or file steganographer will hide the message or file in the bits of the image."""
 import sys
+import contextlib
+import functools
+import io
+import mmap
+import os
 import os.path
-from PIL import Image
+import shutil
+import struct
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageSequence
+from steganographer.carrier import open_carrier
+from steganographer.errors import CapacityError, ChunkTableError, SteganographerError
+from steganographer.pngwriter import save_png, supports
+from steganographer.progress import Progress
+from steganographer.rawimage import open_raw_image
+from steganographer.scatter import gather, key_seed, scatter
+
+
+_LSB_TO_ASCII = bytes(b'01'[val & 1] for val in range(256))  # Maps a byte to its least significant bit, as 0 or 1.
+_ASCII_TO_BIT = bytes.maketrans(b'01', b'\x00\x01')
+_CLEAR_LSB = bytes(val & ~1 for val in range(256))  # Maps a byte to itself without its least significant bit.
+_ANIMATION_MODES = ('L', 'LA', 'RGB', 'RGBA')  # Modes the frames of an animated png can be hidden in as they are.
+# The bytes in each sample of high bit depth modes, and which of them is the least significant one.
+_WIDE_MODES = {'I;16': (2, 0), 'I;16L': (2, 0), 'I;16B': (2, 1)}
+_WIDE_MODES.update({'I;16N': (2, 0), 'I': (4, 0), 'F': (4, 0)} if sys.byteorder == 'little' else
+                   {'I;16N': (2, 1), 'I': (4, 3), 'F': (4, 3)})
+_CHUNK_TABLE = struct.Struct('<II')  # The number of chunks and their size, at the start of chunked data.
+_CHUNK_ENTRY = struct.Struct('<II')  # The length and CRC32 of each chunk, following the number of chunks.
+FSYNC_POLICIES = ('file', 'batch', 'never')  # When written images are flushed to disk, see Steganographer.
+# The memory a hide takes, measured, for each byte hidden and for each pixel and carrier byte of an image it decodes.
+_HIDDEN_BYTE_MEMORY = 48
+_DECODED_PIXEL_MEMORY = 48
+_DECODED_CARRIER_MEMORY = 20
+_STREAM_MEMORY = 1024 * 1024  # The memory the chunks of a carrier or uncompressed image take as they are streamed.
+_SCATTER_MEMORY = 92  # The memory for each carrier byte scattered over with a key, including making its scatter index.
+
+
+def _frame_chunks(data, chunk_size):
+    """Splits data into chunks of chunk_size and puts a table of their lengths and checksums in front of them."""
+    chunks = [data[chunk_start:chunk_start + chunk_size] for chunk_start in range(0, len(data), chunk_size)]
+    chunk_table = _CHUNK_TABLE.pack(len(chunks), chunk_size)
+    chunk_table += b''.join(_CHUNK_ENTRY.pack(len(chunk), zlib.crc32(chunk)) for chunk in chunks)
+
+    return chunk_table + data
+
+
+def _framed_length(data_len, chunk_size=None):
+    """Returns the length of data_len bytes once _frame_chunks has put its table in front of them."""
+    if not chunk_size:
+        return data_len
+
+    return _CHUNK_TABLE.size + -(-data_len // chunk_size) * _CHUNK_ENTRY.size + data_len
+
+
+def _chunk_table_len(chunk_count, chunk_size, framed_len):
+    """
+    Returns the length of a chunk table of chunk_count chunks of chunk_size, in front of framed_len bytes in all.
+
+    Raises ChunkTableError when the number and size of the chunks do not add up to framed_len, from the header, as
+    they do not once the start of the table is damaged.
+    """
+    table_len = _CHUNK_TABLE.size + chunk_count * _CHUNK_ENTRY.size
+
+    if chunk_size < 1 or table_len > framed_len or chunk_count != -(-(framed_len - table_len) // chunk_size):
+        raise ChunkTableError("The table of chunks is damaged, %d chunks of %d bytes do not make up %d bytes." % (
+            chunk_count, chunk_size, framed_len))
+
+    return table_len
+
+
+def _read_chunk_table(framed_data, framed_len=None):
+    """
+    Returns the chunk size and a list of (length, checksum) for each chunk at the start of framed_data.
+
+    framed_len is the length of all of the framed data, when framed_data only holds the table. Entries with a damaged
+    length get the length they must have and a checksum of None, so only their chunk is reported as damaged. Raises
+    ChunkTableError when the number or size of the chunks is damaged, see _chunk_table_len.
+    """
+    framed_len = len(framed_data) if framed_len is None else framed_len
+
+    if len(framed_data) < _CHUNK_TABLE.size:
+        raise ChunkTableError("The table of chunks is cut short, there are only %d bytes." % len(framed_data))
+
+    chunk_count, chunk_size = _CHUNK_TABLE.unpack_from(framed_data)
+    data_len = framed_len - _chunk_table_len(chunk_count, chunk_size, framed_len)
+    chunk_entries = []
+
+    for chunk_index in range(chunk_count):
+        chunk_len, checksum = _CHUNK_ENTRY.unpack_from(framed_data, _CHUNK_TABLE.size + chunk_index * _CHUNK_ENTRY.size)
+        expected_len = min(chunk_size, data_len - chunk_index * chunk_size)
+        chunk_entries.append((chunk_len, checksum) if chunk_len == expected_len else (expected_len, None))
+
+    return chunk_size, chunk_entries
+
+
+def _unframe_chunks(framed_data):
+    """Returns the data in framed_data without the chunk table. Raises ChunkTableError when it is damaged."""
+    _, chunk_entries = _read_chunk_table(framed_data)
+
+    return framed_data[_CHUNK_TABLE.size + len(chunk_entries) * _CHUNK_ENTRY.size:]
+
+
+def _reveal_chunk(hidden_chunk, chunk_len, checksum):
+    """Reveals one chunk and checks it against its checksum. Returns the data and if it matches."""
+    revealed_chunk = Steganographer()._reveal_data(hidden_chunk, chunk_len)  # pylint: disable=protected-access
+
+    return revealed_chunk, len(revealed_chunk) == chunk_len and zlib.crc32(revealed_chunk) == checksum
 
 
 def _unpack_image(pixels):
@@ -53,27 +161,300 @@ def _write_bin_file(fname, data):
         sys.exit()
 
 
+def _sync_directory(directory):
+    """Flushes the entries of directory, like a file just renamed into it, to disk. Only posix systems can do this."""
+    if os.name != 'posix':  # pragma: no cover
+        return
+
+    directory_fd = os.open(directory or '.', os.O_RDONLY)
+
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+def _sync_outputs(fnames):
+    """Flushes the files fnames to disk, then the directories they are in, each directory once."""
+    directories = []
+
+    for fname in fnames:
+        with open(fname, 'rb') as fsynced:
+            os.fsync(fsynced.fileno())
+
+        if os.path.dirname(fname) not in directories:
+            directories.append(os.path.dirname(fname))
+
+    for directory in directories:
+        _sync_directory(directory)
+
+
+@contextlib.contextmanager
+def _atomic_output(fname, fsync=False):
+    """
+    Yields a temporary name beside fname to write to, which then replaces fname in one step.
+
+    Readers never see a partly written fname, and a write that fails or is killed leaves fname as it was. The
+    temporary name starts with a dot and ends with .tmp, so it is not picked up as an image. With fsync the file
+    and its directory are flushed to disk before returning.
+    """
+    temp_file = os.path.join(os.path.dirname(fname), '.%s.%s.tmp' % (os.path.basename(fname), uuid.uuid4().hex))
+
+    try:
+        yield temp_file
+
+        if fsync:
+            with open(temp_file, 'rb') as fsynced:
+                os.fsync(fsynced.fileno())
+
+        os.replace(temp_file, fname)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_file)
+        raise
+
+    if fsync:
+        _sync_directory(os.path.dirname(fname))
+
+
+def _frame_count(img):
+    """Returns the number of frames or pages in img."""
+    return getattr(img, 'n_frames', 1)
+
+
+def _frame_mode(img):
+    """
+    Returns the mode the frames of the multi-frame img are hidden in, or None to keep the mode of each frame.
+
+    Pages of a tiff keep their own mode, but for bilevel ones, see _frames. Animations are written as apngs, where
+    every frame has the same mode, so frames of gifs and other animations are hidden in as RGBA.
+    """
+    if img.format == 'TIFF':
+        return None
+
+    if img.format == 'PNG' and img.mode in _ANIMATION_MODES:
+        return img.mode
+
+    return 'RGBA'
+
+
+def _frames(img):
+    """
+    Yields each frame of img in the mode it is hidden in. Only one frame is decoded at a time.
+
+    Bilevel pages are hidden in as L, their bytes pack eight pixels each and so would not hold one bit per pixel.
+    """
+    frame_mode = _frame_mode(img)
+
+    for frame in ImageSequence.Iterator(img):
+        if frame_mode or frame.mode == '1':
+            yield frame.convert(frame_mode or 'L')
+        else:
+            yield frame
+
+
+def _image_length(img):
+    """
+    Returns the number of carrier bytes in all the frames of img, from their sizes and modes alone.
+
+    No frame is decoded. Frames of animations are all the size of the canvas, so only their number is read, and the
+    pages of tiffs are seeked through for their own size and mode. Bilevel pages carry a byte for each pixel as L does,
+    and high bit depth ones one for each sample, so all of them count one byte for each band of each pixel.
+    """
+    frame_count = _frame_count(img)
+
+    if frame_count == 1:
+        return img.width * img.height * len(img.getbands())
+
+    frame_mode = _frame_mode(img)
+
+    if frame_mode:
+        return frame_count * img.width * img.height * Image.getmodebands(frame_mode)
+
+    return sum(page.width * page.height * Image.getmodebands(page.mode) for page in ImageSequence.Iterator(img))
+
+
+def _carrier_bytes(img):
+    """Returns the carrier bytes of img. High bit depth images carry in the least significant byte of each sample."""
+    if img.mode not in _WIDE_MODES:
+        return img.tobytes()
+
+    sample_len, low_byte = _WIDE_MODES[img.mode]
+
+    return img.tobytes()[low_byte::sample_len]
+
+
+def _dirty_image(img, data):
+    """Returns a new image like img with data as its carrier bytes."""
+    if img.mode in _WIDE_MODES:
+        sample_len, low_byte = _WIDE_MODES[img.mode]
+        samples = bytearray(img.tobytes())
+        samples[low_byte::sample_len] = data
+        data = bytes(samples)
+
+    dirty_img = Image.frombytes(img.mode, img.size, data)
+
+    if img.mode == 'P':
+        dirty_img.putpalette(img.getpalette())
+
+    return dirty_img
+
+
 def _open_image_file(fname):
-    """Reads the file fname and returns bytes for all it's data."""
+    """Reads the file fname and returns bytes for all it's data. The frames of multi-frame images follow each other."""
     try:
         with Image.open(fname) as img:
-            pixels = list(img.getdata())
-            return _unpack_image(pixels)
+            if _frame_count(img) == 1 and img.mode in _WIDE_MODES:
+                return 1, _carrier_bytes(img)
+
+            if _frame_count(img) == 1:
+                pixels = list(img.getdata())
+                return _unpack_image(pixels)
+
+            pixel_length = None
+            frames_data = []
+
+            for frame in _frames(img):
+                pixel_length = pixel_length or len(frame.getbands())
+                frames_data.append(_carrier_bytes(frame))
+
+            return pixel_length, b''.join(frames_data)
 
     except FileNotFoundError:
         print("Could not read file", fname)
         sys.exit()
 
 
-def _write_image_file(fname, og_fname, data):
-    """Create a image fname and writes the passed in data to it. Returns name of image created."""
+def _is_tiff_output(img):
+    """Returns if images made from img are written as tiffs, which multi-page and high bit depth images are."""
+    return (img.format == 'TIFF' and _frame_count(img) > 1) or img.mode in _WIDE_MODES
+
+
+def _output_format(fname):
+    """Returns the format of images made from the image fname. See _is_tiff_output, the rest are pngs."""
+    try:
+        with Image.open(fname) as img:
+            return 'tiff' if _is_tiff_output(img) else 'png'
+
+    except FileNotFoundError:
+        print("Could not read file", fname)
+        sys.exit()
+
+
+def _dirty_image_name(clean_image_file, dirty_image_file='', in_place=False):
+    """Returns the name of the image to hide in clean_image_file to, the clean name with Steganogrified by default."""
+    if in_place:
+        return clean_image_file
+
+    if dirty_image_file == '':
+        clean_name, clean_extension = os.path.splitext(clean_image_file)
+        return clean_name + "Steganogrified" + clean_extension
+
+    return dirty_image_file
+
+
+def _streamed_raw_image(clean_image_file, dirty_image_file):
+    """
+    Returns the layout of the pixels of clean_image_file when it is an uncompressed image hidden in without decoding
+    it, which it is when dirty_image_file is named with the same extension. Otherwise returns None.
+    """
+    if not isinstance(dirty_image_file, str) or not isinstance(clean_image_file, str) or \
+            os.path.splitext(dirty_image_file)[1].lower() != os.path.splitext(clean_image_file)[1].lower():
+        return None
+
+    return open_raw_image(clean_image_file)
+
+
+def _output_image_name(fname, image_format='png'):
+    """
+    Returns the name of the image _write_image_file creates for fname, with the extension of image_format.
+
+    When fname is a file object, like stdout, the image is written to it and it is returned as it is.
+    """
+    if not isinstance(fname, str):
+        return fname
+
+    fname_no_ext, _ = os.path.splitext(fname)
+
+    return fname_no_ext + '.' + image_format
+
+
+def _save_image(img, fname, image_format, fsync=False, png_writer=None, **save_options):
+    """
+    Saves img as image_format to the image _output_image_name gives for fname. Returns name of image created.
+
+    Named images are written with _atomic_output, flushed to disk with fsync. Single frame pngs steganographer.pngwriter
+    supports are written by png_writer, a function taking the image and a file object like its save_png, when given.
+    """
+    output_file = _output_image_name(fname, image_format)
+    use_writer = png_writer is not None and image_format == 'png' and not save_options and supports(img)
+
+    if isinstance(output_file, str):
+        with _atomic_output(output_file, fsync) as temp_file:
+            if use_writer:
+                with open(temp_file, 'wb') as fimage:
+                    png_writer(img, fimage)
+            else:
+                img.save(temp_file, image_format, **save_options)
+    elif use_writer:
+        png_writer(img, output_file)
+    else:
+        # Some formats seek while being saved, which pipes can not do.
+        encoded_image = io.BytesIO()
+        img.save(encoded_image, image_format, **save_options)
+        output_file.write(encoded_image.getvalue())
+
+    return output_file
+
+
+def _write_frames(fname, ogim, data, fsync=False):
+    """
+    Creates the multi-frame image fname with the frames of ogim holding data. Returns name of image created.
+
+    Multi-page tiffs are written as tiffs and animations as apngs, keeping the number of frames and their timing.
+    """
+    frames = []
+    durations = []
+    frame_start = 0
+
+    for frame in _frames(ogim):
+        frame_len = len(_carrier_bytes(frame))
+        frames.append(_dirty_image(frame, data[frame_start:frame_start + frame_len]))
+        durations.append(frame.info.get('duration', 0))
+        frame_start += frame_len
+
+    if ogim.format == 'TIFF':
+        return _save_image(frames[0], fname, 'tiff', fsync, save_all=True, append_images=frames[1:])
+
+    # Each frame replaces the whole canvas, so every frame can be revealed as it was hidden in.
+    return _save_image(frames[0], fname, 'png', fsync, save_all=True, append_images=frames[1:], duration=durations,
+                       loop=ogim.info.get('loop', 0), disposal=0, blend=0)
+
+
+def _write_image_file(fname, og_fname, data, fsync=False, png_writer=None):
+    """
+    Create a image fname and writes the passed in data to it. Returns name of image created.
+
+    Both fname and og_fname can be file objects instead of names. Named images replace fname in one step, and are
+    flushed to disk first with fsync. Single frame pngs are written by png_writer when it is given, see _save_image.
+    """
     try:
         with Image.open(og_fname) as ogim:
+            if _frame_count(ogim) > 1:
+                return _write_frames(fname, ogim, data[1], fsync)
+
+            # PNGs cannot hold every high bit depth mode, so those images are written as tiffs.
+            if ogim.mode in _WIDE_MODES:
+                return _save_image(_dirty_image(ogim, data[1]), fname, 'tiff', fsync)
+
+            # The carrier bytes of the modes steganographer.pngwriter writes are their pixels as they are, so those
+            # images are made in one step, instead of a pixel at a time.
+            if supports(ogim):
+                return _save_image(_dirty_image(ogim, data[1]), fname, 'png', fsync, png_writer)
+
             img = Image.new(ogim.mode, ogim.size)
             img.putdata(_pack_image(data))
-            fname_no_ext, _ = os.path.splitext(fname)
-            img.save(fname_no_ext + '.png', 'png')
-            return fname_no_ext + '.png'
+            return _save_image(img, fname, 'png', fsync, png_writer)
 
     except FileNotFoundError:
         print("Could not read file", og_fname)
@@ -82,38 +463,83 @@ def _write_image_file(fname, og_fname, data):
 
 class Header:
 
-    """The header that is stored at the beginning of steganogrified images."""
-
-    _HEADER_TITLE = "STEGS"
-    _HEADER_DATA_SIZE = 10  # The size of the data segment in the header.
-    _HEADER_BITS_SIZE = 1  # The size of the header segment for storing the number of bits from a byte used.
-    _HEADER_FILE_LENGTH_SIZE = 2  # The size of the header segment for storing the file length.
-
-    def __init__(self, data_len=0, bits_used=1, file_name=""):
-        self.title = self._HEADER_TITLE
+    """
+    The header that is stored at the beginning of steganogrified images.
+
+    Version 2 headers start with a fixed size prefix that is packed and parsed with one struct, followed by the file
+    name. Version 1 headers, titled STEGS, can still be retrieved. Both fit in the first PREFIX_LENGTH bytes.
+    """
+
+    __slots__ = ('version', 'flags', 'data_len', 'bits_used', 'codec', 'checksum', 'file_name_len', 'file_name')
+
+    _MAGIC = b"STEG"
+    _VERSION = 2
+    # Magic, version, flags, data length, bits used, codec, checksum and file name length.
+    _PREFIX = struct.Struct('<4sBBQBBIH')
+    _LEGACY_TITLE = b"STEGS"  # Version 1 headers, the S is where version 2 headers store the version.
+    # Title, data length, bits used and file name length.
+    _LEGACY_PREFIX = struct.Struct('<5s10sBH')
+    PREFIX_LENGTH = max(_PREFIX.size, _LEGACY_PREFIX.size)
+    FLAG_CHECKSUM = 0x01  # The checksum holds the CRC32 of the data.
+    FLAG_CHUNKED = 0x02  # The data starts with a table of chunks, each with its own length and checksum.
+
+    def __init__(self, data_len=0, bits_used=1, file_name="", flags=0, codec=0, checksum=0):
+        self.version = self._VERSION
+        self.flags = flags
         self.data_len = data_len
         self.bits_used = bits_used
-        self.file_name_len = len(file_name)
+        self.codec = codec
+        self.checksum = checksum
         self.file_name = file_name
+        self.file_name_len = len(self._file_name_bytes)
+
+    @property
+    def _file_name_bytes(self):
+        """The file name is a string when the header is generated and bytes when it is retrieved."""
+        if isinstance(self.file_name, str):
+            return self.file_name.encode('utf-8')
+
+        return self.file_name
+
+    @property
+    def prefix_length(self):
+        """Returns the number of bytes needed to retrieve the header, without the file name."""
+        return self.PREFIX_LENGTH
 
     @property
     def header_length(self):
         """Returns the length of the header data."""
-        length = len(self._HEADER_TITLE) + self._HEADER_DATA_SIZE + self._HEADER_BITS_SIZE + \
-            self._HEADER_FILE_LENGTH_SIZE + self.file_name_len
+        if self.version == 1:
+            return self._LEGACY_PREFIX.size + self.file_name_len
+
+        return self._PREFIX.size + self.file_name_len
+
+    def _pack_prefix(self):
+        """Returns the fixed size prefix of the header as bytes."""
+        if self.version == 1:
+            return self._LEGACY_PREFIX.pack(self._LEGACY_TITLE, self.data_len.to_bytes(10, "little"), self.bits_used,
+                                            self.file_name_len)
+
+        return self._PREFIX.pack(self._MAGIC, self.version, self.flags, self.data_len, self.bits_used, self.codec,
+                                 self.checksum, self.file_name_len)
+
+    def _unpack_prefix(self, potential_header):
+        """Sets the attributes stored in the fixed size prefix of potential_header. Returns if it is valid."""
+        if potential_header[:len(self._LEGACY_TITLE)] == self._LEGACY_TITLE:
+            _, data_len, self.bits_used, self.file_name_len = self._LEGACY_PREFIX.unpack_from(potential_header)
+            self.version, self.flags, self.codec, self.checksum = 1, 0, 0, 0
+            self.data_len = int.from_bytes(data_len, "little")
+            return True
+
+        magic, self.version, self.flags, self.data_len, self.bits_used, self.codec, self.checksum, \
+            self.file_name_len = self._PREFIX.unpack_from(potential_header)
 
-        return length
+        return magic == self._MAGIC and self.version == self._VERSION
 
     @property
     def header_as_bytes(self):
         """Converts the header into a bytes object."""
-        header = bytes(self._HEADER_TITLE, 'utf-8') + \
-            bytes(self.data_len.to_bytes(self._HEADER_DATA_SIZE, "little")) + \
-            bytes(self.bits_used.to_bytes(self._HEADER_BITS_SIZE, "little")) + \
-            bytes(self.file_name_len.to_bytes(self._HEADER_FILE_LENGTH_SIZE, "little")) + \
-            bytes(self.file_name, 'utf-8')
-
-        return header
+        return self._pack_prefix() + self._file_name_bytes
 
     def retrieve_header(self, potential_header):
         """
@@ -121,22 +547,45 @@ class Header:
 
         Returns if there is a valid header or not.
         """
-        header_title = potential_header[:len(self.title)]
-        self.data_len = int.from_bytes(
-            potential_header[len(self.title):len(self.title) + self._HEADER_DATA_SIZE], "little")
-        self.bits_used = int.from_bytes(
-            potential_header[len(self.title) + self._HEADER_DATA_SIZE:
-                             len(self.title) + self._HEADER_DATA_SIZE + self._HEADER_BITS_SIZE], "little")
-        self.file_name_len = int.from_bytes(
-            potential_header[len(self.title) + self._HEADER_DATA_SIZE + self._HEADER_BITS_SIZE:
-                             len(self.title) + self._HEADER_DATA_SIZE + self._HEADER_BITS_SIZE +
-                             self._HEADER_FILE_LENGTH_SIZE], "little")
-        self.file_name = potential_header[len(self.title) + self._HEADER_DATA_SIZE + self._HEADER_BITS_SIZE +
-                                          self._HEADER_FILE_LENGTH_SIZE:
-                                          len(self.title) + self._HEADER_DATA_SIZE + self._HEADER_BITS_SIZE +
-                                          self._HEADER_FILE_LENGTH_SIZE + self.file_name_len]
+        if len(potential_header) < self.prefix_length:
+            return False
+
+        is_header_valid = self._unpack_prefix(potential_header)
+        name_start = self.header_length - self.file_name_len
+        self.file_name = bytes(potential_header[name_start:name_start + self.file_name_len])
+
+        return is_header_valid
+
+
+def _job(action):
+    """
+    Makes the method a job of action, counted in the metrics of its Steganographer with how long each stage took.
+    A job called by another one is part of it.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def job(self, *args, **kwargs):
+            if self._job_action is not None:
+                return method(self, *args, **kwargs)
 
-        return header_title == self.title.encode('utf-8')
+            self._job_action = action
+
+            try:
+                return method(self, *args, **kwargs)
+            except BaseException:
+                if self._metrics is not None:
+                    self._metrics.failures.inc(action=action)
+                raise
+            finally:
+                self._end_stage()
+                self._job_action = None
+
+                if self._metrics is not None:
+                    self._metrics.jobs.inc(action=action)
+
+        return job
+
+    return decorate
 
 
 class Steganographer:
@@ -144,12 +593,182 @@ class Steganographer:
     """Takes care of hiding and revealing messages and files in an image."""
 
     _BYTELEN = 8
-    _header = Header()
+    _CHUNK_LEN = 64 * 1024  # The number of bytes of data hidden or revealed at a time.
+
+    def __init__(self, carrier_cache=None, result_cache=None, fsync='never', progress=None, cancel_token=None,
+                 limits=None, memory_budget=None, metrics=None, key=None, png_workers=None,
+                 template_cache=None):
+        """
+        Setting header data_len, so retrieving the header knows how much data to grab.
+
+        A carrier_cache, like steganographer.cache.CarrierCache, is used to open the clean images data is hidden in.
+        A result_cache, like steganographer.cache.ResultCache, hands back images that were already made once.
+        Images written are always renamed into place once whole. The fsync policy says when they are flushed to
+        disk, 'file' before each one is returned, 'batch' when steganographer_sync is called, or 'never'.
+        The progress callback is called with a steganographer.progress.Progress after every chunk hidden or
+        revealed, and a steganographer.progress.CancelToken stops the work between chunks.
+        Hides are checked against the capacity of the image, and any steganographer.limits.ResourceLimits, from the
+        image metadata before anything is decoded. With a steganographer.limits.MemoryBudget shared by the hides
+        running at the same time, each one waits for the memory it is estimated to need first.
+        Jobs, the bytes hidden and revealed, and how long each stage takes are kept in steganographer.metrics.Metrics.
+        With a key, a string or bytes, everything is hidden scattered over the whole carrier in an order only the key
+        gives, see steganographer.scatter, and is only revealed with the same key. Carriers are then read whole
+        instead of streamed, and nothing is taken from or kept in the result cache.
+        With png_workers, pngs written are deflated in that many threads at the same time by
+        steganographer.pngwriter, scaling with the cores for large images, instead of by Pillow in one.
+        A template_cache, like steganographer.cache.TemplateCache, keeps covers encoded, so pngs hidden in them
+        without a key only have the rows the hide changed deflated again, see steganographer.pngwriter.PngTemplate.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError("The fsync policy %s is not one of %s." % (fsync, ", ".join(FSYNC_POLICIES)))
 
-    def __init__(self):
-        """Setting header data_len, so retrieving the header knows how much data to grab."""
+        self._header = Header()  # Each instance has its own, so instances can hide and reveal at the same time.
         self._header.data_len = self._header.header_length  # The only data is the header.
         self._header.bits_used = 1
+        self._carrier_cache = carrier_cache
+        self._result_cache = result_cache
+        self._fsync = fsync
+        self._unsynced = []  # Images written since the last steganographer_sync, with the batch policy.
+        self._progress = progress
+        self._cancel_token = cancel_token
+        self._stage = None
+        self._stage_start = 0.0
+        self._limits = limits
+        self._memory_budget = memory_budget
+        self._metrics = metrics
+        self._job_action = None  # The action of the job being done.
+        self._carrier_len = 0  # The carrier bytes in the image of the job.
+        self._seed = key_seed(key) if key is not None else None
+        self._png_workers = png_workers
+        self._template_cache = template_cache
+
+    def _report(self, stage, bytes_done=0, bytes_total=0):
+        """Stops if the work has been cancelled, otherwise tells the progress callback how far stage has got."""
+        if self._cancel_token is not None:
+            self._cancel_token.check()
+
+        if stage != self._stage:
+            self._end_stage()
+            self._stage, self._stage_start = stage, time.monotonic()
+
+        if self._progress is None:
+            return
+
+        self._progress(Progress(stage, bytes_done, bytes_total, time.monotonic() - self._stage_start))
+
+    def _end_stage(self):
+        """Ends the current stage, putting how long it took in the metrics."""
+        if self._metrics is not None and self._stage is not None:
+            self._metrics.stage_seconds.observe(time.monotonic() - self._stage_start, stage=self._stage)
+
+        self._stage = None
+
+    def _measure(self, data_len, carrier_len):
+        """Counts the data_len bytes hidden or revealed by the job, and the carrier_len of its image, in the metrics."""
+        if self._metrics is None:
+            return
+
+        if self._job_action == 'reveal':
+            self._metrics.revealed_bytes.inc(data_len)
+        else:
+            self._metrics.embedded_bytes.inc(data_len)
+
+        self._metrics.carrier_bytes.observe(carrier_len, action=self._job_action)
+
+    def _preflight(self, clean_image_file, data_len, dirty_image_file=None):
+        """
+        Checks hiding the current header followed by data_len bytes in clean_image_file from its metadata alone.
+
+        Raises CapacityError when they do not fit and ResourceLimitError when the hide goes over the limits. Returns
+        the bytes of memory the hide is estimated to need, streaming the image when it is a carrier or is an
+        uncompressed image hidden in to dirty_image_file, decoding it otherwise.
+        """
+        carrier = open_carrier(clean_image_file)
+        pixel_count = None
+
+        if carrier is not None:
+            carrier_len = carrier.carrier_length
+        else:
+            try:
+                with Image.open(clean_image_file) as img:
+                    carrier_len = _image_length(img)
+                    pixel_count = img.width * img.height * _frame_count(img)
+
+            except FileNotFoundError:
+                print("Could not read file", clean_image_file)
+                sys.exit()
+
+        hidden_len = self._header.header_length + data_len
+        self._carrier_len = carrier_len
+
+        if hidden_len * self._BYTELEN > carrier_len:
+            image_name = clean_image_file if isinstance(clean_image_file, str) else '-'
+            capacity = max(carrier_len // self._BYTELEN - self._header.header_length, 0)
+            raise CapacityError("The image %s can hold %d bytes, not %d." % (image_name, capacity, data_len))
+
+        memory = hidden_len * _HIDDEN_BYTE_MEMORY
+
+        # Streaming never holds more of an image than decoding it would. Scattering holds all of it.
+        if self._seed is None and (carrier is not None or
+                                   _streamed_raw_image(clean_image_file, dirty_image_file) is not None):
+            memory += min(_STREAM_MEMORY, carrier_len * _DECODED_CARRIER_MEMORY)
+        else:
+            memory += (pixel_count or 0) * _DECODED_PIXEL_MEMORY + carrier_len * _DECODED_CARRIER_MEMORY
+
+        if self._seed is not None:
+            memory += carrier_len * _SCATTER_MEMORY
+
+        if self._limits is not None:
+            self._limits.check(pixel_count, data_len, memory)
+
+        return memory
+
+    def _reserve(self, memory):
+        """Holds memory bytes of the memory budget while in it, when there is one."""
+        if self._memory_budget is None:
+            return contextlib.nullcontext()
+
+        return self._memory_budget.reserve(memory)
+
+    def _output_written(self, output_file, synced=False):
+        """Flushes output_file to disk now or with the batch, as the fsync policy says, unless synced. Returns it."""
+        if not isinstance(output_file, str):
+            return output_file
+
+        if self._fsync == 'batch':
+            self._unsynced.append(output_file)
+        elif self._fsync == 'file' and not synced:
+            _sync_outputs([output_file])
+
+        return output_file
+
+    def steganographer_sync(self):
+        """Flushes the images written since the last call to disk, for the batch fsync policy. Returns their names."""
+        synced, self._unsynced = self._unsynced, []
+        _sync_outputs(synced)
+
+        return synced
+
+    def _open_carrier(self, clean_image_file):
+        """Returns the data of the clean image, from the carrier cache when there is one."""
+        if self._carrier_cache is None or not isinstance(clean_image_file, str):
+            return _open_image_file(clean_image_file)
+
+        return self._carrier_cache.open_image(clean_image_file)
+
+    def _gather(self, carrier_data):
+        """Returns carrier_data in the order data is hidden in it, which is scattered over it with a key."""
+        return carrier_data if self._seed is None else gather(carrier_data, self._seed)
+
+    def _scatter(self, gathered_data):
+        """Returns gathered_data, carrier data in the order data is hidden in, in the order of the carrier again."""
+        return gathered_data if self._seed is None else scatter(gathered_data, self._seed)
+
+    def _open_hidden(self, fimage):
+        """Returns the same tuple as _open_image_file does for fimage, with the carrier bytes gathered."""
+        pixel_len, dirty_data = _open_image_file(fimage)
+
+        return pixel_len, self._gather(dirty_data)
 
     def _generate_header(self, data_size, bits_to_use, file_name):
         """
@@ -165,22 +784,40 @@ class Steganographer:
         """
         Retrieves the header from the data passed in and sets the appropriate attributes.
 
-        Returns if there is a valid header or not.
+        Only the fixed size prefix and then the file name are revealed. Returns if there is a valid header or not.
         """
-        bytes_to_hide_header = self._header.header_length * self._BYTELEN
-        self._header.data_len = bytes_to_hide_header  # The only data is the header.
-        header_as_bytes = self._reveal_data(data[:bytes_to_hide_header])
-        is_header_valid = self._header.retrieve_header(header_as_bytes)
+        prefix_length = self._header.prefix_length
+        is_header_valid = self._header.retrieve_header(
+            self._reveal_data(data[:prefix_length * self._BYTELEN], prefix_length))
 
         # Getting the file name if one exist and updating the header.
-        if self._header.file_name_len > 0:
-            bytes_to_hide_header = self._header.header_length * self._BYTELEN
-            self._header.data_len = bytes_to_hide_header  # The only data is the header.
-            header_as_bytes = self._reveal_data(data[:bytes_to_hide_header])
-            is_header_valid = self._header.retrieve_header(header_as_bytes)
+        if is_header_valid and self._header.file_name_len > 0:
+            name_start = (self._header.header_length - self._header.file_name_len) * self._BYTELEN
+            self._header.file_name = self._reveal_data(data[name_start:self._header.header_length * self._BYTELEN],
+                                                       self._header.file_name_len)
 
         return is_header_valid
 
+    def _retrieve_entries(self, data):
+        """
+        Walks the entries hidden one after another in data, starting with the first one.
+
+        Returns a list of (offset, header) tuples for every entry found and the offset just past the last entry.
+        """
+        entries = []
+        offset = 0
+
+        while offset < len(data):
+            self._header = Header()
+
+            if self._retrieve_header(data[offset:]) is False:
+                break
+
+            entries.append((offset, self._header))
+            offset += (self._header.header_length + self._header.data_len) * self._BYTELEN
+
+        return entries, offset
+
     def _hide_byte(self, clean_data, val):
         """
         Hides a byte val in clean_data. Returns bytes.
@@ -248,81 +885,709 @@ class Steganographer:
 
         Expects a bytes clean_data of any length and another bytes val. Will return a bytes with the val's
         bits hidden in the least significant bits of clean_data.
+
+        Works on the whole of clean_data at once, by turning the bits of val into a bytes of 0s and 1s and combining
+        it with clean_data as big integers.
         """
-        hidden_data = bytearray()
+        hidden_len = min(len(val) * self._BYTELEN, len(clean_data))
 
-        for data_index, str_index in zip(range(0, len(clean_data), self._BYTELEN), range(len(val))):
-            clean_byte = clean_data[data_index:data_index + self._BYTELEN]
-            hidden_byte = self._hide_byte(clean_byte, val[str_index])
-            hidden_data.extend(hidden_byte)
+        if hidden_len == 0:
+            return bytes(clean_data)
 
-        hidden_data = hidden_data + clean_data[len(hidden_data):]
+        val_len = -(-hidden_len // self._BYTELEN)
+        val_bits = int.from_bytes(val[:val_len], "big") >> (val_len * self._BYTELEN - hidden_len)
+        bit_data = format(val_bits, '0%db' % hidden_len).encode('ascii').translate(_ASCII_TO_BIT)
+        cleared_data = bytes(clean_data[:hidden_len]).translate(_CLEAR_LSB)
+        hidden_data = int.from_bytes(cleared_data, "big") | int.from_bytes(bit_data, "big")
 
-        return bytes(hidden_data)
+        return hidden_data.to_bytes(hidden_len, "big") + bytes(clean_data[hidden_len:])
 
-    def _reveal_data(self, hidden_data):
+    def _reveal_data(self, hidden_data, revealed_data_len=None):
         """
         Returns the data hidden in hidden_data.
 
         Expects a bytes hidden_data of any length. Will pull out the least significant bits from each byte and
-        return them as a bytes.
+        return them as a bytes. Reveals revealed_data_len bytes, which defaults to the data length in the header.
+
+        Works on the whole of hidden_data at once, by reading its least significant bits as one binary number.
         """
-        revealed_data_len = self._header.data_len
-        revealed_data = bytearray()
+        if revealed_data_len is None:
+            revealed_data_len = self._header.data_len
 
-        for i in range(0, revealed_data_len * self._BYTELEN, self._BYTELEN):
-            revealed_data.extend(self._reveal_byte(hidden_data[i:i + self._BYTELEN]))
+        bit_data = bytes(hidden_data[:revealed_data_len * self._BYTELEN])
 
-        return bytes(revealed_data)
+        if len(bit_data) == 0:
+            return bytes()
 
-    def steganographer_hide(self, clean_image_file, text, dirty_image_file=''):
+        padding = -len(bit_data) % self._BYTELEN
+        revealed_data = int(bit_data.translate(_LSB_TO_ASCII), 2) << padding
+
+        return revealed_data.to_bytes((len(bit_data) + padding) // self._BYTELEN, "big")
+
+    def _reveal_chunks(self, hidden_data, revealed_data_len):
+        """Yields the revealed_data_len bytes hidden in hidden_data, revealed a chunk at a time with progress."""
+        self._report('reveal', 0, revealed_data_len)
+
+        for chunk_start in range(0, revealed_data_len, self._CHUNK_LEN):
+            chunk_len = min(self._CHUNK_LEN, revealed_data_len - chunk_start)
+            yield self._reveal_data(hidden_data[chunk_start * self._BYTELEN:(chunk_start + chunk_len) * self._BYTELEN],
+                                    chunk_len)
+            self._report('reveal', chunk_start + chunk_len, revealed_data_len)
+
+    def _reveal_chunked(self, hidden_data, revealed_data_len):
+        """Returns the revealed_data_len bytes hidden in hidden_data, revealed a chunk at a time with progress."""
+        return b''.join(self._reveal_chunks(hidden_data, revealed_data_len))
+
+    def _hide_entry(self, clean_data, data):
+        """
+        Hides the current header followed by data at the beginning of clean_data. Returns a bytes as long as it.
+
+        The data is hidden a chunk at a time and its checksum worked out along the way, then the header is hidden
+        with the checksum in it.
+        """
+        header_end = self._header.header_length * self._BYTELEN
+        dirty_chunks = []
+        checksum = 0
+        self._report('hide', 0, len(data))
+
+        for chunk_start in range(0, len(data), self._CHUNK_LEN):
+            chunk = data[chunk_start:chunk_start + self._CHUNK_LEN]
+            carrier_start = header_end + chunk_start * self._BYTELEN
+            dirty_chunks.append(self._hide_data(clean_data[carrier_start:carrier_start + len(chunk) * self._BYTELEN],
+                                                chunk))
+            checksum = zlib.crc32(chunk, checksum)
+            self._report('hide', chunk_start + len(chunk), len(data))
+
+        self._header.checksum = checksum
+        self._header.flags |= Header.FLAG_CHECKSUM
+        data_end = header_end + len(data) * self._BYTELEN
+
+        return self._hide_data(clean_data[:header_end], self._header.header_as_bytes) + b''.join(dirty_chunks) + \
+            clean_data[data_end:]
+
+    def _verify_entry(self, dirty_data, offset, header):
+        """
+        Checks the data of the entry at offset in dirty_data against the checksum in its header, a chunk at a time.
+
+        Returns if the checksum matches, or None if the header has no checksum.
+        """
+        if not header.flags & Header.FLAG_CHECKSUM:
+            return None
+
+        data_start = offset + header.header_length * self._BYTELEN
+        data_end = data_start + header.data_len * self._BYTELEN
+        chunk_len = self._CHUNK_LEN * self._BYTELEN
+        checksum = 0
+
+        for chunk_start in range(data_start, data_end, chunk_len):
+            hidden_chunk = dirty_data[chunk_start:min(chunk_start + chunk_len, data_end)]
+            checksum = zlib.crc32(self._reveal_data(hidden_chunk, self._CHUNK_LEN), checksum)
+
+        return checksum == header.checksum and len(dirty_data) >= data_end
+
+    @staticmethod
+    def _write_in_file(raw_image, dirty_image_file, carrier_data):
+        """Writes carrier_data over the first carrier bytes of the uncompressed image dirty_image_file."""
+        with open(dirty_image_file, 'r+b') as fimage, mmap.mmap(fimage.fileno(), 0) as mapped:
+            raw_image.write(mapped, carrier_data)
+
+    def _hide_in_file(self, raw_image, dirty_image_file, data):
+        """Hides the current header followed by data in the pixels of the uncompressed image dirty_image_file."""
+        # Scattered data can be anywhere in the carrier, so all of it is read.
+        carrier_len = (self._header.header_length + len(data)) * self._BYTELEN if self._seed is None else sys.maxsize
+
+        with open(dirty_image_file, 'r+b') as fimage, mmap.mmap(fimage.fileno(), 0) as mapped:
+            clean_data = raw_image.read(mapped, carrier_len)[:carrier_len]
+            raw_image.write(mapped, self._scatter(self._hide_entry(self._gather(clean_data), data)))
+
+    def _hide_stream(self, carrier, data, output_file):
+        """
+        Hides the current header followed by data at the beginning of carrier, writing it out to output_file.
+
+        The carrier is read, hidden in and written a chunk at a time. Chunks can be any length, the bits of the data
+        are lined up with wherever each chunk starts.
+        """
+        if self._seed is not None:
+            self._hide_scattered_stream(carrier, data, output_file)
+            return
+
+        self._header.checksum = zlib.crc32(data)
+        self._header.flags |= Header.FLAG_CHECKSUM
+        hidden_data = self._header.header_as_bytes + data
+        hidden_bits = len(hidden_data) * self._BYTELEN
+        carrier_start = 0
+        self._report('hide', 0, len(hidden_data))
+
+        def hide_chunk(clean_chunk):
+            nonlocal carrier_start
+
+            if carrier_start < hidden_bits:
+                self._report('hide', carrier_start // self._BYTELEN, len(hidden_data))
+
+            hidden_len = max(min(len(clean_chunk), hidden_bits - carrier_start), 0)
+            hidden_end = -(-(carrier_start + hidden_len) // self._BYTELEN)
+            hidden_chunk = hidden_data[carrier_start // self._BYTELEN:hidden_end]
+            bit_offset = carrier_start % self._BYTELEN
+            carrier_start += len(clean_chunk)
+
+            # Shifting out the bits hidden in the chunk before, so the first bit left is the first one for this chunk.
+            if bit_offset:
+                chunk_mask = (1 << len(hidden_chunk) * self._BYTELEN) - 1
+                hidden_chunk = ((int.from_bytes(hidden_chunk, "big") << bit_offset) & chunk_mask).to_bytes(
+                    len(hidden_chunk), "big")
+
+            return self._hide_data(clean_chunk[:hidden_len], hidden_chunk) + bytes(clean_chunk[hidden_len:])
+
+        carrier.hide(output_file, hide_chunk)
+        self._report('hide', len(hidden_data), len(hidden_data))
+
+    def _hide_scattered_stream(self, carrier, data, output_file):
+        """Hides the current header followed by data scattered over carrier, which is read whole first."""
+        dirty_data = self._scatter(self._hide_entry(self._gather(b''.join(carrier.read_chunks())), data))
+        carrier_start = 0
+
+        def hide_chunk(clean_chunk):
+            nonlocal carrier_start
+            carrier_start += len(clean_chunk)
+
+            return dirty_data[carrier_start - len(clean_chunk):carrier_start]
+
+        carrier.hide(output_file, hide_chunk)
+
+    def _reveal_stream(self, carrier):
+        """
+        Reveals the data hidden at the beginning of carrier, reading only the chunks it is hidden in.
+
+        Returns the data, or None if there is no valid header. See _reveal_stream_chunks.
+        """
+        revealed_chunks = self._reveal_stream_chunks(carrier)
+
+        return None if revealed_chunks is None else b''.join(revealed_chunks)
+
+    def _reveal_stream_chunks(self, carrier):
+        """
+        Reveals the header at the beginning of carrier. Returns an iterator of the chunks of the data after it, each
+        revealed as the carrier chunks it is hidden in are read, or None if there is no valid header.
+
+        Data scattered with a key is revealed from the whole carrier, which is read first.
+        """
+        if self._seed is not None:
+            hidden_data = self._gather(b''.join(carrier.read_chunks()))
+
+            if self._retrieve_header(hidden_data) is False:
+                return None
+
+            return self._reveal_chunks(hidden_data[self._header.header_length * self._BYTELEN:], self._header.data_len)
+
+        carrier_chunks = carrier.read_chunks()
+        hidden_data = bytearray()
+
+        def read_carrier(carrier_len):
+            while len(hidden_data) < carrier_len:
+                carrier_chunk = next(carrier_chunks, None)
+
+                if carrier_chunk is None:
+                    return False
+
+                hidden_data.extend(carrier_chunk)
+
+            return True
+
+        read_carrier(self._header.prefix_length * self._BYTELEN)
+
+        if not self._header.retrieve_header(self._reveal_data(hidden_data, self._header.prefix_length)):
+            carrier_chunks.close()
+            return None
+
+        read_carrier(self._header.header_length * self._BYTELEN)
+        self._retrieve_header(hidden_data)
+        del hidden_data[:self._header.header_length * self._BYTELEN]
+
+        def reveal_chunks():
+            hidden_len = self._header.data_len * self._BYTELEN
+            revealed_len = 0
+
+            # Only whole bytes are revealed from each chunk, the rest of the chunk waits for the next one.
+            while True:
+                whole_len = min(len(hidden_data), hidden_len)
+                whole_len -= whole_len % self._BYTELEN
+                yield self._reveal_data(hidden_data[:whole_len], whole_len // self._BYTELEN)
+                del hidden_data[:whole_len]
+                hidden_len -= whole_len
+                revealed_len += whole_len // self._BYTELEN
+                self._report('reveal', revealed_len, self._header.data_len)
+
+                if hidden_len == 0 or not read_carrier(len(hidden_data) + 1):
+                    break
+
+            # A carrier that ends part way through a byte still gives the bits it has.
+            if hidden_len > 0:
+                yield self._reveal_data(hidden_data, -(-len(hidden_data) // self._BYTELEN))
+
+            carrier_chunks.close()
+
+        return reveal_chunks()
+
+    def _frame_payload(self, clean_image_file, data, dirty_image_file, chunk_size=None, in_place=False):
+        """
+        Splits data into chunks when chunk_size is given, and works out the name of the dirty image.
+
+        Returns the data to hide after the header and the dirty image file. Raises ValueError when in_place is asked
+        for with another dirty image file, or for an image that can not be hidden in where it is.
+        """
+        if in_place and dirty_image_file not in ('', clean_image_file):
+            raise ValueError("Hiding in place writes to %s itself, not to %s." % (clean_image_file, dirty_image_file))
+
+        if in_place and open_carrier(clean_image_file) is None and \
+                _streamed_raw_image(clean_image_file, clean_image_file) is None:
+            raise ValueError("Only uncompressed bmp, ppm and tiff images and carriers can be hidden in in place, "
+                             "not %s." % (clean_image_file if isinstance(clean_image_file, str) else '-'))
+
+        if chunk_size:
+            data = _frame_chunks(data, chunk_size)
+            self._header.data_len = len(data)
+            self._header.flags |= Header.FLAG_CHUNKED
+
+        return data, _dirty_image_name(clean_image_file, dirty_image_file, in_place)
+
+    def _hide_streamed(self, clean_image_file, data, dirty_image_file, in_place=False):
+        """
+        Hides the current header followed by data in a carrier or uncompressed image without decoding it.
+
+        Returns the name of the file created, or None if clean_image_file has to go through Pillow.
+        """
+        carrier = open_carrier(clean_image_file)
+        is_named = isinstance(clean_image_file, str) and isinstance(dirty_image_file, str)
+        fsync = self._fsync == 'file'
+
+        if carrier is not None and not is_named:
+            self._hide_stream(carrier, data, dirty_image_file)
+
+            return dirty_image_file
+
+        if carrier is not None:
+            output_file = os.path.splitext(dirty_image_file)[0] + carrier.extension
+
+            # The carrier is still being read while the output is written, so it is always written beside it first.
+            with _atomic_output(output_file, fsync) as temp_file:
+                self._hide_stream(carrier, data, temp_file)
+
+            return self._output_written(output_file, synced=True)
+
+        raw_image = _streamed_raw_image(clean_image_file, dirty_image_file)
+
+        if raw_image is None:
+            return None
+
+        # In place only the carrier bytes change, so an image cut off part way still opens.
+        if in_place:
+            self._hide_in_file(raw_image, dirty_image_file, data)
+
+            return self._output_written(dirty_image_file)
+
+        with _atomic_output(dirty_image_file, fsync) as temp_file:
+            shutil.copyfile(clean_image_file, temp_file)
+            self._hide_in_file(raw_image, temp_file, data)
+
+        return self._output_written(dirty_image_file, synced=True)
+
+    def _png_writer(self, clean_image_file, changed_len=None):
+        """
+        Returns the function pngs made from clean_image_file are written with, see _save_image, or None for Pillow.
+
+        When only the first changed_len carrier bytes were changed, and there is a template cache, that is the
+        template of clean_image_file.
+        """
+        template = None
+
+        if self._template_cache is not None and changed_len is not None and isinstance(clean_image_file, str):
+            template = self._template_cache.open_template(clean_image_file)
+
+        if template is not None:
+            return functools.partial(template.save, changed_len=changed_len, workers=self._png_workers)
+
+        if self._png_workers is not None:
+            return functools.partial(save_png, workers=self._png_workers)
+
+        return None
+
+    def _write_dirty_image(self, dirty_image_file, clean_image_file, dirty_data, changed_len=None):
+        """
+        Writes the dirty_data hidden in clean_image_file out to dirty_image_file. Returns the name of the image.
+
+        changed_len is the number of carrier bytes from the start that can differ from clean_image_file, if known.
+        """
+        self._report('write')
+        output_file = _write_image_file(dirty_image_file, clean_image_file, dirty_data, self._fsync == 'file',
+                                        self._png_writer(clean_image_file, changed_len))
+
+        return self._output_written(output_file, synced=True)
+
+    @_job('hide')
+    def _hide_payload(self, clean_image_file, data, dirty_image_file, chunk_size=None, in_place=False):
+        """
+        Hides the current header followed by data inside clean_image_file and outputs dirty_image_file.
+
+        When chunk_size is given the data is split into chunks that can be revealed and checked on their own.
+        Uncompressed bmp, ppm and tiff images are copied and changed where the pixels are in the file, keeping their
+        format, or changed where they are with in_place. Wav files are streamed through their carrier a chunk at a
+        time. The images can also be file objects, like stdin and stdout, which always go through Pillow. Named
+        images are written beside the output and renamed over it. Returns the name of the image created, or the file
+        object it was written to.
+
+        Nothing is decoded before the hide is checked against the capacity of the image and the limits, and has the
+        memory it needs from the memory budget.
+        """
+        data, dirty_image_file = self._frame_payload(clean_image_file, data, dirty_image_file, chunk_size, in_place)
+
+        with self._reserve(self._preflight(clean_image_file, len(data), dirty_image_file)):
+            output_file = self._hide_framed(clean_image_file, data, dirty_image_file, in_place)
+
+        self._measure(len(data), self._carrier_len)
+
+        return output_file
+
+    def _hide_framed(self, clean_image_file, data, dirty_image_file, in_place=False):
+        """Hides the current header followed by the framed data, see _hide_payload. Returns the image created."""
+        output_file = self._hide_streamed(clean_image_file, data, dirty_image_file, in_place)
+
+        if output_file is not None:
+            return output_file
+
+        # Images scattered over with a key are never cached, so the key is not kept anywhere.
+        is_cached = self._result_cache is not None and self._seed is None and isinstance(clean_image_file, str) and \
+            isinstance(dirty_image_file, str)
+
+        if is_cached:
+            output_format = _output_format(clean_image_file)
+            result_key = self._result_cache.key(clean_image_file, self._header.header_as_bytes, data, output_format)
+
+            if self._result_cache.fetch(result_key, _output_image_name(dirty_image_file, output_format)):
+                return self._output_written(_output_image_name(dirty_image_file, output_format))
+
+        self._report('read')
+        clean_data = self._open_carrier(clean_image_file)  # Is a tuple with the size of a pixel and the pixels.
+        dirty_data = self._scatter(self._hide_entry(self._gather(clean_data[1]), data))
+        changed_len = None if self._seed is not None else (self._header.header_length + len(data)) * self._BYTELEN
+        output_file = self._write_dirty_image(dirty_image_file, clean_image_file, (clean_data[0], dirty_data),
+                                              changed_len)
+
+        if is_cached:
+            self._result_cache.store(result_key, output_file)
+
+        return output_file
+
+    def steganographer_hide(self, clean_image_file, text, dirty_image_file='', chunk_size=None, in_place=False):
         """
         Hides text inside clean_image_file and outputs dirty_image_file.
 
         Takes in a clean image file name, a dirty image file name and text that will be hidden. Hides the text in
-        clean_image_file and outputs it to dirty_image_file.
+        clean_image_file and outputs it to dirty_image_file. With a chunk_size the text is hidden in chunks. With
+        in_place an uncompressed clean_image_file is changed itself.
         """
-        header = self._generate_header(len(text.encode('utf-8')), 1, "")
-        clean_data = _open_image_file(clean_image_file)  # Is a tuple with the size of a pixel and the pixels.
-        dirty_data = self._hide_data(clean_data[1][:len(header) * self._BYTELEN], header)
-        dirty_data += self._hide_string(clean_data[1][len(header) * self._BYTELEN:], text)
-        dirty_image_data = (clean_data[0], dirty_data)
+        data = text.encode('utf-8')
+        self._generate_header(len(data), 1, "")
 
-        if dirty_image_file == '':
-            clean_name = clean_image_file.split('.')[0]
-            clean_extension = clean_image_file.split('.')[1]
-            dirty_image_file = clean_name + "Steganogrified." + clean_extension
+        return self._hide_payload(clean_image_file, data, dirty_image_file, chunk_size, in_place)
 
-        output_file = _write_image_file(dirty_image_file, clean_image_file, dirty_image_data)
+    @_job('hide')
+    def steganographer_hide_file(self, clean_image_file, file_to_hide, dirty_image_file='', chunk_size=None,
+                                 in_place=False):
+        """
+        Hides file_to_hide inside clean_image_file and outputs to dirty_image_file.
 
-        return output_file
+        With a chunk_size the file is hidden in chunks, see steganographer_reveal_chunks. With in_place an
+        uncompressed clean_image_file is changed itself. The size of the file is checked before it is read.
+        """
+        self._generate_header(os.path.getsize(file_to_hide), 1, file_to_hide)
+        self._preflight(clean_image_file, _framed_length(self._header.data_len, chunk_size),
+                        _dirty_image_name(clean_image_file, dirty_image_file, in_place))
 
-    def steganographer_hide_file(self, clean_image_file, file_to_hide, dirty_image_file=''):
-        """Hides file_to_hide inside clean_image_file and outputs to dirty_image_file."""
         with open(file_to_hide, 'rb') as input_file:
-            header = self._generate_header(len(input_file.read()), 1, file_to_hide)
-            input_file.seek(0)
-            clean_data = _open_image_file(clean_image_file)  # Is a tuple with the size of a pixel and the pixels.
-            dirty_data = self._hide_data(clean_data[1][:self._header.header_length * self._BYTELEN], header)
-            dirty_data += self._hide_data(clean_data[1][self._header.header_length * self._BYTELEN:], input_file.read())
-            dirty_image_data = (clean_data[0], dirty_data)
+            data = input_file.read()
+
+        return self.steganographer_hide_data(clean_image_file, data, file_to_hide, dirty_image_file, chunk_size,
+                                             in_place)
+
+    def steganographer_hide_data(self, clean_image_file, data, file_name='', dirty_image_file='', chunk_size=None,
+                                 in_place=False):
+        """
+        Hides the bytes data inside clean_image_file under file_name and outputs to dirty_image_file.
+
+        For data that is not in a file, like data piped in. Without a file_name it is revealed like a message.
+        """
+        self._generate_header(len(data), 1, file_name)
+
+        return self._hide_payload(clean_image_file, data, dirty_image_file, chunk_size, in_place)
+
+    @_job('append')
+    def _append_data(self, dirty_image_file, data, file_name, output_image_file):
+        """
+        Hides data after the last entry already hidden in dirty_image_file and outputs output_image_file.
+
+        Only the carrier bytes holding the new header and data are touched, the existing entries are copied as is.
+        The image is checked against the limits before it is decoded, and against the room left after its entries
+        once it is. Uncompressed images are written back in their own format. Nothing can be appended to streamed
+        carriers, which raise SteganographerError.
+        """
+        if open_carrier(dirty_image_file) is not None:
+            raise SteganographerError("Nothing can be appended to %s, streamed carriers only hold one entry." %
+                                      dirty_image_file)
+
+        self._generate_header(len(data), 1, file_name)
+
+        with self._reserve(self._preflight(dirty_image_file, len(data))):
+            self._report('read')
+            dirty_data = self._open_hidden(dirty_image_file)  # Is a tuple with the size of a pixel and the pixels.
+            entries, end = self._retrieve_entries(dirty_data[1])
+
+            if not entries:
+                print("This file %s has no hidden message." % dirty_image_file)
+                sys.exit()
+
+            self._generate_header(len(data), 1, file_name)
+
+            if end + (self._header.header_length + len(data)) * self._BYTELEN > len(dirty_data[1]):
+                room_left = max((len(dirty_data[1]) - end) // self._BYTELEN - self._header.header_length, 0)
+                raise CapacityError("The image %s has room for %d more bytes, not %d." % (
+                    dirty_image_file if isinstance(dirty_image_file, str) else '-', room_left, len(data)))
 
-        if dirty_image_file == '':
-            clean_name = clean_image_file.split('.')[0]
-            clean_extension = clean_image_file.split('.')[1]
-            dirty_image_file = clean_name + "Steganogrified." + clean_extension
+            appended_data = dirty_data[1][:end] + self._hide_entry(dirty_data[1][end:], data)
+            # Only the carrier bytes up to the end of the new entry change, unless they are scattered.
+            written_len = len(appended_data) if self._seed is not None else \
+                end + (self._header.header_length + len(data)) * self._BYTELEN
 
-        output_file = _write_image_file(dirty_image_file, clean_image_file, dirty_image_data)
+            if output_image_file == '':
+                output_image_file = dirty_image_file
+
+            output_file = self._write_appended(dirty_image_file, output_image_file, self._scatter(appended_data),
+                                               written_len)
+
+            if output_file is None:
+                output_file = self._write_dirty_image(output_image_file, dirty_image_file,
+                                                      (dirty_data[0], self._scatter(appended_data)))
+
+        self._measure(len(data), len(dirty_data[1]))
 
         return output_file
 
+    def _write_appended(self, dirty_image_file, output_image_file, dirty_data, written_len):
+        """
+        Writes dirty_data, the carrier bytes of dirty_image_file with an entry appended, to output_image_file when
+        both are uncompressed images of the same format. Returns the name of the image written, or None otherwise.
+
+        Only the first written_len carrier bytes are written over, in dirty_image_file itself when it is the output,
+        so the image keeps its format as it does when hidden in.
+        """
+        fsync = self._fsync == 'file'
+        raw_image = _streamed_raw_image(dirty_image_file, output_image_file)
+
+        if raw_image is None:
+            return None
+
+        if output_image_file == dirty_image_file:
+            self._write_in_file(raw_image, dirty_image_file, dirty_data[:written_len])
+
+            return self._output_written(dirty_image_file)
+
+        with _atomic_output(output_image_file, fsync) as temp_file:
+            shutil.copyfile(dirty_image_file, temp_file)
+            self._write_in_file(raw_image, temp_file, dirty_data[:written_len])
+
+        return self._output_written(output_image_file, synced=True)
+
+    def steganographer_append(self, dirty_image_file, text, output_image_file=''):
+        """
+        Hides text after whatever is already hidden in dirty_image_file and outputs output_image_file.
+
+        When no output file name is provided dirty_image_file is updated.
+        """
+        return self._append_data(dirty_image_file, text.encode('utf-8'), "", output_image_file)
+
+    def steganographer_append_file(self, dirty_image_file, file_to_hide, output_image_file=''):
+        """
+        Hides file_to_hide after whatever is already hidden in dirty_image_file and outputs output_image_file.
+
+        When no output file name is provided dirty_image_file is updated.
+        """
+        with open(file_to_hide, 'rb') as input_file:
+            return self._append_data(dirty_image_file, input_file.read(), file_to_hide, output_image_file)
+
+    def steganographer_append_data(self, dirty_image_file, data, file_name='', output_image_file=''):
+        """
+        Hides the bytes data under file_name after whatever is already hidden in dirty_image_file.
+
+        For data that is not in a file, like data piped in. When no output file name is provided dirty_image_file
+        is updated.
+        """
+        return self._append_data(dirty_image_file, data, file_name, output_image_file)
+
+    @_job('reveal')
     def steganographer_reveal(self, fimage):
         """Reveals whatever data is hidden in the fimage file least significant bits."""
-        dirty_data = _open_image_file(fimage)
+        carrier = open_carrier(fimage)
+
+        if carrier is not None:
+            revealed_data = self._reveal_stream(carrier)
+            carrier_len = carrier.carrier_length
+
+            if revealed_data is None:
+                print("This file %s has no hidden message." % fimage)
+                sys.exit()
+        else:
+            self._report('read')
+            dirty_data = self._open_hidden(fimage)
+
+            if self._retrieve_header(dirty_data[1]) is False:
+                print("This file %s has no hidden message." % fimage)
+                sys.exit()
+
+            revealed_data = self._reveal_chunked(dirty_data[1][self._header.header_length * self._BYTELEN:],
+                                                 self._header.data_len)
+            carrier_len = len(dirty_data[1])
+
+        self._measure(len(revealed_data), carrier_len)
+
+        if self._header.flags & Header.FLAG_CHUNKED:
+            revealed_data = _unframe_chunks(revealed_data)
+
+        return revealed_data, self._header.file_name.decode('utf-8')
+
+    @_job('reveal')
+    def steganographer_reveal_chunks(self, fimage, workers=1):
+        """
+        Reveals the data hidden in fimage a chunk at a time, checking each chunk against its own checksum.
 
-        if self._retrieve_header(dirty_data[1]) is False:
+        Chunks are handed out to up to workers processes. Returns the data, the file name and a list of the
+        (start, end) byte ranges of the data that are damaged. Data hidden without chunks is checked as one chunk.
+        Raises ChunkTableError when the number or size of the chunks is damaged, so no chunk can be found.
+        """
+        dirty_data = self._open_hidden(fimage)[1]
+
+        if self._retrieve_header(dirty_data) is False:
             print("This file %s has no hidden message." % fimage)
             sys.exit()
 
-        revealed_data = self._reveal_data(dirty_data[1][self._header.header_length * self._BYTELEN:])
-        return revealed_data, self._header.file_name.decode('utf-8')
+        data_start = self._header.header_length * self._BYTELEN
+
+        if self._header.flags & Header.FLAG_CHUNKED:
+            chunk_count, chunk_size = _CHUNK_TABLE.unpack(self._reveal_data(dirty_data[data_start:],
+                                                                            _CHUNK_TABLE.size))
+            table_len = _chunk_table_len(chunk_count, chunk_size, self._header.data_len)
+            _, chunk_entries = _read_chunk_table(self._reveal_data(dirty_data[data_start:], table_len),
+                                                 self._header.data_len)
+            data_start += table_len * self._BYTELEN
+        else:
+            chunk_size = self._header.data_len
+            chunk_entries = [(self._header.data_len, self._header.checksum)]
+
+        hidden_chunks = [dirty_data[data_start + chunk_index * chunk_size * self._BYTELEN:
+                                    data_start + (chunk_index * chunk_size + chunk_len) * self._BYTELEN]
+                         for chunk_index, (chunk_len, _) in enumerate(chunk_entries)]
+        chunk_lens = [chunk_len for chunk_len, _ in chunk_entries]
+        checksums = [checksum for _, checksum in chunk_entries]
+
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as executor:
+                revealed_chunks = list(executor.map(_reveal_chunk, hidden_chunks, chunk_lens, checksums))
+        else:
+            revealed_chunks = list(map(_reveal_chunk, hidden_chunks, chunk_lens, checksums))
+
+        # Without any checksum only data missing from the image can be found.
+        if not self._header.flags & (Header.FLAG_CHUNKED | Header.FLAG_CHECKSUM):
+            revealed_chunks = [(revealed_chunk, len(revealed_chunk) == chunk_len)
+                               for (revealed_chunk, _), chunk_len in zip(revealed_chunks, chunk_lens)]
+
+        damaged = []
+
+        for chunk_index, (_, is_chunk_valid) in enumerate(revealed_chunks):
+            chunk_start = chunk_index * chunk_size
+
+            if is_chunk_valid:
+                continue
+
+            if damaged and damaged[-1][1] == chunk_start:
+                damaged[-1] = (damaged[-1][0], chunk_start + chunk_lens[chunk_index])
+            else:
+                damaged.append((chunk_start, chunk_start + chunk_lens[chunk_index]))
+
+        revealed_data = b''.join(revealed_chunk for revealed_chunk, _ in revealed_chunks)
+        self._measure(len(revealed_data), len(dirty_data))
+
+        return revealed_data, self._header.file_name.decode('utf-8'), damaged
+
+    @_job('reveal')
+    def steganographer_reveal_all(self, fimage):
+        """
+        Reveals every entry hidden in the fimage file least significant bits. Returns a list of (data, name).
+
+        Nothing can be appended to streamed carriers, like wav files, so they only have the one entry.
+        """
+        if open_carrier(fimage) is not None:
+            return [self.steganographer_reveal(fimage)]
+
+        self._report('read')
+        dirty_data = self._open_hidden(fimage)
+        entries, _ = self._retrieve_entries(dirty_data[1])
+
+        if not entries:
+            print("This file %s has no hidden message." % fimage)
+            sys.exit()
+
+        revealed = []
+
+        for offset, header in entries:
+            self._header = header
+            data_start = offset + header.header_length * self._BYTELEN
+            revealed_data = self._reveal_chunked(dirty_data[1][data_start:data_start + header.data_len * self._BYTELEN],
+                                                 header.data_len)
+
+            if header.flags & Header.FLAG_CHUNKED:
+                revealed_data = _unframe_chunks(revealed_data)
+
+            revealed.append((revealed_data, header.file_name.decode('utf-8')))
+
+        self._measure(sum(header.data_len for _, header in entries), len(dirty_data[1]))
+
+        return revealed
+
+    def steganographer_verify(self, fimage):
+        """
+        Checks everything hidden in fimage against the checksums in the headers, without keeping the revealed data.
+
+        Returns True if every checksum matches, False if one does not or nothing is hidden, and None when there are
+        no checksums to check, like in images steganogrified with version 1 headers.
+        """
+        carrier = open_carrier(fimage)
+
+        if carrier is not None:
+            revealed_chunks = self._reveal_stream_chunks(carrier)
+
+            if revealed_chunks is None:
+                return False
+
+            if not self._header.flags & Header.FLAG_CHECKSUM:
+                return None
+
+            checksum = 0
+            revealed_len = 0
+
+            for revealed_chunk in revealed_chunks:
+                checksum = zlib.crc32(revealed_chunk, checksum)
+                revealed_len += len(revealed_chunk)
+
+            return checksum == self._header.checksum and revealed_len == self._header.data_len
+
+        dirty_data = self._open_hidden(fimage)
+        entries, _ = self._retrieve_entries(dirty_data[1])
+        verified = False if not entries else None
+
+        for offset, header in entries:
+            entry_verified = self._verify_entry(dirty_data[1], offset, header)
+
+            if entry_verified is False:
+                return False
+
+            verified = verified or entry_verified
+
+        return verified
@@ -0,0 +1,22 @@
+"""Helpers shared by the testing scripts."""
+import random
+import wave
+
+
+def random_bytes(rand, length):
+    """Returns length random bytes from the random.Random rand, the same bytes its randbytes gives from Python 3.9."""
+    if not length:
+        return b''
+
+    return rand.getrandbits(length * 8).to_bytes(length, 'little')
+
+
+def make_wav(fname, frame_count, sample_width=2, channel_count=2):
+    """Writes a wav of frame_count frames of random samples, the same for the same fname, to fname. Returns fname."""
+    with wave.open(fname, 'wb') as fwave:
+        fwave.setnchannels(channel_count)
+        fwave.setsampwidth(sample_width)
+        fwave.setframerate(44100)
+        fwave.writeframes(random_bytes(random.Random(fname), frame_count * channel_count * sample_width))
+
+    return fname
@@ -0,0 +1,97 @@
+"""Testing script for screening images for data hidden in their least significant bits."""
+import random
+import sys
+import os
+import os.path
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.analysis import _chi_square_pvalue, analyze_image
+
+CLEAN_JPG_LOCATION = "tests/cleanImage.jpg"
+
+
+def replace_lsbs(dirty_image, rate, seed):
+    """Writes the clean photograph to dirty_image with random bits in place of the least significant bits of rate."""
+    rand = random.Random(seed)
+
+    with Image.open(CLEAN_JPG_LOCATION) as clean:
+        img = clean.convert('RGB')
+
+    data = bytearray(img.tobytes())
+
+    for index in rand.sample(range(len(data)), int(len(data) * rate)):
+        data[index] = data[index] & ~1 | rand.getrandbits(1)
+
+    Image.frombytes('RGB', img.size, bytes(data)).save(dirty_image)
+
+
+def test_chi_square_pvalue():
+    """The chi-square probabilities match the tables."""
+    assert _chi_square_pvalue(3.841, 1) == pytest.approx(0.05, abs=1e-4)
+    assert _chi_square_pvalue(18.307, 10) == pytest.approx(0.05, abs=1e-4)
+    assert _chi_square_pvalue(4.865, 10) == pytest.approx(0.9, abs=1e-4)
+    assert _chi_square_pvalue(0, 5) == 1.0
+
+
+def test_analyze_clean():
+    """A photograph with nothing hidden in it scores low."""
+    analysis = analyze_image(CLEAN_JPG_LOCATION)
+
+    assert analysis.chi_square < 0.01
+    assert analysis.sample_pairs < 0.02
+    assert analysis.lsb_entropy < 0.95
+
+
+def test_analyze_replaced_lsbs():
+    """
+    Sample pair analysis estimates how much of a photograph had its least significant bits replaced, and
+    the entropy of those bits goes up with it.
+    """
+    lsb_entropy = analyze_image(CLEAN_JPG_LOCATION).lsb_entropy
+
+    for rate in (0.25, 0.5, 0.75, 1.0):
+        dirty_image = "tests/dirtyImage_test_analyze_replaced_lsbs%d.png" % (rate * 100)
+        replace_lsbs(dirty_image, rate, 46)
+        analysis = analyze_image(dirty_image)
+
+        assert analysis.sample_pairs == pytest.approx(rate, abs=0.02 if rate < 1 else 0.1)
+        assert analysis.lsb_entropy > lsb_entropy
+
+        os.remove(dirty_image)
+        lsb_entropy = analysis.lsb_entropy
+
+
+def test_analyze_hidden_file():
+    """A file hidden by steganographer at the start of the image is found by the chi-square attack."""
+    dirty_image = "tests/dirtyImage_test_analyze_hidden_file.png"
+    Steganographer().steganographer_hide_file(CLEAN_JPG_LOCATION, "tests/FileToHide.zip", dirty_image)
+
+    assert analyze_image(dirty_image).chi_square > 0.95
+
+    os.remove(dirty_image)
+
+
+def test_main_analyze(capfd):
+    """Command line screens show the scores of each image, and fail when any looks suspicious."""
+    dirty_image = "tests/dirtyImage_test_main_analyze.png"
+    replace_lsbs(dirty_image, 1.0, 46)
+
+    result = os.system("python -m steganographer analyze " + CLEAN_JPG_LOCATION)
+    result2 = os.system("python -m steganographer analyze -j 2 -q " + CLEAN_JPG_LOCATION + " " + dirty_image +
+                        " tests/FileToHide.zip")
+    out, _ = capfd.readouterr()
+    lines = out.splitlines()
+
+    assert result == 0 and result2 != 0
+    assert lines[0].startswith(CLEAN_JPG_LOCATION + ": chi-square 0.00, sample pairs 0.00, LSB entropy 0.89")
+    assert lines[1].startswith(dirty_image + ": chi-square 1.00, sample pairs 0.9")
+    assert lines[1].endswith(", SUSPICIOUS")
+    assert lines[2:] == ["tests/FileToHide.zip: could not be read"]
+
+    os.remove(dirty_image)
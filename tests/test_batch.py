@@ -0,0 +1,173 @@
+# pylint: disable=protected-access
+"""Testing script for hiding a batch of payloads in stages."""
+import threading
+import sys
+import os
+import os.path
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer import batch
+# noinspection PyPep8
+from steganographer.batch import steganographer_hide_batch
+# noinspection PyPep8
+from steganographer.errors import CapacityError
+# noinspection PyPep8
+from steganographer.limits import MemoryBudget
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def make_jobs(name, count):
+    """Crops count carriers out of the clean image, some as bmps. Returns jobs hiding a message in each."""
+    jobs = []
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        for job_index in range(count):
+            extension = '.bmp' if job_index % 3 == 0 else '.png'
+            carrier = "tests/cleanImage_" + name + str(job_index) + extension
+            clean.crop((job_index * 5, 0, job_index * 5 + 100, 30)).convert('RGB').save(carrier)
+            jobs.append((carrier, (name + " message " + str(job_index)).encode('utf-8'), "",
+                         "tests/dirtyImage_" + name + str(job_index) + extension))
+
+    return jobs
+
+
+@pytest.mark.parametrize("process_stages", [(), ('embed',), ('read', 'embed', 'write')])
+def test_hide_batch(process_stages):
+    """Every job is hidden and written, the names come back in the order of the jobs and reveal what was hidden."""
+    name = "test_hide_batch" + "_".join(process_stages)
+    jobs = make_jobs(name, 7)
+    hidden_fnames = steganographer_hide_batch(jobs, read_workers=3, embed_workers=2, write_workers=2, queue_size=1,
+                                              process_stages=process_stages, fsync='batch')
+
+    assert hidden_fnames == [dirty_image_file for _, _, _, dirty_image_file in jobs]
+
+    for (clean_image_file, data, _, _), hidden_fname in zip(jobs, hidden_fnames):
+        assert Steganographer().steganographer_reveal(hidden_fname)[0] == data
+        assert Steganographer().steganographer_verify(hidden_fname) is True
+        os.remove(clean_image_file)
+        os.remove(hidden_fname)
+
+
+def test_hide_batch_same_as_hide():
+    """A chunked file hidden in a batch gives the same image as hiding it on its own."""
+    jobs = make_jobs("test_hide_batch_same_as_hide", 2)
+    os.remove(jobs.pop(0)[0])  # Keeping the png.
+    clean_image_file, data, _, dirty_image_file = jobs[0]
+    alone_fname = "tests/dirtyImage_test_hide_batch_same_as_hide_alone.png"
+    jobs[0] = (clean_image_file, data, "FileHidden.txt", dirty_image_file)
+
+    assert steganographer_hide_batch(jobs, chunk_size=8) == [dirty_image_file]
+    assert Steganographer().steganographer_hide_data(clean_image_file, data, "FileHidden.txt", alone_fname,
+                                                     chunk_size=8) == alone_fname
+
+    with Image.open(dirty_image_file) as batch_image, Image.open(alone_fname) as alone_image:
+        assert batch_image.tobytes() == alone_image.tobytes()
+
+    for fname in (clean_image_file, dirty_image_file, alone_fname):
+        os.remove(fname)
+
+
+def test_hide_batch_backpressure(monkeypatch):
+    """The stages never hold more decoded images than their queues and workers can, however many jobs there are."""
+    jobs = make_jobs("test_hide_batch_backpressure", 20)
+    in_memory = [0, 0]  # Decoded images not written yet, and the most there were at once.
+    lock = threading.Lock()
+    real_open_carrier = Steganographer._open_carrier
+    real_write_dirty_image = Steganographer._write_dirty_image
+
+    def counted_open_carrier(stegs, clean_image_file):
+        with lock:
+            in_memory[0] += 1
+            in_memory[1] = max(in_memory)
+
+        return real_open_carrier(stegs, clean_image_file)
+
+    def counted_write_dirty_image(stegs, dirty_image_file, clean_image_file, dirty_data):
+        output_file = real_write_dirty_image(stegs, dirty_image_file, clean_image_file, dirty_data)
+
+        with lock:
+            in_memory[0] -= 1
+
+        return output_file
+
+    monkeypatch.setattr(Steganographer, '_open_carrier', counted_open_carrier)
+    monkeypatch.setattr(Steganographer, '_write_dirty_image', counted_write_dirty_image)
+
+    assert len(steganographer_hide_batch(jobs, read_workers=4, embed_workers=2, write_workers=1,
+                                         queue_size=2)) == len(jobs)
+    # The read, embed and write workers, and the two queues of decoded images between them.
+    assert in_memory[1] <= 4 + 2 + 1 + 2 * 2
+    assert in_memory[0] == 0
+
+    for clean_image_file, _, _, dirty_image_file in jobs:
+        os.remove(clean_image_file)
+        os.remove(dirty_image_file)
+
+
+def test_hide_batch_failure():
+    """A job that can not be done stops the batch with its error, after the jobs already started finish."""
+    jobs = make_jobs("test_hide_batch_failure", 3)
+    jobs.insert(1, ("tests/ImageThatDoesNotExist.png", b"missing", "", "tests/dirtyImage_missing.png"))
+
+    with pytest.raises(SystemExit):
+        steganographer_hide_batch(jobs, read_workers=1)
+
+    for clean_image_file, _, _, dirty_image_file in jobs:
+        for fname in (clean_image_file, dirty_image_file):
+            if os.path.exists(fname) and "DoesNotExist" not in fname:
+                os.remove(fname)
+
+
+def test_hide_batch_memory_budget(monkeypatch):
+    """Jobs wait for the memory budget before they are read, and jobs over capacity stop the batch and give it back."""
+    jobs = make_jobs("test_hide_batch_memory_budget", 9)
+    estimates = [batch._preflight(job, None, None)[0] for job in jobs]
+    memory_budget = MemoryBudget(max(estimates) * 5 // 2)  # Room for two decoded images at once.
+    in_memory = [0, 0]  # Decoded images not written yet, and the most there were at once.
+    lock = threading.Lock()
+    real_open_carrier = Steganographer._open_carrier
+    real_write_dirty_image = Steganographer._write_dirty_image
+
+    def counted_open_carrier(stegs, clean_image_file):
+        with lock:
+            in_memory[0] += 1
+            in_memory[1] = max(in_memory)
+
+        return real_open_carrier(stegs, clean_image_file)
+
+    def counted_write_dirty_image(stegs, dirty_image_file, clean_image_file, dirty_data):
+        output_file = real_write_dirty_image(stegs, dirty_image_file, clean_image_file, dirty_data)
+
+        with lock:
+            in_memory[0] -= 1
+
+        return output_file
+
+    monkeypatch.setattr(Steganographer, '_open_carrier', counted_open_carrier)
+    monkeypatch.setattr(Steganographer, '_write_dirty_image', counted_write_dirty_image)
+
+    assert len(steganographer_hide_batch(jobs, read_workers=4, embed_workers=2, write_workers=2,
+                                         memory_budget=memory_budget)) == len(jobs)
+    assert in_memory[1] <= 2
+    assert memory_budget.reserved == 0
+
+    clean_image_file, _, _, dirty_image_file = jobs[4]
+    jobs[4] = (clean_image_file, bytes(100 * 30 * 3), "", dirty_image_file)
+
+    with pytest.raises(CapacityError):
+        steganographer_hide_batch(jobs, read_workers=4, memory_budget=memory_budget)
+
+    assert memory_budget.reserved == 0
+
+    for clean_image_file, _, _, dirty_image_file in jobs:
+        os.remove(clean_image_file)
+
+        if os.path.exists(dirty_image_file):
+            os.remove(dirty_image_file)
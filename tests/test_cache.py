@@ -0,0 +1,219 @@
+# pylint: disable=protected-access
+"""Testing script for the caches."""
+import sys
+import os
+import io
+import os.path
+from shutil import copy2, rmtree
+
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer, _open_image_file
+# noinspection PyPep8
+from steganographer.cache import CarrierCache, ResultCache, TemplateCache
+# noinspection PyPep8
+from steganographer.pngwriter import save_png
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+CLEAN_LEN = 272 * 92 * 3
+
+
+def test_carrier_cache_hit():
+    """A carrier opened twice is decoded once and is the same data _open_image_file returns."""
+    carrier_cache = CarrierCache()
+
+    first = carrier_cache.open_image(CLEAN_PNG_LOCATION)
+    second = carrier_cache.open_image(CLEAN_PNG_LOCATION)
+
+    assert first == _open_image_file(CLEAN_PNG_LOCATION)
+    assert second is first
+    assert (carrier_cache.hits, carrier_cache.misses) == (1, 1)
+    assert carrier_cache.current_bytes == CLEAN_LEN
+
+
+def test_carrier_cache_changed_file():
+    """A carrier that changed on disk is decoded again."""
+    clean_image = copy2(CLEAN_PNG_LOCATION, "tests/cleanImage_test_carrier_cache_changed_file.png")
+    carrier_cache = CarrierCache()
+
+    carrier_cache.open_image(clean_image)
+    os.utime(clean_image, ns=(0, 0))
+    carrier_cache.open_image(clean_image)
+
+    assert (carrier_cache.hits, carrier_cache.misses) == (0, 2)
+
+    os.remove(clean_image)
+
+
+def test_carrier_cache_eviction():
+    """The least recently used carriers are dropped to stay within the budget, and oversized ones are not kept."""
+    clean_images = [copy2(CLEAN_PNG_LOCATION, "tests/cleanImage_test_carrier_cache_eviction" + str(i) + ".png")
+                    for i in range(3)]
+    carrier_cache = CarrierCache(max_bytes=CLEAN_LEN * 2)
+
+    carrier_cache.open_image(clean_images[0])
+    carrier_cache.open_image(clean_images[1])
+    carrier_cache.open_image(clean_images[0])
+    carrier_cache.open_image(clean_images[2])
+    carrier_cache.open_image(clean_images[0])
+    carrier_cache.open_image(clean_images[1])
+
+    assert (carrier_cache.hits, carrier_cache.misses) == (2, 4)
+    assert len(carrier_cache) == 2
+    assert carrier_cache.current_bytes == CLEAN_LEN * 2
+
+    small_cache = CarrierCache(max_bytes=CLEAN_LEN - 1)
+    small_cache.open_image(clean_images[0])
+
+    assert len(small_cache) == 0
+
+    for clean_image in clean_images:
+        os.remove(clean_image)
+
+
+def test_carrier_cache_hash():
+    """With content hashing, copies of a carrier share one cache entry."""
+    clean_image = copy2(CLEAN_PNG_LOCATION, "tests/cleanImage_test_carrier_cache_hash.png")
+    carrier_cache = CarrierCache(use_hash=True)
+
+    carrier_cache.open_image(CLEAN_PNG_LOCATION)
+    carrier_cache.open_image(clean_image)
+
+    assert (carrier_cache.hits, carrier_cache.misses) == (1, 1)
+
+    os.remove(clean_image)
+
+
+def test_steganographer_carrier_cache():
+    """Hiding with a carrier cache gives the same images and leaves the cached carrier clean."""
+    dirty_image = "tests/dirtyImage_test_steganographer_carrier_cache.png"
+    cached_dirty_image = "tests/dirtyImage_test_steganographer_carrier_cache_cached.png"
+    carrier_cache = CarrierCache()
+    clean_data = carrier_cache.open_image(CLEAN_PNG_LOCATION)[1]
+
+    Steganographer().steganographer_hide(CLEAN_PNG_LOCATION, "First message.", dirty_image)
+    stegs = Steganographer(carrier_cache=carrier_cache)
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "Second message.", cached_dirty_image)
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "First message.", cached_dirty_image)
+
+    assert _open_image_file(cached_dirty_image) == _open_image_file(dirty_image)
+    assert carrier_cache.open_image(CLEAN_PNG_LOCATION)[1] == clean_data == _open_image_file(CLEAN_PNG_LOCATION)[1]
+    assert carrier_cache.hits == 3
+
+    os.remove(dirty_image)
+    os.remove(cached_dirty_image)
+
+
+def test_template_cache():
+    """Covers are encoded once, and ones without a template are only opened once too."""
+    cmyk_image = "tests/cleanImage_test_template_cache.tiff"
+    template_cache = TemplateCache()
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        clean.convert('CMYK').save(cmyk_image)
+
+    template = template_cache.open_template(CLEAN_PNG_LOCATION)
+
+    assert template_cache.open_template(CLEAN_PNG_LOCATION) is template
+    assert template.size == (272, 92) and template_cache.current_bytes == template.nbytes
+    assert template_cache.open_template(cmyk_image) is None and template_cache.open_template(cmyk_image) is None
+    assert (template_cache.hits, template_cache.misses) == (2, 2)
+
+    os.remove(cmyk_image)
+
+
+def test_steganographer_template_cache():
+    """Hides written from the template of their cover have the same pixels, and the cover is only encoded once."""
+    dirty_image = "tests/dirtyImage_test_steganographer_template_cache.png"
+    template_image = "tests/dirtyImage_test_steganographer_template_cache_template.png"
+    key_image = "tests/dirtyImage_test_steganographer_template_cache_key.png"
+    template_cache = TemplateCache()
+    stegs = Steganographer(template_cache=template_cache)
+
+    Steganographer().steganographer_hide(CLEAN_PNG_LOCATION, "Template message.", dirty_image)
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "First message.", template_image)
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "Template message.", template_image)
+    Steganographer(key="secret", template_cache=template_cache).steganographer_hide(CLEAN_PNG_LOCATION,
+                                                                                    "Key message.", key_image)
+
+    with Image.open(template_image) as dirty:
+        png = io.BytesIO()
+        save_png(dirty, png)
+
+    with open(template_image, 'rb') as fimage:
+        assert fimage.read() == png.getvalue()
+
+    assert _open_image_file(template_image) == _open_image_file(dirty_image)
+    assert stegs.steganographer_reveal(template_image) == (b"Template message.", "")
+    assert Steganographer(key="secret").steganographer_reveal(key_image) == (b"Key message.", "")
+    assert (template_cache.hits, template_cache.misses) == (1, 1)
+
+    os.remove(dirty_image)
+    os.remove(template_image)
+    os.remove(key_image)
+
+
+def test_result_cache_hit():
+    """Hiding the same thing in the same image twice copies the first result instead of hiding again."""
+    cache_dir = "tests/resultCache_test_result_cache_hit"
+    dirty_image = "tests/dirtyImage_test_result_cache_hit.png"
+    cached_dirty_image = "tests/dirtyImage_test_result_cache_hit_cached.png"
+    result_cache = ResultCache(cache_dir)
+    carrier_cache = CarrierCache()
+
+    stegs = Steganographer(carrier_cache=carrier_cache, result_cache=result_cache)
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "Cached message.", dirty_image)
+    hidden_fname = stegs.steganographer_hide(CLEAN_PNG_LOCATION, "Cached message.", cached_dirty_image)
+
+    assert hidden_fname == cached_dirty_image
+    assert (result_cache.hits, result_cache.misses) == (1, 1)
+    assert carrier_cache.misses == 1 and carrier_cache.hits == 0
+    with open(dirty_image, 'rb') as dirty, open(cached_dirty_image, 'rb') as cached_dirty:
+        assert dirty.read() == cached_dirty.read()
+    assert Steganographer().steganographer_reveal(cached_dirty_image)[0] == b"Cached message."
+    assert len(os.listdir(cache_dir)) == 1
+
+    rmtree(cache_dir)
+    os.remove(dirty_image)
+    os.remove(cached_dirty_image)
+
+
+def test_result_cache_key():
+    """Anything that changes the result changes the key."""
+    cache_dir = "tests/resultCache_test_result_cache_key"
+    result_cache = ResultCache(cache_dir)
+    key = result_cache.key(CLEAN_PNG_LOCATION, b"header", b"data", 'png')
+
+    assert key == result_cache.key(CLEAN_PNG_LOCATION, b"header", b"data", 'png')
+    assert key != result_cache.key("tests/cleanImage.jpg", b"header", b"data", 'png')
+    assert key != result_cache.key(CLEAN_PNG_LOCATION, b"header2", b"data", 'png')
+    assert key != result_cache.key(CLEAN_PNG_LOCATION, b"header", b"data2", 'png')
+    assert key != result_cache.key(CLEAN_PNG_LOCATION, b"header", b"data", 'bmp')
+    assert key != result_cache.key(CLEAN_PNG_LOCATION, b"headerd", b"ata", 'png')
+    assert not result_cache.fetch(key, "tests/dirtyImage_test_result_cache_key.png")
+    assert not os.path.isfile("tests/dirtyImage_test_result_cache_key.png")
+    assert os.listdir("tests/resultCache_test_result_cache_key") == []
+
+    rmtree(cache_dir)
+
+
+def test_result_cache_eviction():
+    """The least recently used entries are removed once the cache is over its budget."""
+    cache_dir = "tests/resultCache_test_result_cache_eviction"
+    clean_size = os.path.getsize(CLEAN_PNG_LOCATION)
+    result_cache = ResultCache(cache_dir, max_bytes=clean_size * 2)
+
+    for key in ("first", "second", "third"):
+        result_cache.store(key, CLEAN_PNG_LOCATION)
+        os.utime(os.path.join(cache_dir, key), ns=(len(os.listdir(cache_dir)), len(os.listdir(cache_dir))))
+
+    assert sorted(os.listdir(cache_dir)) == ["second", "third"]
+
+    os.utime(os.path.join(cache_dir, "second"), ns=(10, 10))
+    result_cache.store("fourth", CLEAN_PNG_LOCATION)
+
+    assert sorted(os.listdir(cache_dir)) == ["fourth", "second"]
+
+    rmtree(cache_dir)
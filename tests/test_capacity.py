@@ -0,0 +1,172 @@
+"""Testing script for capacities and the cover index."""
+import pytest
+from PIL import Image
+import sys
+import os
+import os.path
+import shutil
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.capacity import carrier_length, required_length, image_capacity, CoverIndex
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def make_covers(directory, widths):
+    """Creates a directory of covers cropped out of the clean image, one for each width. Returns their names."""
+    os.makedirs(directory)
+    covers = []
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        for width in widths:
+            cover = os.path.join(directory, "cover" + str(width) + ".png")
+            clean.crop((0, 0, width, 10)).save(cover)
+            covers.append(cover)
+
+    return covers
+
+
+def test_carrier_length():
+    """The carrier length is the number of bytes of pixel data in the image."""
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        assert carrier_length(CLEAN_PNG_LOCATION) == len(clean.tobytes())
+
+    with pytest.raises(SystemExit):
+        carrier_length("CarrierLengthFileThatDoesNotExist.nope")
+
+
+def test_carrier_length_frames():
+    """Every frame of a multi-frame image counts, in the mode it is hidden in."""
+    gif_fname = "tests/cleanImage_test_carrier_length_frames.gif"
+    frames = [Image.new('RGB', (10, 20), (frame * 60, 100, 50)).convert('P') for frame in range(3)]
+    frames[0].save(gif_fname, save_all=True, append_images=frames[1:])
+
+    assert carrier_length(gif_fname) == 3 * 10 * 20 * 4
+
+    os.remove(gif_fname)
+
+
+def test_required_length():
+    """The header is hidden one bit per byte and the data with the bits per channel."""
+    assert required_length(0) == 22 * 8
+    assert required_length(10, 1, 5) == (22 + 5) * 8 + 80
+    assert required_length(10, 3, 5) == (22 + 5) * 8 + 27
+
+
+def test_image_capacity_fits():
+    """A message as long as the capacity of an image is hidden and revealed whole."""
+    dirty_image = "tests/dirtyImage_test_image_capacity_fits.png"
+    capacity = image_capacity(CLEAN_PNG_LOCATION)
+    hidden_message = "x" * capacity
+
+    stegs = Steganographer()
+    revealed_message = stegs.steganographer_reveal(stegs.steganographer_hide(CLEAN_PNG_LOCATION, hidden_message,
+                                                                             dirty_image))[0]
+
+    assert capacity == 272 * 92 * 3 // 8 - 22
+    assert revealed_message == hidden_message.encode('utf-8')
+    assert image_capacity(CLEAN_PNG_LOCATION, 2, 10) == (272 * 92 * 3 - 32 * 8) * 2 // 8
+
+    os.remove(dirty_image)
+
+
+def test_cover_index_smallest_cover():
+    """The smallest cover that can hold the data is picked from the index, even after reloading it."""
+    directory = "tests/covers_test_cover_index_smallest_cover"
+    index_file = directory + ".json"
+    covers = make_covers(directory, [40, 10, 20, 30])
+
+    cover_index = CoverIndex(index_file)
+    assert cover_index.add_directory(directory) == 4
+    cover_index.save()
+    cover_index = CoverIndex(index_file)
+
+    assert cover_index.smallest_cover(1) == covers[1]
+    assert cover_index.smallest_cover(22) == covers[2]
+    assert cover_index.smallest_cover(22, file_name_len=40) == covers[3]
+    assert cover_index.smallest_cover(22, 2, 1) == covers[1]
+    assert cover_index.smallest_cover(150) is None
+
+    shutil.rmtree(directory)
+    os.remove(index_file)
+
+
+def test_cover_index_save():
+    """The index is saved through a temporary file of its own, which is gone once the index is replaced."""
+    directory = "tests/covers_test_cover_index_save"
+    index_file = directory + ".json"
+    covers = make_covers(directory, [10])
+    os.mkdir(index_file + ".tmp")
+
+    cover_index = CoverIndex(index_file)
+    cover_index.add_directory(directory)
+    cover_index.save()
+    cover_index.save(fsync=True)
+
+    assert list(CoverIndex(index_file).covers) == covers
+    assert [fname for fname in os.listdir("tests") if fname.startswith(".covers_test_cover_index_save")] == []
+
+    os.rmdir(index_file + ".tmp")
+    shutil.rmtree(directory)
+    os.remove(index_file)
+
+
+def test_cover_index_changes():
+    """Covers that changed are skipped until indexed again, and covers that are gone are dropped."""
+    directory = "tests/covers_test_cover_index_changes"
+    covers = make_covers(directory, [10, 20])
+    with open(os.path.join(directory, "notAnImage.txt"), 'w') as not_image:
+        not_image.write("Not an image.")
+
+    cover_index = CoverIndex(directory + ".json")
+    assert cover_index.add_directory(directory) == 2
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        clean.crop((0, 0, 7, 10)).save(covers[0])
+    assert cover_index.smallest_cover(1) == covers[1]
+
+    os.remove(covers[1])
+    assert cover_index.smallest_cover(1) is None
+    assert cover_index.add_directory(directory) == 1
+    assert list(cover_index.covers) == [covers[0]]
+    assert cover_index.smallest_cover(1) == covers[0]
+
+    shutil.rmtree(directory)
+
+
+def test_main_covers(capfd):
+    """Command line calls index a directory of covers and hide a message in the smallest one that fits."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    directory = "tests/covers_test_main_covers"
+    index_file = directory + ".json"
+    covers = make_covers(directory, [10, 20])
+    hidden_message = "test_main_covers hidden message"
+    dirty_fname = "tests/dirtyImage_test_main_covers.png"
+
+    result = os.system("python -m steganographer covers -i " + index_file + " index " + directory)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "Indexed 2 images in " + directory + line_end
+
+    result = os.system("python -m steganographer covers -i " + index_file + ' pick -m "' + hidden_message + '"')
+    out, _ = capfd.readouterr()
+
+    assert out == covers[1] + line_end
+
+    result = os.system("python -m steganographer covers -i " + index_file + ' hide -m "' + hidden_message +
+                       '" -o ' + dirty_fname)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "The message has been hidden in " + dirty_fname + line_end
+    assert Steganographer().steganographer_reveal(dirty_fname)[0] == hidden_message.encode('utf-8')
+
+    shutil.rmtree(directory)
+    os.remove(index_file)
+    os.remove(dirty_fname)
@@ -0,0 +1,208 @@
+# pylint: disable=protected-access
+"""Testing script for the carriers that are not images."""
+import sys
+import os
+import os.path
+import random
+import wave
+from shutil import copy2
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.carrier import WaveCarrier, Y4mCarrier, open_carrier
+# noinspection PyPep8
+from steganographer.capacity import carrier_length
+# noinspection PyPep8
+from steganographer.errors import SteganographerError
+# noinspection PyPep8
+from conftest import make_wav, random_bytes
+
+FRAME_COUNT = 100000  # More than one chunk of frames.
+
+
+def make_y4m(fname, colour_space, frame_len, frame_count=300):
+    """Writes a 13 by 7 video of random frames to fname, some with frame parameters. Returns fname."""
+    frame_data = random.Random(frame_len)
+
+    with open(fname, 'wb') as fvideo:
+        fvideo.write(b"YUV4MPEG2 W13 H7 F25:1 Ip A1:1" + colour_space + b"\n")
+
+        for frame in range(frame_count):
+            fvideo.write(b"FRAME Ixyz\n" if frame % 3 == 0 else b"FRAME\n")
+            fvideo.write(random_bytes(frame_data, frame_len))
+
+    return fname
+
+
+def read_frames(fname):
+    """Returns the parameters and frames of the wav fname."""
+    with wave.open(fname, 'rb') as fwave:
+        return fwave.getparams(), fwave.readframes(fwave.getnframes())
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 3, 4])
+def test_wave_hide(sample_width):
+    """Only the least significant byte of each sample changes, and the file hidden can be revealed and verified."""
+    clean_wav = make_wav("tests/cleanAudio_test_wave_hide" + str(sample_width) + ".wav", FRAME_COUNT, sample_width)
+    hidden_fname = "tests/FileToHide_test_wave_hide" + str(sample_width) + ".zip"
+    dirty_fname = "tests/dirtyAudio_test_wave_hide" + str(sample_width) + ".wav"
+
+    with open("tests/FileToHide.zip", 'rb') as hidden_file:
+        hidden_data = hidden_file.read() * 2
+
+    with open(hidden_fname, 'wb') as hidden_file:
+        hidden_file.write(hidden_data)
+
+    dirty_wav = Steganographer().steganographer_hide_file(clean_wav, hidden_fname, dirty_fname)
+    clean_params, clean_frames = read_frames(clean_wav)
+    dirty_params, dirty_frames = read_frames(dirty_wav)
+
+    assert dirty_wav == dirty_fname
+    assert dirty_params == clean_params
+    assert clean_frames[::sample_width] != dirty_frames[::sample_width]
+
+    for sample_byte in range(1, sample_width):
+        assert clean_frames[sample_byte::sample_width] == dirty_frames[sample_byte::sample_width]
+
+    assert Steganographer().steganographer_reveal(dirty_wav) == (hidden_data, hidden_fname)
+    assert Steganographer().steganographer_verify(dirty_wav) is True
+
+    os.remove(clean_wav)
+    os.remove(dirty_wav)
+    os.remove(hidden_fname)
+
+
+def test_wave_read_chunks():
+    """The carrier bytes come a chunk at a time and add up to the carrier length."""
+    clean_wav = make_wav("tests/cleanAudio_test_wave_read_chunks.wav", FRAME_COUNT, 2, 3)
+    carrier = WaveCarrier(clean_wav, chunk_frames=8 * 1024)
+    carrier_chunks = list(carrier.read_chunks())
+
+    assert len(carrier_chunks) == -(-FRAME_COUNT // (8 * 1024))
+    assert all(len(carrier_chunk) == 8 * 1024 * 3 for carrier_chunk in carrier_chunks[:-1])
+    assert sum(len(carrier_chunk) for carrier_chunk in carrier_chunks) == carrier.carrier_length == \
+        carrier_length(clean_wav) == FRAME_COUNT * 3
+
+    os.remove(clean_wav)
+
+
+def test_wave_hide_in_place():
+    """With in_place the wav itself ends up with the message and a chunked message is put back together, once."""
+    clean_wav = make_wav("tests/cleanAudio_test_wave_hide_in_place.wav", FRAME_COUNT)
+    hidden_message = "test_wave_hide_in_place hidden message"
+
+    assert Steganographer().steganographer_hide(clean_wav, hidden_message, chunk_size=8, in_place=True) == clean_wav
+    assert Steganographer().steganographer_reveal(clean_wav)[0] == hidden_message.encode('utf-8')
+    assert Steganographer().steganographer_reveal_all(clean_wav) == [(hidden_message.encode('utf-8'), '')]
+
+    with pytest.raises(SteganographerError, match="only hold one entry"):
+        Steganographer().steganographer_append(clean_wav, "appended")
+
+    os.remove(clean_wav)
+
+
+def test_wave_verify_streamed(monkeypatch):
+    """Wavs are verified a chunk at a time, without the data hidden in them revealed as a whole."""
+    clean_wav = make_wav("tests/cleanAudio_test_wave_verify_streamed.wav", FRAME_COUNT)
+    dirty_wav = "tests/dirtyAudio_test_wave_verify_streamed.wav"
+    Steganographer().steganographer_hide_file(clean_wav, "tests/FileToHide.zip", dirty_wav)
+    params, frames = read_frames(dirty_wav)
+    corrupt_frames = bytearray(frames)
+    corrupt_frames[40000] ^= 1
+
+    def reveal_stream(*args):
+        raise AssertionError("The data was revealed as a whole.")
+
+    monkeypatch.setattr(Steganographer, '_reveal_stream', reveal_stream)
+
+    assert Steganographer().steganographer_verify(dirty_wav) is True
+
+    with wave.open(dirty_wav, 'wb') as fwave:
+        fwave.setparams(params)
+        fwave.writeframes(bytes(corrupt_frames))
+
+    assert Steganographer().steganographer_verify(dirty_wav) is False
+
+    os.remove(clean_wav)
+    os.remove(dirty_wav)
+
+
+def test_wave_errors():
+    """Wavs without a hidden message, or that can not be read, stop with a message."""
+    clean_wav = make_wav("tests/cleanAudio_test_wave_errors.wav", FRAME_COUNT)
+
+    assert open_carrier("tests/cleanImage.png") is None
+    assert Steganographer().steganographer_verify(clean_wav) is False
+
+    with pytest.raises(SystemExit):
+        Steganographer().steganographer_reveal(clean_wav)
+
+    with pytest.raises(SystemExit):
+        open_carrier("AudioThatDoesNotExist.wav")
+
+    not_wav = copy2("tests/FileToHide.zip", "tests/cleanAudio_test_wave_errors_zip.wav")
+
+    with pytest.raises(SystemExit):
+        open_carrier(not_wav)
+
+    os.remove(clean_wav)
+    os.remove(not_wav)
+
+
+# 13 by 7 frames have 91 samples in the luma plane and 7 by 4 samples in 4:2:0 chroma planes.
+@pytest.mark.parametrize("colour_space,frame_len,sample_len", [
+    (b"", 91 + 2 * 28, 1), (b" C420mpeg2", 91 + 2 * 28, 1), (b" C422", 91 + 2 * 7 * 7, 1), (b" C444", 3 * 91, 1),
+    (b" C444alpha", 4 * 91, 1), (b" Cmono", 91, 1), (b" C420p10", 2 * (91 + 2 * 28), 2), (b" Cmono16", 2 * 91, 2),
+])
+def test_y4m_hide(colour_space, frame_len, sample_len):
+    """Frames are hidden in one at a time, even when they do not hold whole bytes, and only their samples change."""
+    name = colour_space.decode('ascii').strip() or "default"
+    clean_y4m = make_y4m("tests/cleanVideo_test_y4m_hide_" + name + ".y4m", colour_space, frame_len)
+    hidden_data = random_bytes(random.Random(0), 3000)
+    dirty_y4m = "tests/dirtyVideo_test_y4m_hide_" + name + ".y4m"
+    stegs = Steganographer()
+    stegs._generate_header(len(hidden_data), 1, "")
+    carrier = Y4mCarrier(clean_y4m)
+
+    assert carrier.frame_count == 300
+    assert carrier.carrier_length == 300 * frame_len // sample_len
+
+    stegs._hide_stream(carrier, hidden_data, dirty_y4m)
+
+    with open(clean_y4m, 'rb') as fclean, open(dirty_y4m, 'rb') as fdirty:
+        clean_video = fclean.read()
+        dirty_video = fdirty.read()
+
+    changed = [index for index, (clean, dirty) in enumerate(zip(clean_video, dirty_video)) if clean != dirty]
+    carrier_indexes = set()
+    frame_start = clean_video.index(b"\n") + 1
+
+    while frame_start < len(clean_video):
+        frame_start = clean_video.index(b"\n", frame_start) + 1
+        carrier_indexes.update(range(frame_start, frame_start + frame_len, sample_len))
+        frame_start += frame_len
+
+    assert len(clean_video) == len(dirty_video)
+    assert all(clean_video[index] ^ dirty_video[index] == 1 for index in changed)
+    assert set(changed) <= carrier_indexes
+    assert Steganographer().steganographer_reveal(dirty_y4m)[0] == hidden_data
+    assert Steganographer().steganographer_verify(dirty_y4m) is True
+
+    os.remove(clean_y4m)
+    os.remove(dirty_y4m)
+
+
+def test_y4m_errors():
+    """Videos that are not YUV4MPEG2, or have a colour space that is not supported, stop with a message."""
+    not_y4m = copy2("tests/FileToHide.zip", "tests/cleanVideo_test_y4m_errors_zip.y4m")
+    unsupported_y4m = make_y4m("tests/cleanVideo_test_y4m_errors_xyz.y4m", b" Cxyz", 10, 1)
+
+    for fname in (not_y4m, unsupported_y4m):
+        with pytest.raises(SystemExit):
+            open_carrier(fname)
+
+        os.remove(fname)
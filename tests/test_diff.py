@@ -0,0 +1,111 @@
+"""Testing script for comparing clean and dirty carriers."""
+import os
+import os.path
+import sys
+from shutil import rmtree
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Header, Steganographer
+# noinspection PyPep8
+from steganographer.diff import pair_images, steganographer_diff
+# noinspection PyPep8
+from steganographer.errors import SteganographerError
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def test_diff_hidden():
+    """Hiding only changes least significant bits, within the carrier bytes the header and data take."""
+    dirty_image = "tests/dirtyImage_test_diff_hidden.png"
+    Steganographer().steganographer_hide_file(CLEAN_PNG_LOCATION, "tests/FileToHide.zip", dirty_image)
+    footprint = steganographer_diff(CLEAN_PNG_LOCATION, dirty_image)
+    hidden_end = (Header(4689, 1, "tests/FileToHide.zip").header_length + 4689) * 8
+
+    assert footprint.changed_planes == (0,)
+    assert footprint.hidden_end == hidden_end
+    assert 0 <= footprint.first_changed < 8 and hidden_end - 8 <= footprint.last_changed < hidden_end
+    assert 0 < footprint.changed_bytes <= hidden_end
+    assert footprint.confined
+    assert steganographer_diff(CLEAN_PNG_LOCATION, "tests/cleanImagePIL.png") == (0, (), None, None, 0)
+
+    os.remove(dirty_image)
+
+
+def test_diff_outside():
+    """Changes past the data hidden, or to higher bits, are not confined."""
+    dirty_image = "tests/dirtyImage_test_diff_outside.png"
+    high_bit_image = "tests/dirtyImage_test_diff_outside_high_bit.png"
+    Steganographer().steganographer_hide(CLEAN_PNG_LOCATION, "test_diff_outside", dirty_image)
+
+    with Image.open(dirty_image) as dirty:
+        img = dirty.copy()
+
+    img.putpixel((271, 91), tuple(value ^ 1 for value in img.getpixel((271, 91))))
+    img.save(dirty_image)
+    img.putpixel((0, 0), tuple(value ^ 0x80 for value in img.getpixel((0, 0))))
+    img.save(high_bit_image)
+    footprint = steganographer_diff(CLEAN_PNG_LOCATION, dirty_image)
+
+    assert footprint.last_changed == 272 * 92 * 3 - 1
+    assert not footprint.confined
+    assert steganographer_diff(CLEAN_PNG_LOCATION, high_bit_image).changed_planes == (0, 7)
+
+    os.remove(dirty_image)
+    os.remove(high_bit_image)
+
+
+def test_diff_key():
+    """With the key, data scattered over the image is compared in the order it is hidden in."""
+    dirty_image = "tests/dirtyImage_test_diff_key.png"
+    Steganographer(key="secret").steganographer_hide(CLEAN_PNG_LOCATION, "test_diff_key", dirty_image)
+
+    assert steganographer_diff(CLEAN_PNG_LOCATION, dirty_image, "secret").confined
+    assert not steganographer_diff(CLEAN_PNG_LOCATION, dirty_image).confined
+
+    with pytest.raises(SteganographerError, match="carrier bytes, not the same"):
+        steganographer_diff(CLEAN_PNG_LOCATION, "tests/cleanImage.jpg")
+
+    os.remove(dirty_image)
+
+
+def test_pair_images():
+    """Dirty images are paired with the clean ones they have the name of, with or without Steganogrified."""
+    assert pair_images(["clean/a.png", "clean/b.jpg", "clean/c.png"],
+                       ["dirty/aSteganogrified.png", "dirty/b.png", "dirty/d.png"]) == \
+        [("clean/a.png", "dirty/aSteganogrified.png"), ("clean/b.jpg", "dirty/b.png")]
+
+
+def test_main_diff(capfd):
+    """Command line calls compare each pair of images in two directories, and fail when any changed elsewhere."""
+    clean_dir = "tests/cleanImages_test_main_diff"
+    dirty_dir = "tests/dirtyImages_test_main_diff"
+    os.makedirs(clean_dir)
+    os.makedirs(dirty_dir)
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        for name in ("first", "second"):
+            clean.save(os.path.join(clean_dir, name + ".png"))
+
+    Steganographer().steganographer_hide(os.path.join(clean_dir, "first.png"), "test_main_diff",
+                                         os.path.join(dirty_dir, "first.png"))
+    Steganographer().steganographer_hide("tests/cleanImage.jpg", "test_main_diff",
+                                         os.path.join(dirty_dir, "second.png"))
+
+    result = os.system("python -m steganographer diff " + CLEAN_PNG_LOCATION + " " + os.path.join(dirty_dir,
+                                                                                                  "first.png"))
+    result2 = os.system("python -m steganographer diff -j 2 " + clean_dir + " " + dirty_dir)
+    out, _ = capfd.readouterr()
+    lines = out.splitlines()
+
+    assert result == 0 and result2 != 0
+    assert lines[0].startswith(CLEAN_PNG_LOCATION + " -> " + os.path.join(dirty_dir, "first.png") + ": ")
+    assert lines[0].split(": ")[1] == lines[1].split(": ")[1]
+    assert " bytes changed in bit plane 0, from byte " in lines[1] and ", within the " in lines[1]
+    assert lines[2].startswith("The images " + os.path.join(clean_dir, "second.png"))
+
+    rmtree(clean_dir)
+    rmtree(dirty_dir)
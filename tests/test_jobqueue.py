@@ -0,0 +1,240 @@
+# pylint: disable=protected-access
+"""Testing script for the job queue."""
+import sys
+import os
+import os.path
+import time
+from shutil import copy2
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.jobqueue import JobQueue, run_worker, run_workers
+# noinspection PyPep8
+from steganographer.limits import ResourceLimits
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def make_queue(name, lease_seconds=60.0, max_attempts=3):
+    """Returns a new empty job queue in tests named after name."""
+    queue_file = "tests/jobs_" + name + ".db"
+
+    if os.path.exists(queue_file):
+        os.remove(queue_file)
+
+    return JobQueue(queue_file, lease_seconds, max_attempts)
+
+
+def test_job_queue_lease():
+    """Jobs are leased in order, once each, and only the worker holding a lease can finish the job."""
+    job_queue = make_queue("test_job_queue_lease")
+    first_id, second_id = job_queue.enqueue_many([('hide', "a.png", None, "file.zip", ''),
+                                                  ('reveal', "b.png", None, None, "b.txt")])
+    a_png, b_png = os.path.abspath("a.png"), os.path.abspath("b.png")
+
+    assert job_queue.lease("worker 1") == (first_id, 'hide', a_png, None, os.path.abspath("file.zip"), '')
+    assert job_queue.lease("worker 2") == (second_id, 'reveal', b_png, None, None, "b.txt")
+    assert job_queue.lease("worker 3") is None
+    assert job_queue.heartbeat(first_id, "worker 1") is True
+    assert job_queue.heartbeat(first_id, "worker 2") is False
+    assert job_queue.complete(first_id, "worker 2", "a done") is False
+    assert job_queue.complete(first_id, "worker 1", "a done") is True
+    assert job_queue.fail(second_id, "worker 2", "b failed") is True
+    assert job_queue.counts() == {'pending': 0, 'running': 0, 'done': 1, 'failed': 1}
+    assert job_queue.results() == [(first_id, 'hide', a_png, 'done', "a done"),
+                                   (second_id, 'reveal', b_png, 'failed', "b failed")]
+    assert job_queue.retry_failed() == 1
+    assert job_queue.lease("worker 3").job_id == second_id
+
+    for action, message, file_to_hide in (('hide', None, None), ('hide', "message", "file.zip"),
+                                          ('reveal', "message", None), ('show', None, None)):
+        with pytest.raises(ValueError):
+            job_queue.enqueue(action, "a.png", message, file_to_hide)
+
+    job_queue.close()
+    os.remove(job_queue.queue_file)
+
+
+def test_job_queue_lease_expires():
+    """A job whose worker stops sending heartbeats goes to the next worker, and the first can not finish it."""
+    job_queue = make_queue("test_job_queue_lease_expires")
+    job_id = job_queue.enqueue('hide', "a.png", "message")
+
+    assert job_queue.lease("worker 1").job_id == job_id
+    assert job_queue.lease("worker 2") is None
+
+    job_queue._connection.execute("UPDATE jobs SET lease_expires = ?", (time.time(),))  # The lease runs out.
+
+    assert job_queue.lease("worker 2").job_id == job_id
+    assert job_queue.heartbeat(job_id, "worker 1") is False
+    assert job_queue.complete(job_id, "worker 2", "done") is True
+    assert job_queue._connection.execute("SELECT attempts FROM jobs").fetchone() == (2,)
+
+    job_queue.close()
+    os.remove(job_queue.queue_file)
+
+
+def test_job_queue_max_attempts():
+    """A job whose lease expires max_attempts times fails instead of being leased again, until it is retried."""
+    job_queue = make_queue("test_job_queue_max_attempts", max_attempts=2)
+    job_id = job_queue.enqueue('hide', "a.png", "message")
+
+    for worker_id in ("worker 1", "worker 2"):
+        assert job_queue.lease(worker_id).job_id == job_id
+
+        job_queue._connection.execute("UPDATE jobs SET lease_expires = ?", (time.time(),))  # The worker dies.
+
+    assert job_queue.lease("worker 3") is None
+    assert job_queue.results() == [(job_id, 'hide', os.path.abspath("a.png"), 'failed',
+                                    "Stopped without finishing in 2 attempts.")]
+    assert job_queue.retry_failed() == 1
+    assert job_queue.lease("worker 3").job_id == job_id
+
+    job_queue.close()
+    os.remove(job_queue.queue_file)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_workers(workers):
+    """Hide and reveal jobs are done and their results kept, and jobs that can not be done fail with the reason."""
+    name = "test_run_workers" + str(workers)
+    job_queue = make_queue(name)
+    dirty_fnames = ["tests/dirtyImage_" + name + str(job) + ".png" for job in range(3)]
+    revealed_fname = "tests/outputMessage_" + name + ".txt"
+    job_queue.enqueue_many([('hide', CLEAN_PNG_LOCATION, name + " message " + str(job), None, dirty_fname)
+                            for job, dirty_fname in enumerate(dirty_fnames)])
+    job_queue.enqueue('hide', "tests/ImageThatDoesNotExist.png", "message")
+
+    assert run_workers(job_queue.queue_file, workers) == 4
+    assert job_queue.counts() == {'pending': 0, 'running': 0, 'done': 3, 'failed': 1}
+    assert [result for _, _, _, _, result in job_queue.results()] == \
+        dirty_fnames + ["Could not read file " + os.path.abspath("tests/ImageThatDoesNotExist.png")]
+
+    job_queue.enqueue('reveal', dirty_fnames[1], output=revealed_fname)
+
+    assert run_worker(job_queue.queue_file) == 1
+    assert job_queue.results('done')[-1][4] == revealed_fname
+
+    with open(revealed_fname, 'rb') as revealed:
+        assert revealed.read() == (name + " message 1").encode('utf-8')
+
+    job_queue.close()
+
+    for fname in dirty_fnames + [revealed_fname, job_queue.queue_file]:
+        os.remove(fname)
+
+
+def test_run_worker_resumes():
+    """A worker finishes the jobs left running by one that died once their leases expire, and skips finished ones."""
+    job_queue = make_queue("test_run_worker_resumes")
+    dirty_fnames = ["tests/dirtyImage_test_run_worker_resumes" + str(job) + ".png" for job in range(3)]
+    job_queue.enqueue_many([('hide', CLEAN_PNG_LOCATION, "resumed", None, dirty_fname)
+                            for dirty_fname in dirty_fnames])
+    finished_job = job_queue.lease("finished worker")
+    job_queue.complete(finished_job.job_id, "finished worker", "finished before")
+    job_queue.lease("dead worker")
+    job_queue._connection.execute("UPDATE jobs SET lease_expires = ? WHERE worker = ?", (time.time(), "dead worker"))
+
+    assert run_worker(job_queue.queue_file, "resumed worker") == 2
+    assert job_queue.counts()['done'] == 3
+    assert job_queue.results()[0][4] == "finished before"
+    assert not os.path.exists(dirty_fnames[0])
+
+    for dirty_fname in dirty_fnames[1:]:
+        assert Steganographer().steganographer_reveal(dirty_fname)[0] == b"resumed"
+        os.remove(dirty_fname)
+
+    job_queue.close()
+    os.remove(job_queue.queue_file)
+
+
+def test_main_enqueue_resume(capfd):
+    """Command line calls add jobs for every image in a directory and resume runs them, failing when any job fails."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    job_queue = make_queue("test_main_enqueue_resume")
+    job_queue.close()
+    input_directory = "tests/cleanImages_test_main_enqueue_resume"
+    output_directory = "tests/dirtyImages_test_main_enqueue_resume"
+    queue_option = " -q " + job_queue.queue_file
+    os.makedirs(input_directory, exist_ok=True)
+
+    for image_name in ("first.png", "second.png"):
+        copy2(CLEAN_PNG_LOCATION, os.path.join(input_directory, image_name))
+
+    result = os.system("python -m steganographer enqueue " + input_directory + " -m test_main_enqueue_resume -o " +
+                       output_directory + queue_option)
+    result += os.system("python -m steganographer resume -j 2" + queue_option)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "Added 2 jobs to " + job_queue.queue_file + line_end + "2 jobs done, 0 failed" + line_end
+    assert sorted(os.listdir(output_directory)) == ["first.png", "second.png"]
+
+    result = os.system("python -m steganographer enqueue tests/ImageThatDoesNotExist.png -r" + queue_option)
+    result += os.system("python -m steganographer resume" + queue_option)
+    out, _ = capfd.readouterr()
+
+    assert result != 0
+    missing_image = os.path.abspath("tests/ImageThatDoesNotExist.png")
+    assert out == "Added 1 jobs to " + job_queue.queue_file + line_end + "Job 3 to reveal " + missing_image + \
+        " failed: Could not read file " + missing_image + line_end + "2 jobs done, 1 failed" + line_end
+
+    for directory in (input_directory, output_directory):
+        for image_name in ("first.png", "second.png"):
+            os.remove(os.path.join(directory, image_name))
+
+        os.rmdir(directory)
+
+    os.remove(job_queue.queue_file)
+
+
+def test_main_enqueue_relative_directory(capfd):
+    """Images enqueued from a relative directory are hidden next to themselves under their Steganogrified names."""
+    job_queue = make_queue("test_main_enqueue_relative_directory")
+    job_queue.close()
+    input_directory = "./tests/cleanImages_test_main_enqueue_relative_directory"
+    queue_option = " -q " + job_queue.queue_file
+    os.makedirs(input_directory, exist_ok=True)
+
+    for image_name in ("first.png", "second.png"):
+        copy2(CLEAN_PNG_LOCATION, os.path.join(input_directory, image_name))
+
+    result = os.system("python -m steganographer enqueue " + input_directory + " -m test_main_enqueue_relative" +
+                       queue_option)
+    result += os.system("python -m steganographer resume" + queue_option)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out.splitlines()[-1] == "2 jobs done, 0 failed"
+    assert sorted(os.listdir(input_directory)) == ["first.png", "firstSteganogrified.png", "second.png",
+                                                   "secondSteganogrified.png"]
+    assert Steganographer().steganographer_reveal(os.path.join(input_directory, "firstSteganogrified.png"))[0] == \
+        b"test_main_enqueue_relative"
+
+    for image_name in os.listdir(input_directory):
+        os.remove(os.path.join(input_directory, image_name))
+
+    os.rmdir(input_directory)
+    os.remove(job_queue.queue_file)
+
+
+def test_run_worker_limits():
+    """Hides over the limits of the worker fail with the limit they went over, without stopping the others."""
+    job_queue = make_queue("test_run_worker_limits")
+    dirty_fname = "tests/dirtyImage_test_run_worker_limits.png"
+    job_queue.enqueue_many([('hide', CLEAN_PNG_LOCATION, "a message over the limit", None, dirty_fname),
+                            ('hide', CLEAN_PNG_LOCATION, "in limit", None, dirty_fname)])
+
+    assert run_worker(job_queue.queue_file, limits=ResourceLimits(max_payload=8)) == 2
+    assert [(state, result) for _, _, _, state, result in job_queue.results()] == \
+        [('failed', "The hide needs 24 payload bytes, over the limit of 8."), ('done', dirty_fname)]
+
+    job_queue.close()
+    os.remove(dirty_fname)
+    os.remove(job_queue.queue_file)
@@ -0,0 +1,232 @@
+# pylint: disable=protected-access
+"""Testing script for the capacity and resource checks made before decoding, and the memory budget."""
+import threading
+import time
+import sys
+import os
+import os.path
+
+import pytest
+from PIL import Image, ImageFile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+import steganographer.steganographer
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer, _open_image_file
+# noinspection PyPep8
+from steganographer.errors import CapacityError, ResourceLimitError, SteganographerError
+# noinspection PyPep8
+from steganographer.limits import MemoryBudget, ResourceLimits
+# noinspection PyPep8
+from steganographer.capacity import carrier_length, image_capacity
+# noinspection PyPep8
+from steganographer.progress import Cancelled
+# noinspection PyPep8
+from conftest import make_wav
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def no_decoding(monkeypatch):
+    """Makes decoding an image fail the test."""
+    def open_image_file(fname):
+        raise AssertionError("%s was decoded." % fname)
+
+    monkeypatch.setattr(steganographer.steganographer, '_open_image_file', open_image_file)
+
+
+def test_errors():
+    """Every error raised for work that is not done is a SteganographerError."""
+    for error in (CapacityError, ResourceLimitError, Cancelled):
+        assert issubclass(error, SteganographerError)
+
+
+def test_multi_frame_length_not_decoded(monkeypatch):
+    """The carrier bytes of animations and multi-page tiffs, bilevel pages too, are counted without decoding them."""
+    gif_fname = "tests/cleanImage_test_multi_frame_length_not_decoded.gif"
+    tiff_fname = "tests/cleanImage_test_multi_frame_length_not_decoded.tiff"
+
+    with Image.open(CLEAN_PNG_LOCATION) as img:
+        frames = [img.crop((frame * 10, 0, frame * 10 + 60, 40)) for frame in range(4)]
+
+    frames[0].save(gif_fname, save_all=True, append_images=frames[1:])
+    frames[0].save(tiff_fname, save_all=True, append_images=[frames[1].convert('1'), frames[2].convert('I;16')])
+    lengths = [len(_open_image_file(fname)[1]) for fname in (gif_fname, tiff_fname)]
+
+    def load(*args):
+        raise AssertionError("A frame was decoded.")
+
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', load)
+
+    assert [carrier_length(fname) for fname in (gif_fname, tiff_fname)] == lengths == [4 * 60 * 40 * 4,
+                                                                                       60 * 40 * 5]
+
+    monkeypatch.undo()
+    os.remove(gif_fname)
+    os.remove(tiff_fname)
+
+
+def test_hide_over_capacity(monkeypatch):
+    """Hiding more than the image can hold raises CapacityError before decoding it, instead of cutting the data."""
+    dirty_image = "tests/dirtyImage_test_hide_over_capacity.png"
+    capacity = image_capacity(CLEAN_PNG_LOCATION)
+    no_decoding(monkeypatch)
+
+    with pytest.raises(CapacityError, match="can hold %d bytes, not %d" % (capacity, capacity + 1)):
+        Steganographer().steganographer_hide_data(CLEAN_PNG_LOCATION, bytes(capacity + 1), '', dirty_image)
+    with pytest.raises(CapacityError):
+        Steganographer().steganographer_hide_data(CLEAN_PNG_LOCATION, bytes(capacity), '', dirty_image, 1024)
+
+    assert not os.path.exists(dirty_image)
+
+    monkeypatch.undo()
+    Steganographer().steganographer_hide_data(CLEAN_PNG_LOCATION, bytes(capacity), '', dirty_image)
+
+    assert Steganographer().steganographer_reveal(dirty_image)[0] == bytes(capacity)
+
+    os.remove(dirty_image)
+
+
+def test_hide_file_over_capacity(monkeypatch):
+    """A file too large to hide is turned down from its size, before it is read."""
+    clean_wav = "tests/cleanAudio_test_hide_file_over_capacity.wav"
+
+    make_wav(clean_wav, 8 * 1024, channel_count=1)
+
+    def read_file(*args, **kwargs):
+        raise AssertionError("The file was read.")
+
+    monkeypatch.setattr(steganographer.steganographer, 'open', read_file, raising=False)
+
+    with pytest.raises(CapacityError):
+        Steganographer().steganographer_hide_file(clean_wav, "tests/FileToHide.zip",
+                                                  "tests/dirtyAudio_test_hide_file_over_capacity.wav")
+
+    assert not os.path.exists("tests/dirtyAudio_test_hide_file_over_capacity.wav")
+
+    os.remove(clean_wav)
+
+
+def test_resource_limits(monkeypatch):
+    """Hides over the pixel, payload or memory limits raise ResourceLimitError before decoding, the rest go ahead."""
+    dirty_image = "tests/dirtyImage_test_resource_limits.png"
+    no_decoding(monkeypatch)
+
+    for limits in (ResourceLimits(max_pixels=272 * 92 - 1), ResourceLimits(max_payload=9),
+                   ResourceLimits(max_memory=1024 * 1024)):
+        with pytest.raises(ResourceLimitError):
+            Steganographer(limits=limits).steganographer_hide(CLEAN_PNG_LOCATION, "ten bytes.", dirty_image)
+
+    assert not os.path.exists(dirty_image)
+
+    monkeypatch.undo()
+    limits = ResourceLimits(max_pixels=272 * 92, max_payload=10, max_memory=16 * 1024 * 1024)
+    Steganographer(limits=limits).steganographer_hide(CLEAN_PNG_LOCATION, "ten bytes.", dirty_image)
+
+    assert Steganographer().steganographer_reveal(dirty_image)[0] == b"ten bytes."
+
+    os.remove(dirty_image)
+
+
+def test_streamed_memory():
+    """Uncompressed images hidden in without decoding them are estimated to need far less memory."""
+    clean_image = "tests/cleanImage_test_streamed_memory.bmp"
+    stegs = Steganographer()
+    stegs._generate_header(100, 1, "")
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        clean.save(clean_image)
+
+    streamed = stegs._preflight(clean_image, 100, "tests/dirtyImage.bmp")
+    decoded = stegs._preflight(clean_image, 100, "tests/dirtyImage.png")
+
+    assert streamed < decoded
+
+    os.remove(clean_image)
+
+
+def test_append_over_capacity():
+    """Appending more than the room left after the entries already hidden raises CapacityError."""
+    dirty_image = "tests/dirtyImage_test_append_over_capacity.png"
+    capacity = image_capacity(CLEAN_PNG_LOCATION)
+    Steganographer().steganographer_hide_data(CLEAN_PNG_LOCATION, bytes(capacity // 2), '', dirty_image)
+
+    with pytest.raises(CapacityError, match="has room for"):
+        Steganographer().steganographer_append_data(dirty_image, bytes(capacity // 2), '')
+
+    os.remove(dirty_image)
+
+
+def test_memory_budget():
+    """Reservations wait until the memory they need is free, and ones larger than the whole budget fail."""
+    memory_budget = MemoryBudget(100)
+    acquired = threading.Event()
+
+    def acquire():
+        with memory_budget.reserve(60):
+            acquired.set()
+
+    with pytest.raises(ResourceLimitError):
+        memory_budget.acquire(101)
+
+    memory_budget.acquire(60)
+    waiting = threading.Thread(target=acquire)
+    waiting.start()
+    time.sleep(0.1)
+
+    assert not acquired.is_set()
+
+    memory_budget.release(60)
+    waiting.join()
+
+    assert acquired.is_set()
+    assert memory_budget.reserved == 0
+
+
+def test_hide_memory_budget():
+    """Hides sharing a memory budget all finish, holding no more than it between them at any time."""
+    memory_budget = MemoryBudget(0)
+    stegs = Steganographer()
+    stegs._generate_header(32, 1, "")
+    memory_budget.max_bytes = stegs._preflight(CLEAN_PNG_LOCATION, 32) * 3 // 2  # Room for one hide at a time.
+    dirty_fnames = ["tests/dirtyImage_test_hide_memory_budget" + str(hide) + ".png" for hide in range(4)]
+    most_reserved = []
+    acquire = memory_budget.acquire
+
+    def record_acquire(nbytes):
+        acquire(nbytes)
+        most_reserved.append(memory_budget.reserved)
+
+    memory_budget.acquire = record_acquire
+    threads = [threading.Thread(target=Steganographer(memory_budget=memory_budget).steganographer_hide,
+                                args=(CLEAN_PNG_LOCATION, "budget message %20d" % hide, dirty_fname))
+               for hide, dirty_fname in enumerate(dirty_fnames)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(most_reserved) <= memory_budget.max_bytes
+    assert memory_budget.reserved == 0
+
+    for hide, dirty_fname in enumerate(dirty_fnames):
+        assert Steganographer().steganographer_reveal(dirty_fname)[0] == ("budget message %20d" % hide).encode()
+        os.remove(dirty_fname)
+
+
+def test_main_over_capacity(capfd):
+    """Command line calls that can not hide everything say how much the image can hold and fail."""
+    dirty_image = "tests/dirtyImage_test_main_over_capacity.png"
+
+    result = os.system("python -m steganographer " + CLEAN_PNG_LOCATION + " -f tests/FileToHide.zip -o " + dirty_image +
+                       " --max-payload 1000")
+    result2 = os.system("python -m steganographer " + CLEAN_PNG_LOCATION + " -m " + "a" * 9363 + " -o " +
+                        dirty_image)
+    out, _ = capfd.readouterr()
+
+    assert result != 0 and result2 != 0
+    assert out.splitlines() == ["The hide needs 4689 payload bytes, over the limit of 1000.",
+                                "The image " + CLEAN_PNG_LOCATION + " can hold 9362 bytes, not 9363."]
+    assert not os.path.exists(dirty_image)
@@ -0,0 +1,151 @@
+"""Testing script for the metrics of hides and reveals."""
+import pickle
+import sys
+import os
+import os.path
+from urllib.request import urlopen
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.metrics import Counter, Histogram, Metrics
+# noinspection PyPep8
+from steganographer.batch import steganographer_hide_batch
+# noinspection PyPep8
+from steganographer.jobqueue import JobQueue, run_workers
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def test_exposition():
+    """Counters and histograms are written in the Prometheus text format, with cumulative buckets."""
+    counter = Counter('test_total', "A test counter.", ('action',))
+    histogram = Histogram('test_seconds', "A test histogram.", (0.5, 1), ('stage',))
+    counter.inc(action='hide')
+    counter.inc(2, action='say "hi"\n')
+    histogram.observe(0.5, stage='read')
+    histogram.observe(0.75, stage='read')
+    histogram.observe(3, stage='read')
+
+    assert counter.samples() == ['test_total{action="hide"} 1', r'test_total{action="say \"hi\"\n"} 2']
+    assert histogram.samples() == ['test_seconds_bucket{stage="read",le="0.5"} 1',
+                                   'test_seconds_bucket{stage="read",le="1"} 2',
+                                   'test_seconds_bucket{stage="read",le="+Inf"} 3',
+                                   'test_seconds_sum{stage="read"} 4.25', 'test_seconds_count{stage="read"} 3']
+    assert Metrics().exposition().startswith("# HELP steganographer_jobs_total Hides and reveals finished, failed "
+                                             "ones included.\n# TYPE steganographer_jobs_total counter\n# HELP ")
+    assert "\nsteganographer_embedded_bytes_total 0\n" in Metrics().exposition()
+
+
+def test_hide_reveal_metrics():
+    """Hides and reveals are counted with the bytes they hid and revealed, and each of their stages is timed."""
+    dirty_image = "tests/dirtyImage_test_hide_reveal_metrics.png"
+    metrics = Metrics()
+    stegs = Steganographer(metrics=metrics)
+
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "metrics message", dirty_image)
+    stegs.steganographer_reveal(dirty_image)
+    stegs.steganographer_append(dirty_image, "appended")
+    stegs.steganographer_reveal_all(dirty_image)
+
+    with pytest.raises(SystemExit):
+        stegs.steganographer_reveal(CLEAN_PNG_LOCATION)
+
+    assert metrics.jobs.value(action='hide') == 1
+    assert metrics.jobs.value(action='append') == 1
+    assert metrics.jobs.value(action='reveal') == 3
+    assert metrics.failures.value(action='reveal') == 1
+    assert metrics.embedded_bytes.value() == len("metrics message") + len("appended")
+    assert metrics.revealed_bytes.value() == 2 * len("metrics message") + len("appended")
+    assert metrics.carrier_bytes.count(action='hide') == 1
+    assert metrics.carrier_bytes.count(action='reveal') == 2
+
+    for stage, count in (('read', 5), ('hide', 2), ('write', 2), ('reveal', 2)):
+        assert metrics.stage_seconds.count(stage=stage) == count
+
+    os.remove(dirty_image)
+
+
+def test_batch_metrics():
+    """Hides in a batch are counted, with each of their stages timed."""
+    clean_bmp = "tests/cleanImage_test_batch_metrics.bmp"
+    dirty_fnames = ["tests/dirtyImage_test_batch_metrics" + str(job) + extension
+                    for job, extension in enumerate(('.png', '.bmp', '.png'))]
+    jobs = [(CLEAN_PNG_LOCATION if dirty_fname.endswith('.png') else clean_bmp, b"batch metrics", "", dirty_fname)
+            for dirty_fname in dirty_fnames]
+    metrics = Metrics()
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        clean.save(clean_bmp)
+
+    assert steganographer_hide_batch(jobs, metrics=metrics) == dirty_fnames
+    assert metrics.jobs.value(action='hide') == 3
+    assert metrics.embedded_bytes.value() == 3 * len(b"batch metrics")
+    assert [metrics.stage_seconds.count(stage=stage) for stage in ('read', 'hide', 'write')] == [3, 2, 2]
+
+    for fname in dirty_fnames + [clean_bmp]:
+        os.remove(fname)
+
+
+def test_worker_metrics():
+    """The metrics of worker processes are added to the metrics given once they finish, and survive pickling."""
+    queue_file = "tests/jobs_test_worker_metrics.db"
+    dirty_fnames = ["tests/dirtyImage_test_worker_metrics" + str(job) + ".png" for job in range(3)]
+    job_queue = JobQueue(queue_file)
+    job_queue.enqueue_many([('hide', CLEAN_PNG_LOCATION, "worker metrics", None, dirty_fname)
+                            for dirty_fname in dirty_fnames])
+    job_queue.close()
+    metrics = Metrics()
+
+    assert run_workers(queue_file, 2, metrics=metrics) == 3
+    assert metrics.jobs.value(action='hide') == 3
+    assert pickle.loads(pickle.dumps(metrics)).exposition() == metrics.exposition()
+
+    for fname in dirty_fnames + [queue_file]:
+        os.remove(fname)
+
+
+def test_serve_and_write():
+    """Metrics are served on a local port and written to files."""
+    metrics_file = "tests/metrics_test_serve_and_write.prom"
+    metrics = Metrics()
+    metrics.jobs.inc(action='hide')
+    server = metrics.serve(0)
+
+    try:
+        with urlopen("http://127.0.0.1:%d/metrics" % server.server_address[1]) as response:
+            assert response.headers['Content-Type'].startswith("text/plain; version=0.0.4")
+            assert response.read().decode('utf-8') == metrics.exposition()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    metrics.write(metrics_file)
+
+    with open(metrics_file, encoding='utf-8') as fmetrics:
+        assert 'steganographer_jobs_total{action="hide"} 1\n' in fmetrics.read()
+
+    os.remove(metrics_file)
+
+
+def test_main_metrics_file():
+    """Command line calls write the metrics of what they did with --metrics-file."""
+    dirty_image = "tests/dirtyImage_test_main_metrics_file.png"
+    metrics_file = "tests/metrics_test_main_metrics_file.prom"
+
+    result = os.system("python -m steganographer " + CLEAN_PNG_LOCATION + " -m test_main_metrics_file -o " +
+                       dirty_image + " --metrics-file " + metrics_file)
+
+    with open(metrics_file, encoding='utf-8') as fmetrics:
+        exposition = fmetrics.read()
+
+    assert result == 0
+    assert 'steganographer_jobs_total{action="hide"} 1\n' in exposition
+    assert 'steganographer_embedded_bytes_total 22\n' in exposition
+
+    os.remove(dirty_image)
+    os.remove(metrics_file)
@@ -0,0 +1,157 @@
+"""Testing script for writing PNGs deflated in several threads at the same time."""
+import io
+import os
+import os.path
+import struct
+import sys
+import zlib
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer import pngwriter
+# noinspection PyPep8
+from steganographer.pngwriter import PngTemplate, _adler32_combine, save_png, supports
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+CLEAN_JPG_LOCATION = "tests/cleanImage.jpg"
+
+
+def idat_stream(png):
+    """Returns the zlib stream of the IDAT chunks of the bytes of png, joined."""
+    position = 8
+    stream = b''
+
+    while position < len(png):
+        length, chunk_type = struct.unpack('>I4s', png[position:position + 8])
+        data = png[position + 8:position + 8 + length]
+        assert struct.unpack('>I', png[position + 8 + length:position + 12 + length])[0] == zlib.crc32(chunk_type +
+                                                                                                        data)
+
+        if chunk_type == b'IDAT':
+            stream += data
+
+        position += length + 12
+
+    return stream
+
+
+def test_adler32_combine():
+    """The Adler-32 of data joined is combined from the Adler-32 of each piece."""
+    for first, second in ((b"test_adler32_combine" * 1000, bytes(range(256)) * 300), (b"", b"a"), (b"a", b"")):
+        assert _adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second)) == zlib.adler32(first +
+                                                                                                        second)
+
+
+def test_save_png_modes(monkeypatch):
+    """Images of every mode written are decoded as they were, from a zlib stream of many bands that checks out."""
+    monkeypatch.setattr(pngwriter, '_BAND_LEN', 10000)
+
+    with Image.open(CLEAN_JPG_LOCATION) as clean:
+        photo = clean.convert('RGB')
+
+    for mode in ('L', 'LA', 'RGB', 'RGBA', 'P'):
+        img = photo.convert(mode)
+        png = io.BytesIO()
+        save_png(img, png, 4)
+        stream = idat_stream(png.getvalue())
+        png.seek(0)
+
+        with Image.open(png) as written:
+            assert written.mode == mode and written.size == img.size
+            assert written.tobytes() == img.tobytes()
+            assert written.getpalette() == img.getpalette()
+
+        assert len(zlib.decompress(stream)) == img.height * (len(img.tobytes()) // img.height + 1)
+
+
+def test_save_png_workers():
+    """The bytes written are the same whatever the number of workers, and images that can not be written are not."""
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        img = clean.convert('RGB')
+
+    pngs = []
+
+    for workers in (1, 3, None):
+        png = io.BytesIO()
+        save_png(img, png, workers)
+        pngs.append(png.getvalue())
+
+    assert pngs[0] == pngs[1] == pngs[2]
+    assert not supports(Image.new('P', (4, 4))) and not supports(Image.new('1', (4, 4)))
+
+    with pytest.raises(ValueError):
+        save_png(Image.new('I', (4, 4)), io.BytesIO())
+
+
+def test_png_template(monkeypatch):
+    """Images written from a template are the same as save_png writes, deflating only the bands rows changed in."""
+    monkeypatch.setattr(pngwriter, '_BAND_LEN', 10000)
+    deflate_band = pngwriter._deflate_band
+    deflated = []
+    monkeypatch.setattr(pngwriter, '_deflate_band', lambda band, *args: deflated.append(band) or deflate_band(band,
+                                                                                                               *args))
+
+    with Image.open(CLEAN_JPG_LOCATION) as clean:
+        img = clean.convert('RGBA')
+
+    template = PngTemplate(img)
+    band_count = len(deflated)
+    row_len = 690 * 4
+
+    for changed_len in (0, 1, row_len, row_len + 1, 20000, len(img.tobytes()), None):
+        dirty = bytearray(img.tobytes())
+        dirty[:changed_len] = bytes(value ^ 1 for value in dirty[:changed_len])
+        dirty_img = Image.frombytes('RGBA', img.size, bytes(dirty))
+        png = io.BytesIO()
+        template_png = io.BytesIO()
+        save_png(dirty_img, png)
+        del deflated[:]
+        template.save(dirty_img, template_png, changed_len)
+
+        assert template_png.getvalue() == png.getvalue()
+
+        if changed_len in (len(img.tobytes()), None):
+            assert len(deflated) == band_count
+        else:
+            assert sum(len(band) for band in deflated) < changed_len + 2 * (row_len + 1) + 10000
+
+    with pytest.raises(ValueError):
+        template.save(img.convert('RGB'), io.BytesIO())
+
+
+def test_hide_png_workers():
+    """Hides written by the parallel writer are revealed like any other."""
+    dirty_image = "tests/dirtyImage_test_hide_png_workers.png"
+    dirty_image2 = "tests/dirtyImage_test_hide_png_workers2.png"
+    Steganographer(png_workers=2).steganographer_hide_file(CLEAN_JPG_LOCATION, "tests/FileToHide.zip", dirty_image)
+    Steganographer().steganographer_hide_file(CLEAN_JPG_LOCATION, "tests/FileToHide.zip", dirty_image2)
+
+    with open("tests/FileToHide.zip", 'rb') as input_file:
+        assert Steganographer().steganographer_reveal(dirty_image) == (input_file.read(), "tests/FileToHide.zip")
+
+    with Image.open(dirty_image) as dirty, Image.open(dirty_image2) as dirty2:
+        assert dirty.tobytes() == dirty2.tobytes()
+
+    os.remove(dirty_image)
+    os.remove(dirty_image2)
+
+
+def test_main_png_workers(capfd):
+    """Command line calls deflate the png in the number of threads given."""
+    dirty_image = "tests/dirtyImage_test_main_png_workers.png"
+
+    result = os.system("python -m steganographer " + CLEAN_PNG_LOCATION + " -m test_main_png_workers --png-workers 2 "
+                       "-o " + dirty_image)
+    result2 = os.system("python -m steganographer " + dirty_image)
+    out, _ = capfd.readouterr()
+
+    assert result == 0 and result2 == 0
+    assert out.splitlines() == ["The message has been hidden in " + dirty_image,
+                                "The hidden message was...", "test_main_png_workers"]
+
+    os.remove(dirty_image)
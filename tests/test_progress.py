@@ -0,0 +1,140 @@
+"""Testing script for progress reports and cancelling."""
+import random
+import sys
+import os
+import os.path
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.progress import CancelToken, Cancelled, Progress
+# noinspection PyPep8
+from conftest import make_wav, random_bytes
+
+DATA_LEN = 80 * 1024  # More than one chunk.
+
+
+def make_image(fname):
+    """Saves an image of random pixels that can hold DATA_LEN bytes as fname. Returns fname."""
+    Image.frombytes('RGB', (500, 500), random_bytes(random.Random(0), 500 * 500 * 3)).save(fname)
+
+    return fname
+
+
+def leftovers(fname):
+    """Returns fname and any temporary file made for it that are still there."""
+    directory, name = os.path.split(fname)
+
+    return [entry for entry in os.listdir(directory) if entry == name or entry.startswith('.' + name + '.')]
+
+
+def test_progress():
+    """A fraction and a time left are worked out from the bytes done and the time so far."""
+    assert Progress('hide', 25, 100, 2.0).fraction == 0.25
+    assert Progress('hide', 25, 100, 2.0).eta == 6.0
+    assert Progress('hide', 0, 100, 2.0).eta is None
+    assert Progress('read', 0, 0, 0.0).fraction == 0.0
+
+
+def test_hide_reveal_progress():
+    """Each stage is reported as it starts, and hiding and revealing after every chunk up to the whole data."""
+    clean_image = make_image("tests/cleanImage_test_hide_reveal_progress.png")
+    dirty_image = "tests/dirtyImage_test_hide_reveal_progress.png"
+    data = random_bytes(random.Random(2), DATA_LEN)
+    reports = []
+
+    Steganographer(progress=reports.append).steganographer_hide_data(clean_image, data, '', dirty_image)
+    hide_reports = [report for report in reports if report.stage == 'hide']
+
+    assert [report.stage for report in reports] == ['read'] + ['hide'] * len(hide_reports) + ['write']
+    assert [report.bytes_done for report in hide_reports] == [0, 64 * 1024, DATA_LEN]
+    assert all(report.bytes_total == DATA_LEN for report in hide_reports)
+
+    del reports[:]
+
+    assert Steganographer(progress=reports.append).steganographer_reveal(dirty_image)[0] == data
+    assert [(report.stage, report.bytes_done) for report in reports] == [('read', 0), ('reveal', 0),
+                                                                        ('reveal', 64 * 1024), ('reveal', DATA_LEN)]
+    assert all(report.elapsed >= 0 for report in reports)
+
+    os.remove(clean_image)
+    os.remove(dirty_image)
+
+
+def test_hide_cancelled():
+    """A hide cancelled part way stops before writing, leaving no image and no temporary file."""
+    clean_image = make_image("tests/cleanImage_test_hide_cancelled.png")
+    dirty_image = "tests/dirtyImage_test_hide_cancelled.png"
+    cancel_token = CancelToken()
+
+    def cancel_after_first_chunk(progress):
+        if progress.bytes_done:
+            cancel_token.cancel()
+
+    stegs = Steganographer(progress=cancel_after_first_chunk, cancel_token=cancel_token)
+
+    with pytest.raises(Cancelled):
+        stegs.steganographer_hide_data(clean_image, random_bytes(random.Random(3), DATA_LEN), '', dirty_image)
+
+    assert cancel_token.cancelled
+    assert leftovers(dirty_image) == []
+
+    with pytest.raises(Cancelled):
+        Steganographer(cancel_token=cancel_token).steganographer_reveal(clean_image)
+
+    os.remove(clean_image)
+
+
+def test_stream_hide_cancelled():
+    """A streamed carrier cancelled part way through writing removes what it wrote, and reports as it goes."""
+    clean_wav = make_wav("tests/cleanAudio_test_stream_hide_cancelled.wav", 100000)
+    dirty_wav = "tests/dirtyAudio_test_stream_hide_cancelled.wav"
+    data = random_bytes(random.Random(4), 20000)
+    cancel_token = CancelToken()
+    reports = []
+
+    def cancel_in_second_chunk(progress):
+        reports.append(progress)
+
+        if progress.bytes_done > 0:
+            cancel_token.cancel()
+
+    with pytest.raises(Cancelled):
+        Steganographer(progress=cancel_in_second_chunk, cancel_token=cancel_token).steganographer_hide_data(
+            clean_wav, data, '', dirty_wav)
+
+    assert leftovers(dirty_wav) == []
+    assert reports[-1].bytes_done == 64 * 1024 * 2 // 8  # The carrier bytes in the first chunk of frames.
+
+    del reports[:]
+    Steganographer(progress=reports.append).steganographer_hide_data(clean_wav, data, '', dirty_wav)
+
+    assert reports[-1].bytes_done == reports[-1].bytes_total
+    assert Steganographer().steganographer_reveal(dirty_wav)[0] == data
+
+    os.remove(clean_wav)
+    os.remove(dirty_wav)
+
+
+def test_main_progress(capfd):
+    """Command line calls draw the progress of each stage on stderr with --progress."""
+    clean_image = make_image("tests/cleanImage_test_main_progress.png")
+    dirty_image = "tests/dirtyImage_test_main_progress.png"
+
+    result = os.system("python -m steganographer " + clean_image + " -m test_main_progress -o " + dirty_image +
+                       " --progress")
+    out, err = capfd.readouterr()
+    lines = err.replace('\r\n', '\n').split('\n')
+
+    assert result == 0
+    assert out.startswith("The message has been hidden in " + dirty_image)
+    assert lines[0] == "read..."
+    assert lines[1].startswith("\rhide   [") and lines[1].rstrip().endswith("100% 18 B of 18 B")
+    assert lines[2:] == ["write...", ""]
+
+    os.remove(clean_image)
+    os.remove(dirty_image)
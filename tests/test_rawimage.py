@@ -0,0 +1,176 @@
+# pylint: disable=protected-access
+"""Testing script for hiding in uncompressed images where their pixels are."""
+import sys
+import os
+import os.path
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer, _open_image_file
+# noinspection PyPep8
+from steganographer.rawimage import open_raw_image, _ppm_layout
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+MESSAGE = "Hidden where the pixels are."
+
+
+def make_carrier(fname, mode, **save_options):
+    """Saves an odd sized piece of the clean png as fname in mode. Returns fname."""
+    with Image.open(CLEAN_PNG_LOCATION) as img:
+        img.crop((0, 0, 101, 40)).convert(mode).save(fname, **save_options)
+
+    return fname
+
+
+@pytest.mark.parametrize("mode,extension,save_options", [
+    ('RGB', '.bmp', {}), ('L', '.bmp', {}), ('P', '.bmp', {}), ('RGBA', '.bmp', {}),
+    ('RGB', '.ppm', {}), ('L', '.pgm', {}),
+    ('RGB', '.tiff', {}), ('L', '.tiff', {}), ('RGBA', '.tiff', {}), ('CMYK', '.tiff', {}), ('LA', '.tiff', {}),
+])
+def test_raw_hide(mode, extension, save_options):
+    """Uncompressed images keep their format and size, and get the same pixels Pillow would have hidden."""
+    fname = "tests/cleanImage_test_raw_hide_" + mode + extension
+    dirty_fname = "tests/dirtyImage_test_raw_hide_" + mode + extension
+    clean_image = make_carrier(fname, mode, **save_options)
+    stegs = Steganographer()
+
+    assert open_raw_image(clean_image) is not None
+    assert stegs.steganographer_hide(clean_image, MESSAGE, dirty_fname) == dirty_fname
+    assert os.path.getsize(dirty_fname) == os.path.getsize(clean_image)
+
+    clean_data = _open_image_file(clean_image)
+    expected = stegs._hide_entry(clean_data[1][:(stegs._header.header_length + len(MESSAGE)) * stegs._BYTELEN],
+                                 MESSAGE.encode('utf-8'))
+    dirty_data = _open_image_file(dirty_fname)
+
+    assert dirty_data[1] == expected + clean_data[1][len(expected):]
+    assert Steganographer().steganographer_reveal(dirty_fname)[0] == MESSAGE.encode('utf-8')
+
+    os.remove(clean_image)
+    os.remove(dirty_fname)
+
+
+@pytest.mark.parametrize("mode,extension", [('I;16', '.tiff'), ('I;16B', '.tiff'), ('I', '.tiff'), ('F', '.tiff'),
+                                            ('I', '.pgm')])
+def test_raw_hide_high_bit_depth(mode, extension):
+    """High bit depth images are changed in the least significant byte of each sample, like Pillow would."""
+    clean_image = "tests/cleanImage_test_raw_hide_high_bit_depth_" + mode.replace(';', '') + extension
+    dirty_fname = "tests/dirtyImage_test_raw_hide_high_bit_depth_" + mode.replace(';', '') + extension
+    img = Image.new(mode, (40, 20))
+    img.putdata([sample * 37 for sample in range(800)])
+    img.save(clean_image)
+    stegs = Steganographer()
+
+    assert open_raw_image(clean_image) is not None
+    assert stegs.steganographer_hide(clean_image, MESSAGE, dirty_fname) == dirty_fname
+
+    clean_data = _open_image_file(clean_image)
+    expected = stegs._hide_entry(clean_data[1][:(stegs._header.header_length + len(MESSAGE)) * stegs._BYTELEN],
+                                 MESSAGE.encode('utf-8'))
+
+    assert _open_image_file(dirty_fname)[1] == expected + clean_data[1][len(expected):]
+
+    os.remove(clean_image)
+    os.remove(dirty_fname)
+
+
+def test_raw_hide_in_place():
+    """With in_place the clean image itself is changed."""
+    clean_image = make_carrier("tests/cleanImage_test_raw_hide_in_place.bmp", 'RGB')
+    clean_size = os.path.getsize(clean_image)
+
+    assert Steganographer().steganographer_hide(clean_image, MESSAGE, in_place=True) == clean_image
+    assert os.path.getsize(clean_image) == clean_size
+    assert Steganographer().steganographer_reveal(clean_image)[0] == MESSAGE.encode('utf-8')
+
+    os.remove(clean_image)
+
+
+def test_raw_append():
+    """Appending to an uncompressed image writes it back in its own format, over itself by default."""
+    clean_image = make_carrier("tests/cleanImage_test_raw_append.bmp", 'RGB')
+    dirty_image = "tests/dirtyImage_test_raw_append.bmp"
+    appended_image = "tests/dirtyImage_test_raw_append_appended.ppm"
+    stegs = Steganographer()
+    stegs.steganographer_hide(clean_image, "first", dirty_image)
+    dirty_size = os.path.getsize(dirty_image)
+
+    assert stegs.steganographer_append(dirty_image, "second") == dirty_image
+    assert os.path.getsize(dirty_image) == dirty_size
+    assert stegs.steganographer_reveal_all(dirty_image) == [(b"first", ""), (b"second", "")]
+    assert stegs.steganographer_append(dirty_image, "third", appended_image) == \
+        "tests/dirtyImage_test_raw_append_appended.png"
+    assert not os.path.exists("tests/dirtyImage_test_raw_appendSteganogrified.png")
+
+    for fname in (clean_image, dirty_image, "tests/dirtyImage_test_raw_append_appended.png"):
+        os.remove(fname)
+
+
+def test_raw_hide_in_place_unsupported(capfd):
+    """Hiding in place in an image that can not be changed where it is, or with an output, is turned down."""
+    clean_image = make_carrier("tests/cleanImage_test_raw_hide_in_place_unsupported.bmp", 'RGB')
+
+    with pytest.raises(ValueError, match="can be hidden in in place"):
+        Steganographer().steganographer_hide("tests/cleanImage.jpg", MESSAGE, in_place=True)
+
+    with pytest.raises(ValueError, match="writes to"):
+        Steganographer().steganographer_hide(clean_image, MESSAGE, "tests/dirtyImage.bmp", in_place=True)
+
+    result = os.system("python -m steganographer tests/cleanImage.jpg -m hidden --in-place")
+    result2 = os.system("python -m steganographer " + clean_image + " -m hidden --in-place -o tests/dirtyImage.bmp")
+    _, err = capfd.readouterr()
+
+    assert result != 0 and result2 != 0
+    assert "--in-place only hides in uncompressed" in err and "can not be given an output file" in err
+    assert not os.path.exists("tests/dirtyImage.bmp")
+
+    os.remove(clean_image)
+
+
+def test_raw_hide_fallback():
+    """Compressed images and ones written with a different extension go through Pillow and come out as pngs."""
+    clean_image = make_carrier("tests/cleanImage_test_raw_hide_fallback.tiff", 'RGB', compression='tiff_lzw')
+    raw_image = make_carrier("tests/cleanImage_test_raw_hide_fallback.ppm", 'RGB')
+
+    assert open_raw_image(clean_image) is None
+    assert open_raw_image("tests/cleanImage.bmp") is None  # Is a jpeg.
+    assert Steganographer().steganographer_hide(clean_image, MESSAGE) == \
+        "tests/cleanImage_test_raw_hide_fallbackSteganogrified.png"
+    assert Steganographer().steganographer_hide(raw_image, MESSAGE, "tests/dirtyImage_test_raw_hide_fallback.bmp") \
+        == "tests/dirtyImage_test_raw_hide_fallback.png"
+
+    for fname in (clean_image, raw_image, "tests/cleanImage_test_raw_hide_fallbackSteganogrified.png",
+                  "tests/dirtyImage_test_raw_hide_fallback.png"):
+        os.remove(fname)
+
+
+def test_raw_hide_partial_range_pgm():
+    """Pgms with a lower maximum have their samples scaled by Pillow, so they are hidden in through it."""
+    clean_image = "tests/cleanImage_test_raw_hide_partial_range_pgm.pgm"
+
+    with open(clean_image, 'wb') as fimage:
+        fimage.write(b"P5\n60 40\n100\n" + bytes(sample % 101 for sample in range(60 * 40)))
+
+    assert open_raw_image(clean_image) is None
+
+    output_fname = Steganographer().steganographer_hide(clean_image, MESSAGE)
+
+    assert Steganographer().steganographer_reveal(output_fname)[0] == MESSAGE.encode('utf-8')
+
+    os.remove(clean_image)
+    os.remove(output_fname)
+
+
+def test_ppm_layout():
+    """Comments in the header are skipped and the pixels start after the single whitespace that ends it."""
+    head = b"P5\n# A comment\n3 2\n# Another\n255\n" + bytes(6)
+    layout = _ppm_layout(head)
+
+    assert layout.runs == [(len(head) - 6, 6)]
+    assert _ppm_layout(b"P5 3 2 65535\n").runs == [(13, 12)]
+    assert _ppm_layout(b"P6 3 2 65535\n") is None
+    assert _ppm_layout(b"P3 3 2 255\n") is None
+    assert _ppm_layout(b"P5 3 2 100\n") is None and _ppm_layout(b"P5 3 2 1023\n") is None
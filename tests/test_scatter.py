@@ -0,0 +1,159 @@
+"""Testing script for hiding data scattered over the whole carrier with a key."""
+import os
+import os.path
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.scatter import _IndexCache, gather, key_seed, scatter, scatter_index
+# noinspection PyPep8
+from steganographer.shard import steganographer_hide_shards, steganographer_reveal_shards
+# noinspection PyPep8
+from conftest import make_wav
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+
+
+def test_scatter_index():
+    """The scatter order is a shuffle of every position that depends on the key, and is only made once."""
+    seed = key_seed("test_scatter_index")
+    order, inverse = scatter_index(seed, 1000)
+    carrier_data = bytes(range(250)) * 4
+
+    assert sorted(order) == list(range(1000))
+    assert list(order) != list(range(1000))
+    assert [order[position] for position in inverse] == list(range(1000))
+    assert list(order) != list(scatter_index(key_seed("another key"), 1000)[0])
+    assert gather(carrier_data, seed) == bytes(carrier_data[position] for position in order)
+    assert scatter(gather(carrier_data, seed), seed) == carrier_data
+    assert scatter_index(seed, 1000) is scatter_index(seed, 1000)
+    assert key_seed(b"test_scatter_index") == seed
+    assert gather(b"a", seed) == b"a" and gather(b"", seed) == b""
+
+
+def test_scatter_index_cache():
+    """Scatter indexes are cached up to a number of bytes of positions, dropping the least recently used first."""
+    cache = _IndexCache(max_bytes=8 * 2500)
+    first_seed, second_seed = key_seed("first"), key_seed("second")
+    first = cache.get(first_seed, 1000)
+
+    assert cache.get(first_seed, 1000) is first
+    assert cache.get(second_seed, 1000) is cache.get(second_seed, 1000)
+    assert cache.current_bytes == 8 * 2000
+
+    cache.get(first_seed, 1000)
+    cache.get(second_seed, 1500)
+
+    assert cache.current_bytes == 8 * 2500
+    assert cache.get(first_seed, 1000) is first
+    assert cache.get(second_seed, 4000) is not cache.get(second_seed, 4000)
+
+    cache.clear()
+
+    assert cache.current_bytes == 0 and cache.get(first_seed, 1000) is not first
+
+
+def test_hide_reveal_key():
+    """Data hidden with a key is spread over the whole image and is only revealed with the same key."""
+    dirty_image = "tests/dirtyImage_test_hide_reveal_key.png"
+    Steganographer(key="secret").steganographer_hide(CLEAN_PNG_LOCATION, "test_hide_reveal_key", dirty_image)
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean, Image.open(dirty_image) as dirty:
+        changed = [index for index, (clean_byte, dirty_byte) in enumerate(zip(clean.tobytes(), dirty.tobytes()))
+                   if clean_byte != dirty_byte]
+
+    assert Steganographer(key="secret").steganographer_reveal(dirty_image) == (b"test_hide_reveal_key", "")
+    assert changed[0] > 8 * len("test_hide_reveal_key") and changed[-1] > 272 * 92 * 3 * 3 // 4
+
+    for stegs in (Steganographer(), Steganographer(key="wrong")):
+        with pytest.raises(SystemExit):
+            stegs.steganographer_reveal(dirty_image)
+
+    os.remove(dirty_image)
+
+
+def test_key_append_verify():
+    """Entries appended with the key follow the first one, and are checked and revealed with it."""
+    dirty_image = "tests/dirtyImage_test_key_append_verify.png"
+    stegs = Steganographer(key=b"secret")
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "first", dirty_image, chunk_size=2)
+    stegs.steganographer_append(dirty_image, "second")
+
+    assert stegs.steganographer_reveal_all(dirty_image) == [(b"first", ""), (b"second", "")]
+    assert stegs.steganographer_reveal_chunks(dirty_image) == (b"first", "", [])
+    assert stegs.steganographer_verify(dirty_image) is True
+    assert Steganographer().steganographer_verify(dirty_image) is False
+
+    os.remove(dirty_image)
+
+
+def test_key_in_place_and_carrier():
+    """Uncompressed images hidden in where they are and wav files are scattered over too."""
+    clean_bmp = "tests/cleanImage_test_key_in_place_and_carrier.bmp"
+    clean_wav = "tests/cleanAudio_test_key_in_place_and_carrier.wav"
+    dirty_wav = "tests/dirtyAudio_test_key_in_place_and_carrier.wav"
+    stegs = Steganographer(key="secret")
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        clean.save(clean_bmp)
+
+    make_wav(clean_wav, 256 * 100)
+
+    stegs.steganographer_hide(clean_bmp, "in place", in_place=True)
+    stegs.steganographer_hide_file(clean_wav, "tests/FileToHide.zip", dirty_wav)
+
+    with open("tests/FileToHide.zip", 'rb') as input_file:
+        assert stegs.steganographer_reveal(dirty_wav) == (input_file.read(), "tests/FileToHide.zip")
+
+    assert stegs.steganographer_reveal(clean_bmp) == (b"in place", "")
+    assert stegs.steganographer_verify(dirty_wav) is True
+
+    with pytest.raises(SystemExit):
+        Steganographer().steganographer_reveal(dirty_wav)
+
+    for fname in (clean_bmp, clean_wav, dirty_wav):
+        os.remove(fname)
+
+
+def test_key_shards():
+    """Shards hidden with a key are put back together with it."""
+    dirty_fnames = ["tests/dirtyImage_test_key_shards" + str(shard) + ".png" for shard in range(2)]
+    hidden_fnames = steganographer_hide_shards([CLEAN_PNG_LOCATION, "tests/cleanImagePIL.png"], "tests/FileToHide.zip",
+                                               dirty_fnames, key="secret")
+
+    with open("tests/FileToHide.zip", 'rb') as input_file:
+        assert steganographer_reveal_shards(hidden_fnames, key="secret") == (input_file.read(),
+                                                                             "tests/FileToHide.zip")
+
+    for fname in hidden_fnames:
+        os.remove(fname)
+
+
+def test_main_key(capfd):
+    """Command line calls hide, reveal and verify with a key."""
+    dirty_image = "tests/dirtyImage_test_main_key.png"
+
+    result = os.system("python -m steganographer " + CLEAN_PNG_LOCATION + " -m test_main_key -k secret -o " +
+                       dirty_image)
+    result2 = os.system("python -m steganographer " + dirty_image + " -k secret")
+    result3 = os.system("python -m steganographer " + dirty_image)
+    out, _ = capfd.readouterr()
+
+    assert result == 0 and result2 == 0 and result3 == 0
+    assert out.splitlines() == ["The message has been hidden in " + dirty_image,
+                                "The hidden message was...", "test_main_key",
+                                "This file " + dirty_image + " has no hidden message."]
+
+    result = os.system("python -m steganographer verify -k secret " + dirty_image)
+    result2 = os.system("python -m steganographer verify " + dirty_image)
+    out, _ = capfd.readouterr()
+
+    assert result == 0 and result2 != 0
+    assert out.splitlines() == [dirty_image + ": ok", dirty_image + ": FAILED"]
+
+    os.remove(dirty_image)
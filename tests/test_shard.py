@@ -0,0 +1,166 @@
+# pylint: disable=protected-access
+"""Testing script for splitting payloads across images."""
+import pytest
+from PIL import Image
+import sys
+import os
+import os.path
+import random
+from shutil import copy2
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# noinspection PyPep8
+from steganographer.steganographer import Steganographer
+# noinspection PyPep8
+from steganographer.shard import ShardHeader, steganographer_hide_shards, steganographer_reveal_shards
+# noinspection PyPep8
+from steganographer.errors import CapacityError, SteganographerError
+
+CLEAN_PNG_LOCATION = "tests/cleanImage.png"
+FILE_TO_HIDE = "tests/FileToHide.zip"
+
+
+def make_carriers(name, count):
+    """Crops count small carriers out of the clean image. Returns their names."""
+    carriers = []
+
+    with Image.open(CLEAN_PNG_LOCATION) as clean:
+        for carrier_index in range(count):
+            carrier = "tests/cleanImage_" + name + str(carrier_index) + ".png"
+            clean.crop((carrier_index * 10, 0, carrier_index * 10 + 100, 30)).save(carrier)
+            carriers.append(carrier)
+
+    return carriers
+
+
+def remove_files(fnames):
+    """Removes every file in fnames."""
+    for fname in fnames:
+        os.remove(fname)
+
+
+def test_shard_header_inverse():
+    """A shard header converted to bytes is retrieved as it was."""
+    header = ShardHeader(1234, 1, "test_shard_header_inverse.zip", bytes(range(16)), 3, 7, 98765)
+    retrieved_header = ShardHeader()
+
+    assert retrieved_header.retrieve_header(header.header_as_bytes) is True
+    assert retrieved_header.data_len == 1234
+    assert retrieved_header.file_name == b"test_shard_header_inverse.zip"
+    assert retrieved_header.payload_id == bytes(range(16))
+    assert (retrieved_header.shard_index, retrieved_header.shard_count, retrieved_header.total_len) == (3, 7, 98765)
+    assert len(header.header_as_bytes) == header.header_length
+
+
+def test_hide_reveal_shards():
+    """A file larger than one image is split across several and revealed from them in any order."""
+    carriers = make_carriers("test_hide_reveal_shards", 6)
+
+    hidden_fnames = steganographer_hide_shards(carriers, FILE_TO_HIDE, workers=2)
+    random.shuffle(hidden_fnames)
+    revealed_data, file_name = steganographer_reveal_shards(hidden_fnames, workers=2)
+
+    with open(FILE_TO_HIDE, 'rb') as original:
+        assert revealed_data == original.read()
+    assert file_name == FILE_TO_HIDE
+    assert len(hidden_fnames) == 5
+
+    remove_files(carriers + hidden_fnames)
+
+
+def test_hide_shards_too_small():
+    """Hiding raises instead of truncating when the images can not hold the whole file."""
+    carriers = make_carriers("test_hide_shards_too_small", 2)
+
+    with pytest.raises(CapacityError):
+        steganographer_hide_shards(carriers, FILE_TO_HIDE)
+
+    remove_files(carriers)
+
+
+def test_reveal_shards_missing():
+    """Revealing raises when a shard is missing or an image has no shard."""
+    carriers = make_carriers("test_reveal_shards_missing", 5)
+    hidden_fnames = steganographer_hide_shards(carriers, FILE_TO_HIDE)
+
+    with pytest.raises(SteganographerError, match="all the shards"):
+        steganographer_reveal_shards(hidden_fnames[1:])
+    with pytest.raises(SteganographerError, match="no hidden shard"):
+        steganographer_reveal_shards(hidden_fnames[1:] + [CLEAN_PNG_LOCATION])
+
+    remove_files(carriers + hidden_fnames)
+
+
+def test_shards_not_plain_header():
+    """An image holding a shard is not mistaken for one holding a whole payload."""
+    carriers = make_carriers("test_shards_not_plain_header", 5)
+    hidden_fnames = steganographer_hide_shards(carriers, FILE_TO_HIDE)
+
+    with pytest.raises(SystemExit):
+        Steganographer().steganographer_reveal(hidden_fnames[0])
+
+    remove_files(carriers + hidden_fnames)
+
+
+def test_main_shards(capfd):
+    """Command line calls split a file across images and reveal it from them."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    carriers = make_carriers("test_main_shards", 5)
+    hidden_fnames = [carrier[:-4] + "Steganogrified.png" for carrier in carriers]
+    output_fname = "tests/test_main_shards.zip"
+
+    result = os.system('python -m steganographer ' + carriers[0] + ' -f ' + FILE_TO_HIDE + ' -s ' +
+                       ' '.join(carriers[1:]))
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "The file " + FILE_TO_HIDE + " has been split across " + ", ".join(hidden_fnames) + line_end
+
+    result = os.system('python -m steganographer ' + hidden_fnames[-1] + ' -r -o ' + output_fname + ' -s ' +
+                       ' '.join(hidden_fnames[:-1]))
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "The hidden file was revealed in " + output_fname + line_end
+    with open(FILE_TO_HIDE, 'rb') as original, open(output_fname, 'rb') as revealed:
+        assert original.read() == revealed.read()
+
+    remove_files(carriers + hidden_fnames + [output_fname])
+
+
+def test_main_single_shard(capfd):
+    """A file that fits in the first image is revealed from it alone, and images too small make the calls fail."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    carriers = make_carriers("test_main_single_shard", 2)
+    clean_image = "tests/cleanImage_test_main_single_shard.png"
+    dirty_image = "tests/cleanImage_test_main_single_shardSteganogrified.png"
+    output_fname = "tests/test_main_single_shard.zip"
+    copy2(CLEAN_PNG_LOCATION, clean_image)
+
+    result = os.system('python -m steganographer ' + clean_image + ' -f ' + FILE_TO_HIDE + ' -s ' + carriers[0])
+    result += os.system('python -m steganographer ' + dirty_image + ' -r -o ' + output_fname + ' -s')
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "The file " + FILE_TO_HIDE + " has been split across " + dirty_image + line_end + \
+        "The hidden file was revealed in " + output_fname + line_end
+    with open(FILE_TO_HIDE, 'rb') as original, open(output_fname, 'rb') as revealed:
+        assert original.read() == revealed.read()
+
+    result = os.system('python -m steganographer ' + carriers[0] + ' -f ' + FILE_TO_HIDE + ' -s ' + carriers[1])
+    out, _ = capfd.readouterr()
+
+    assert result != 0
+    assert out == "The images can hold 2102 of the 4689 bytes in " + FILE_TO_HIDE + "." + line_end
+
+    result = os.system('python -m steganographer ' + carriers[0] + ' -r -s')
+    out, _ = capfd.readouterr()
+
+    assert result != 0
+    assert out == "This file " + carriers[0] + " has no hidden shard." + line_end
+
+    remove_files(carriers + [clean_image, dirty_image, output_fname])
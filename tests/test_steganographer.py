@@ -5,16 +5,21 @@ from PIL import ImageChops, Image
 import sys
 import os
 import os.path
+import zlib
 from hypothesis import given
 from hypothesis.strategies import text, binary, characters
 from shutil import copy2
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 # noinspection PyPep8
-from steganographer.steganographer import Steganographer
+from steganographer.steganographer import Steganographer, Header
+# noinspection PyPep8
+from steganographer.capacity import carrier_length
+# noinspection PyPep8
+from steganographer.errors import ChunkTableError
 # noinspection PyPep8
 from steganographer.steganographer import _unpack_image, _pack_image, _open_bin_file, _write_bin_file, \
-    _open_image_file, _write_image_file
+    _open_image_file, _write_image_file, _frame_chunks, _read_chunk_table, _unframe_chunks, _atomic_output
 
 CLEAN_PNG_LOCATION = "tests/cleanImage.png"
 
@@ -22,12 +27,31 @@ CLEAN_PNG_LOCATION = "tests/cleanImage.png"
 def test_generate_header():
     """The header is generated as expected"""
     stegs = Steganographer()
-    header = bytes(stegs._header._HEADER_TITLE, 'utf-8') + \
-        bytes(stegs._header.data_len.to_bytes(stegs._header._HEADER_DATA_SIZE, "little")) + \
-        bytes(stegs._header.bits_used.to_bytes(stegs._header._HEADER_BITS_SIZE, "little")) + \
-        bytes(stegs._header.file_name_len.to_bytes(stegs._header._HEADER_FILE_LENGTH_SIZE, "little"))
+    header = b"STEG" + bytes([2, 0]) + (1234).to_bytes(8, "little") + bytes([1, 0]) + bytes(4) + \
+        (10).to_bytes(2, "little") + "nämé.txt".encode('utf-8')
+
+    assert header == stegs._generate_header(1234, 1, "nämé.txt")
+    assert stegs._header.header_length == len(header)
+
+
+def test_generate_legacy_header():
+    """Version 1 headers, titled STEGS, are generated as they used to be."""
+    header = Header(1234, 1, "name.txt")
+    header.version = 1
+    legacy_header = b"STEGS" + (1234).to_bytes(10, "little") + bytes([1]) + (8).to_bytes(2, "little") + b"name.txt"
+
+    assert header.header_as_bytes == legacy_header
+    assert header.header_length == len(legacy_header)
+
 
-    assert header == stegs._generate_header(stegs._header.data_len, stegs._header.bits_used, "")
+def test_retrieve_header_invalid():
+    """Data that does not start with a header, or is too short to hold one, has no valid header."""
+    header = Header(1234, 1, "name.txt")
+
+    assert Header().retrieve_header(header.header_as_bytes) is True
+    assert Header().retrieve_header(header.header_as_bytes[:Header.PREFIX_LENGTH - 1]) is False
+    assert Header().retrieve_header(b"STEF" + header.header_as_bytes[4:]) is False
+    assert Header().retrieve_header(b"STEG" + bytes([3]) + header.header_as_bytes[5:]) is False
 
 
 def test_retrieve_header():
@@ -52,6 +76,23 @@ def test_retrieve_header():
     assert stegs._header.file_name.decode('utf-8') == test_file_name
 
 
+def test_retrieve_legacy_header():
+    """Version 1 headers are retrieved, so images steganogrified before version 2 headers can be revealed."""
+    stegs = Steganographer()
+    test_data = bytes(b'\x01' * 1000)
+    legacy_header = Header(5, 1, "test_retrieve_legacy_header.txt")
+    legacy_header.version = 1
+
+    hidden_data = stegs._hide_data(test_data, legacy_header.header_as_bytes + b"12345")
+    header_retrieved = stegs._retrieve_header(hidden_data)
+
+    assert header_retrieved is True
+    assert stegs._header.version == 1
+    assert stegs._header.data_len == 5
+    assert stegs._header.header_length == 18 + len("test_retrieve_legacy_header.txt")
+    assert stegs._header.file_name == b"test_retrieve_legacy_header.txt"
+
+
 def test_hide_byte():
     """The _hide_byte function does hide a byte and returns the test_data with that byte hidden."""
     stegs = Steganographer()
@@ -659,6 +700,216 @@ def test_unicode_inverse():
                                                                             "tests/dirtyImage.png"))[0].decode('utf-8')
 
 
+def test_steganographer_append_file():
+    """A file appended to a steganogrified image is revealed along with what was already hidden."""
+    dirty_image = "tests/dirtyImage_test_steganographer_append_file.png"
+    hidden_message = "Hidden text from test_steganographer_append_file."
+    file_to_hide = "tests/FileToHide.zip"
+
+    stegs = Steganographer()
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, hidden_message, dirty_image)
+    appended_fname = stegs.steganographer_append_file(dirty_image, file_to_hide)
+    revealed = stegs.steganographer_reveal_all(appended_fname)
+
+    with open(file_to_hide, 'rb') as original:
+        assert revealed == [(hidden_message.encode('utf-8'), ""), (original.read(), file_to_hide)]
+    assert stegs.steganographer_reveal(appended_fname)[0].decode('utf-8') == hidden_message
+    assert appended_fname == dirty_image
+
+    os.remove(dirty_image)
+
+
+def test_steganographer_append_untouched():
+    """Appending only changes the carrier bytes after the entries already hidden."""
+    dirty_image = "tests/dirtyImage_test_steganographer_append_untouched.png"
+    appended_image = "tests/dirtyImage_test_steganographer_append_untouched_appended.png"
+
+    stegs = Steganographer()
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, "First message.", dirty_image)
+    stegs.steganographer_append(dirty_image, "Second message.", appended_image)
+    stegs.steganographer_append(appended_image, "Third message.")
+    dirty_data = _open_image_file(dirty_image)[1]
+    appended_data = _open_image_file(appended_image)[1]
+    entries, end = stegs._retrieve_entries(appended_data)
+
+    assert [entry[0] for entry in entries] == [0, 36 * 8, (36 + 37) * 8]
+    assert end == (36 + 37 + 36) * 8
+    assert appended_data[:entries[1][0]] == dirty_data[:entries[1][0]]
+    assert appended_data[end:] == dirty_data[end:]
+    assert [data for data, _ in stegs.steganographer_reveal_all(appended_image)] == \
+        [b"First message.", b"Second message.", b"Third message."]
+
+    os.remove(dirty_image)
+    os.remove(appended_image)
+
+
+def test_steganographer_append_no_msg():
+    """Appending to an image without anything hidden in it exits."""
+    stegs = Steganographer()
+
+    with pytest.raises(SystemExit):
+        stegs.steganographer_append(CLEAN_PNG_LOCATION, "Nothing to append to.")
+
+
+def test_header_checksum():
+    """The checksum of the data is stored in the header."""
+    dirty_image = "tests/dirtyImage_test_header_checksum.png"
+    hidden_message = "Hidden text from test_header_checksum."
+
+    stegs = Steganographer()
+    stegs.steganographer_hide(CLEAN_PNG_LOCATION, hidden_message, dirty_image)
+    stegs.steganographer_reveal(dirty_image)
+
+    assert stegs._header.flags & Header.FLAG_CHECKSUM
+    assert stegs._header.checksum == zlib.crc32(hidden_message.encode('utf-8'))
+
+    os.remove(dirty_image)
+
+
+def test_steganographer_verify():
+    """Verifying checks every entry against its checksum and fails once a hidden bit is changed."""
+    dirty_image = "tests/dirtyImage_test_steganographer_verify.png"
+    corrupt_image = "tests/dirtyImage_test_steganographer_verify_corrupt.png"
+
+    stegs = Steganographer()
+    stegs._CHUNK_LEN = 1000
+    stegs.steganographer_hide_file(CLEAN_PNG_LOCATION, "tests/FileToHide.zip", dirty_image)
+    stegs.steganographer_append(dirty_image, "Appended message.")
+    dirty_data = _open_image_file(dirty_image)
+    entries, _ = stegs._retrieve_entries(dirty_data[1])
+    corrupt_data = bytearray(dirty_data[1])
+    corrupt_data[entries[1][0] - 1] ^= 1
+    _write_image_file(corrupt_image, dirty_image, (dirty_data[0], bytes(corrupt_data)))
+
+    assert stegs.steganographer_verify(dirty_image) is True
+    assert stegs.steganographer_verify(corrupt_image) is False
+    assert stegs.steganographer_verify("tests/dirtyImageWFile.png") is None
+    assert stegs.steganographer_verify(CLEAN_PNG_LOCATION) is False
+
+    os.remove(dirty_image)
+    os.remove(corrupt_image)
+
+
+def test_verify_truncated():
+    """Verifying fails when the image is too small to hold all the data."""
+    stegs = Steganographer()
+    test_data = bytes(b'\x01' * 1000)
+    stegs._generate_header(200, 1, "")
+    dirty_data = stegs._hide_entry(test_data, bytes(range(200)))
+
+    assert stegs._retrieve_header(dirty_data) is True
+    assert stegs._verify_entry(dirty_data, 0, stegs._header) is False
+
+
+def test_frame_chunks():
+    """Framed data starts with a table of the chunks, and unframing it gives back the data."""
+    data = bytes(range(250))
+    framed_data = _frame_chunks(data, 100)
+
+    assert _read_chunk_table(framed_data) == (100, [(100, zlib.crc32(data[:100])), (100, zlib.crc32(data[100:200])),
+                                                    (50, zlib.crc32(data[200:]))])
+    assert len(framed_data) == 8 + 3 * 8 + len(data)
+    assert _unframe_chunks(framed_data) == data
+    assert _unframe_chunks(_frame_chunks(b'', 100)) == b''
+
+    damaged_length = bytearray(framed_data)
+    damaged_length[8 + 8] ^= 1
+
+    assert _read_chunk_table(bytes(damaged_length))[1][1] == (100, None)
+
+    for damaged_byte in (0, 4):
+        damaged_table = bytearray(framed_data)
+        damaged_table[damaged_byte] ^= 64
+
+        with pytest.raises(ChunkTableError):
+            _unframe_chunks(bytes(damaged_table))
+
+
+def test_steganographer_reveal_chunks():
+    """Chunked data is revealed a chunk at a time, and exactly the damaged chunks are reported."""
+    dirty_image = "tests/dirtyImage_test_steganographer_reveal_chunks.png"
+    corrupt_image = "tests/dirtyImage_test_steganographer_reveal_chunks_corrupt.png"
+    file_to_hide = "tests/FileToHide.zip"
+
+    stegs = Steganographer()
+    stegs.steganographer_hide_file(CLEAN_PNG_LOCATION, file_to_hide, dirty_image, chunk_size=1000)
+    dirty_data = _open_image_file(dirty_image)
+    data_start = (stegs._header.header_length + 8 + 5 * 8) * stegs._BYTELEN
+    corrupt_data = bytearray(dirty_data[1])
+    corrupt_data[data_start + 1500 * stegs._BYTELEN] ^= 1
+    corrupt_data[data_start + 2999 * stegs._BYTELEN] ^= 1
+    corrupt_data[data_start + 4600 * stegs._BYTELEN] ^= 1
+    _write_image_file(corrupt_image, dirty_image, (dirty_data[0], bytes(corrupt_data)))
+
+    with open(file_to_hide, 'rb') as original:
+        original_data = original.read()
+
+    assert stegs.steganographer_reveal(dirty_image) == (original_data, file_to_hide)
+    assert stegs.steganographer_reveal_chunks(dirty_image, workers=2) == (original_data, file_to_hide, [])
+    revealed_data, _, damaged = stegs.steganographer_reveal_chunks(corrupt_image, workers=2)
+    assert damaged == [(1000, 3000), (4000, len(original_data))]
+    assert revealed_data[:1000] == original_data[:1000]
+    assert revealed_data[3000:4000] == original_data[3000:4000]
+    assert stegs.steganographer_verify(corrupt_image) is False
+
+    os.remove(dirty_image)
+    os.remove(corrupt_image)
+
+
+def test_reveal_chunks_damaged_table():
+    """A damaged number of chunks is reported as a damaged table, a damaged chunk length only as its chunk."""
+    dirty_image = "tests/dirtyImage_test_reveal_chunks_damaged_table.png"
+    corrupt_image = "tests/dirtyImage_test_reveal_chunks_damaged_table_corrupt.png"
+    file_to_hide = "tests/FileToHide.zip"
+
+    stegs = Steganographer()
+    stegs.steganographer_hide_file(CLEAN_PNG_LOCATION, file_to_hide, dirty_image, chunk_size=1000)
+    dirty_data = _open_image_file(dirty_image)
+    table_start = stegs._header.header_length * stegs._BYTELEN
+
+    with open(file_to_hide, 'rb') as original:
+        original_data = original.read()
+
+    corrupt_data = bytearray(dirty_data[1])
+    corrupt_data[table_start + 8 * (8 + 2 * 8) + 7] ^= 1  # The length of the third chunk.
+    _write_image_file(corrupt_image, dirty_image, (dirty_data[0], bytes(corrupt_data)))
+
+    assert stegs.steganographer_reveal_chunks(corrupt_image) == (original_data, file_to_hide, [(2000, 3000)])
+
+    corrupt_data = bytearray(dirty_data[1])
+    corrupt_data[table_start + 7] ^= 1  # The number of chunks.
+    _write_image_file(corrupt_image, dirty_image, (dirty_data[0], bytes(corrupt_data)))
+
+    with pytest.raises(ChunkTableError):
+        stegs.steganographer_reveal_chunks(corrupt_image)
+
+    with pytest.raises(ChunkTableError):
+        stegs.steganographer_reveal(corrupt_image)
+
+    os.remove(dirty_image)
+    os.remove(corrupt_image)
+
+
+def test_reveal_chunks_not_chunked():
+    """Data hidden without chunks is checked as a single chunk."""
+    dirty_image = "tests/dirtyImage_test_reveal_chunks_not_chunked.png"
+    file_to_hide = "tests/FileToHide.zip"
+
+    stegs = Steganographer()
+    stegs.steganographer_hide_file(CLEAN_PNG_LOCATION, file_to_hide, dirty_image)
+
+    with open(file_to_hide, 'rb') as original:
+        original_data = original.read()
+
+    assert stegs.steganographer_reveal_chunks(dirty_image) == (original_data, file_to_hide, [])
+    assert stegs.steganographer_reveal_chunks("tests/dirtyImageWFile.png") == (original_data, file_to_hide, [])
+
+    with pytest.raises(SystemExit):
+        stegs.steganographer_reveal_chunks(CLEAN_PNG_LOCATION)
+
+    os.remove(dirty_image)
+
+
 def test_main_hide_msg_with_output(capfd):
     """Command line calls to hide work when given an input image, a message, and an output file."""
     line_end = '\n'
@@ -846,6 +1097,81 @@ def test_main_reveal_file_w_output(capfd):
     os.remove(dirty_fname)
 
 
+def test_main_append_reveal(capfd):
+    """Command line calls to append add to what is hidden and revealing lists all the hidden messages."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    first_message = 'test_main_append_reveal first message'
+    second_message = 'test_main_append_reveal second message'
+    dirty_fname = "tests/dirtyImage_test_main_append_reveal.png"
+
+    os.system('python -m steganographer ' + CLEAN_PNG_LOCATION + ' -m "' + first_message + '" -o ' + dirty_fname)
+    _, _ = capfd.readouterr()
+
+    result = os.system('python -m steganographer ' + dirty_fname + ' -a -m "' + second_message + '"')
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "The message has been appended to " + dirty_fname + line_end
+
+    result = os.system("python -m steganographer " + dirty_fname)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == ("The hidden message was..." + line_end + first_message + line_end + second_message + line_end)
+
+    os.remove(dirty_fname)
+
+
+def test_main_chunk_size(capfd):
+    """Command line calls hide a message in chunks that is revealed like any other."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    hidden_message = 'test_main_chunk_size hidden message'
+    dirty_fname = "tests/dirtyImage_test_main_chunk_size.png"
+
+    os.system('python -m steganographer ' + CLEAN_PNG_LOCATION + ' -m "' + hidden_message + '" -c 8 -o ' +
+              dirty_fname)
+    _, _ = capfd.readouterr()
+
+    result = os.system("python -m steganographer " + dirty_fname)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == ("The hidden message was..." + line_end + hidden_message + line_end)
+    assert len(Steganographer().steganographer_reveal_chunks(dirty_fname)[0]) == len(hidden_message)
+
+    os.remove(dirty_fname)
+
+
+def test_main_verify(capfd):
+    """Command line calls to verify check every image and exit with a status saying if they all checked out."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    dirty_fname = "tests/dirtyImage_test_main_verify.png"
+
+    Steganographer().steganographer_hide(CLEAN_PNG_LOCATION, "test_main_verify hidden message", dirty_fname)
+
+    result = os.system("python -m steganographer verify " + dirty_fname)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == dirty_fname + ": ok" + line_end
+
+    result = os.system("python -m steganographer verify -j 2 " + dirty_fname + " " + CLEAN_PNG_LOCATION +
+                       " tests/dirtyImageWFile.png")
+    out, _ = capfd.readouterr()
+
+    assert result != 0
+    assert out == (dirty_fname + ": ok" + line_end + CLEAN_PNG_LOCATION + ": FAILED" + line_end +
+                   "tests/dirtyImageWFile.png: no checksum" + line_end)
+
+    os.remove(dirty_fname)
+
+
 def test_main_reveal_no_msg(capfd):
     """There should be an error returned when there is no message hidden in the image file."""
     line_end = '\n'
@@ -914,7 +1240,6 @@ def test_jpegs(capfd):
     assert compare_images("tests/cleanImage.jpg", dirty_fname + '.png') < 500
 
 
-@pytest.mark.xfail(strict=True, reason="Issue #59 bmp support is broken.", run=True)
 def test_bmps(capfd):
     """Bmps can have a message hidden and revealed."""
     line_end = '\n'
@@ -936,3 +1261,230 @@ def test_bmps(capfd):
     assert result == 0
     assert out == ("The hidden message was..." + line_end + hidden_message + line_end)
     assert compare_images("tests/cleanImage.bmp", dirty_fname + '.png') < 500
+
+
+def test_hide_animation():
+    """Animations are hidden in across their frames and written as apngs with the same frames and timing."""
+    gif_fname = "tests/cleanImage_test_hide_animation.gif"
+    dirty_fname = "tests/dirtyImage_test_hide_animation.gif"
+    hidden_message = "test_hide_animation hidden message " * 10
+
+    with Image.open(CLEAN_PNG_LOCATION) as img:
+        frames = [img.crop((frame * 20, 0, frame * 20 + 20, 20)).convert('P') for frame in range(3)]
+
+    frames[0].save(gif_fname, save_all=True, append_images=frames[1:], duration=[100, 200, 300], loop=0)
+    # Each RGBA frame holds 200 bytes, so the message spans frames.
+    assert len(_open_image_file(gif_fname)[1]) == 3 * 20 * 20 * 4
+
+    output_fname = Steganographer().steganographer_hide(gif_fname, hidden_message, dirty_fname)
+
+    assert output_fname == "tests/dirtyImage_test_hide_animation.png"
+    assert Steganographer().steganographer_reveal(output_fname)[0] == hidden_message.encode('utf-8')
+
+    with Image.open(output_fname) as dirty_image:
+        assert dirty_image.n_frames == 3
+
+        for frame in range(3):
+            dirty_image.seek(frame)
+            assert dirty_image.info['duration'] == (frame + 1) * 100
+
+    os.remove(gif_fname)
+    os.remove(output_fname)
+
+
+def test_hide_multi_page_tiff():
+    """Multi-page tiffs are hidden in across their pages, each keeping its own mode, and stay tiffs."""
+    tiff_fname = "tests/cleanImage_test_hide_multi_page_tiff.tiff"
+    hidden_message = "test_hide_multi_page_tiff hidden message " * 5
+
+    with Image.open(CLEAN_PNG_LOCATION) as img:
+        pages = [img.crop((0, 0, 20, 20)), img.crop((20, 0, 40, 20)).convert('L'), img.crop((40, 0, 60, 20))]
+
+    pages[0].save(tiff_fname, save_all=True, append_images=pages[1:])
+    output_fname = Steganographer().steganographer_hide(tiff_fname, hidden_message)
+
+    assert output_fname == "tests/cleanImage_test_hide_multi_page_tiffSteganogrified.tiff"
+    assert Steganographer().steganographer_reveal(output_fname)[0] == hidden_message.encode('utf-8')
+
+    with Image.open(output_fname) as dirty_image:
+        assert dirty_image.n_frames == 3
+        dirty_image.seek(1)
+        assert dirty_image.mode == 'L'
+
+    os.remove(tiff_fname)
+    os.remove(output_fname)
+
+
+def test_hide_multi_page_bilevel_tiff():
+    """Bilevel multi-page tiffs are hidden in with a byte for each pixel, their pages written as L."""
+    tiff_fname = "tests/cleanImage_test_hide_multi_page_bilevel_tiff.tiff"
+    hidden_message = "test_hide_multi_page_bilevel_tiff hidden message " * 100
+
+    with Image.open(CLEAN_PNG_LOCATION) as img:
+        pages = [img.crop((0, 0, 200, 80)).convert('1') for _ in range(3)]
+
+    pages[0].save(tiff_fname, save_all=True, append_images=pages[1:])
+
+    assert len(_open_image_file(tiff_fname)[1]) == 200 * 80 * 3
+    assert carrier_length(tiff_fname) == 200 * 80 * 3
+
+    output_fname = Steganographer().steganographer_hide(tiff_fname, hidden_message)
+
+    assert Steganographer().steganographer_reveal(output_fname)[0] == hidden_message.encode('utf-8')
+
+    with Image.open(output_fname) as dirty_image:
+        assert dirty_image.n_frames == 3
+        assert dirty_image.mode == 'L'
+
+    os.remove(tiff_fname)
+    os.remove(output_fname)
+
+
+@pytest.mark.parametrize("mode,low_byte", [('I;16', 0), ('I;16B', 1), ('I', 0), ('F', 0)])
+def test_hide_high_bit_depth(mode, low_byte):
+    """High bit depth images are hidden in the least significant byte of each sample and written as tiffs."""
+    if sys.byteorder == 'big' and mode in ('I', 'F'):
+        low_byte = 3
+
+    clean_fname = "tests/cleanImage_test_hide_high_bit_depth_" + mode.replace(';', '') + ".tiff"
+    hidden_message = "test_hide_high_bit_depth hidden message"
+    clean_image = Image.new(mode, (40, 40))
+    clean_image.putdata([sample * 37 - (mode in ('I', 'F')) * 30000 for sample in range(1600)])
+    clean_image.save(clean_fname)
+
+    assert len(_open_image_file(clean_fname)[1]) == 1600
+
+    # A png output name goes through Pillow, which still writes a tiff.
+    output_fname = Steganographer().steganographer_hide(clean_fname, hidden_message, clean_fname.replace(
+        "cleanImage", "dirtyImage").replace(".tiff", ".png"))
+
+    assert output_fname == clean_fname.replace("cleanImage", "dirtyImage")
+    assert Steganographer().steganographer_reveal(output_fname)[0] == hidden_message.encode('utf-8')
+
+    with Image.open(output_fname) as dirty_image:
+        assert dirty_image.mode == mode
+
+        clean_samples = clean_image.tobytes()
+        dirty_samples = dirty_image.tobytes()
+        sample_len = len(clean_samples) // 1600
+
+    for sample_byte in range(sample_len):
+        if sample_byte != low_byte:
+            assert clean_samples[sample_byte::sample_len] == dirty_samples[sample_byte::sample_len]
+
+    assert clean_samples[low_byte::sample_len] != dirty_samples[low_byte::sample_len]
+
+    os.remove(clean_fname)
+    os.remove(output_fname)
+
+
+@pytest.mark.parametrize("mode", ['L', 'P'])
+def test_hide_single_band(mode):
+    """Grayscale and palette images are hidden in and written with the same mode, and palette, as the clean image."""
+    clean_fname = "tests/cleanImage_test_hide_single_band_" + mode + ".png"
+    dirty_fname = "tests/dirtyImage_test_hide_single_band_" + mode + ".png"
+
+    with Image.open("tests/cleanImage.png") as clean_image:
+        clean_image.convert(mode).save(clean_fname)
+
+    Steganographer().steganographer_hide(clean_fname, "test_hide_single_band", dirty_fname)
+
+    assert Steganographer().steganographer_reveal(dirty_fname) == (b"test_hide_single_band", "")
+
+    with Image.open(clean_fname) as clean_image, Image.open(dirty_fname) as dirty_image:
+        assert dirty_image.mode == mode and dirty_image.getpalette() == clean_image.getpalette()
+
+    os.remove(clean_fname)
+    os.remove(dirty_fname)
+
+
+def test_main_pipes(capfd):
+    """Command line calls read the image and the file to hide from stdin and write to stdout when given -."""
+    line_end = '\n'
+    if sys.platform == 'win32':
+        line_end = '\r\n'
+    dirty_fname = "tests/dirtyImage_test_main_pipes.png"
+    revealed_fname = "tests/outputFile_test_main_pipes.zip"
+
+    result = os.system('python -m steganographer ' + CLEAN_PNG_LOCATION + ' -f - -o - < tests/FileToHide.zip > ' +
+                       dirty_fname)
+    _, err = capfd.readouterr()
+
+    assert result == 0
+    assert err == "The piped in file has been hidden in -" + line_end
+
+    result = os.system('python -m steganographer - -r < ' + dirty_fname + ' > ' + revealed_fname)
+    _, err = capfd.readouterr()
+
+    assert result == 0
+    assert err == "The hidden file was revealed in -" + line_end
+    assert open("tests/FileToHide.zip", 'rb').read() == open(revealed_fname, 'rb').read()
+
+    result = os.system('python -m steganographer - -m "test_main_pipes message" < ' + CLEAN_PNG_LOCATION + ' > ' +
+                       dirty_fname)
+    _, _ = capfd.readouterr()
+    result += os.system("python -m steganographer " + dirty_fname)
+    out, _ = capfd.readouterr()
+
+    assert result == 0
+    assert out == "The hidden message was..." + line_end + "test_main_pipes message" + line_end
+
+    result = os.system('python -m steganographer - -f - < ' + CLEAN_PNG_LOCATION)
+    _, err = capfd.readouterr()
+
+    assert result != 0
+    assert "only one of the input, the message and the file can be read from stdin" in err
+
+    os.remove(dirty_fname)
+    os.remove(revealed_fname)
+
+
+def test_atomic_output():
+    """Outputs only show up once they are whole, and a write that fails leaves the old output and no temporary file."""
+    fname = "tests/outputFile_test_atomic_output.txt"
+    _write_bin_file(fname, b"old output")
+
+    with pytest.raises(RuntimeError):
+        with _atomic_output(fname) as temp_file:
+            _write_bin_file(temp_file, b"half of the")
+            assert os.path.dirname(temp_file) == "tests"
+            assert _open_bin_file(fname) == b"old output"
+            raise RuntimeError("Killed part way.")
+
+    assert _open_bin_file(fname) == b"old output"
+    assert not os.path.exists(temp_file)
+
+    with _atomic_output(fname, fsync=True) as temp_file:
+        _write_bin_file(temp_file, b"new output")
+
+    assert _open_bin_file(fname) == b"new output"
+    assert not os.path.exists(temp_file)
+
+    os.remove(fname)
+
+
+@pytest.mark.parametrize("fsync,file_syncs", [('never', 0), ('file', 2), ('batch', 0)])
+def test_hide_fsync(monkeypatch, fsync, file_syncs):
+    """Each policy flushes the images written when it says, and no temporary files are left behind."""
+    synced_fds = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced_fds.append(fd) or real_fsync(fd))
+    dirty_fnames = ["tests/dirtyImage_test_hide_fsync_" + fsync + str(image) + ".png" for image in range(2)]
+    stegs = Steganographer(fsync=fsync)
+
+    for dirty_fname in dirty_fnames:
+        assert stegs.steganographer_hide(CLEAN_PNG_LOCATION, "test_hide_fsync", dirty_fname) == dirty_fname
+
+    # Every image written is flushed, followed by its directory.
+    assert len(synced_fds) == file_syncs * 2
+    assert stegs.steganographer_sync() == (dirty_fnames if fsync == 'batch' else [])
+    assert len(synced_fds) == (3 if fsync == 'batch' else file_syncs * 2)
+    assert stegs.steganographer_sync() == []
+    assert not [fname for fname in os.listdir("tests") if fname.startswith(".dirtyImage_test_hide_fsync_" + fsync)]
+
+    for dirty_fname in dirty_fnames:
+        assert Steganographer().steganographer_reveal(dirty_fname)[0] == b"test_hide_fsync"
+        os.remove(dirty_fname)
+
+    with pytest.raises(ValueError):
+        Steganographer(fsync='sometimes')